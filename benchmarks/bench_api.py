@@ -0,0 +1,83 @@
+"""Benchmark posting messages with and without the pooled REST client.
+
+Runs a local stub of the Discord REST API and posts ``-n`` messages, first
+opening one session per call (the old behaviour), then reusing one
+:class:`travisbot.api.Client`.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_api.py -n 2000 -c 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from travisbot.api import Client, api
+
+
+async def messages(request):
+    """Pretend to create a message."""
+    return web.json_response({"id": "1"})
+
+
+async def start_stub(host="127.0.0.1", port=0):
+    """Start the stub REST server, return the runner and its base URL."""
+    app = web.Application()
+    app.router.add_post("/channels/{id}/messages", messages)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, "http://{}:{}".format(host, port)
+
+
+async def post(count, concurrency, client=None, url=None):
+    """Post ``count`` messages, ``concurrency`` at a time, return posts/sec.
+
+    Without a shared ``client``, a fresh one is opened for every call.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            c = client or Client("token", url=url)
+            try:
+                await api("/channels/1/messages", "POST", client=c,
+                          json={"content": "test"})
+            finally:
+                if client is None:
+                    await c.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return count / (time.perf_counter() - start)
+
+
+async def main(count, concurrency):
+    """Run both scenarios."""
+    runner, url = await start_stub()
+    client = Client("token", url=url, limit_per_host=concurrency)
+    try:
+        before = await post(count, concurrency, url=url)
+        after = await post(count, concurrency, client=client)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    print("session per call: {:8.1f} posts/sec".format(before))
+    print("pooled client:    {:8.1f} posts/sec".format(after))
+    print("speedup:          {:8.2f}x".format(after / before))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(
+        main(args.count, args.concurrency))
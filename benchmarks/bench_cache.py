@@ -0,0 +1,69 @@
+"""Benchmark the memory of a large guild, raw or in the cache.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_cache.py -m 100000
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from payloads import guild_create
+
+from travisbot.cache import Cache
+
+
+def measure(build):
+    """Return what build returns, its memory and CPU time."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.process_time()
+    obj = build()
+    elapsed = time.process_time() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size, elapsed
+
+
+def main(members, seed):
+    """Compare the raw dicts, the cache and the cache with fewer fields."""
+    rand = random.Random(seed)
+    data = json.dumps(guild_create(rand, members)['d'])
+    print("{:,} members, {:.1f}MB of JSON".format(
+        members, len(data) / 2 ** 20))
+
+    def cache(**kwargs):
+        def build():
+            state = Cache(**kwargs)
+            state.apply('GUILD_CREATE', json.loads(data))
+            return state
+        return build
+
+    print("storage          memory      time  footprint()")
+    for name, build in (('raw dicts', lambda: json.loads(data)),
+                        ('cache', cache()),
+                        ('cache, no nick', cache(member_fields=(
+                            'roles', 'status'), user_fields=('username',))),
+                        ('cache, ids only', cache(member_fields=(),
+                                                  user_fields=()))):
+        obj, size, elapsed = measure(build)
+        footprint = ""
+        if isinstance(obj, Cache):
+            footprint = "{:.1f}MB".format(obj.footprint()['total'] / 2 ** 20)
+        print("{:15s} {:6.1f}MB {:8.2f}s  {}".format(
+            name, size / 2 ** 20, elapsed, footprint))
+        del obj
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-m", "--members", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    main(args.members, args.seed)
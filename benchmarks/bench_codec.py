@@ -0,0 +1,64 @@
+"""Micro-benchmark the JSON codecs over gateway payloads.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_codec.py -n 20000
+"""
+
+import argparse
+import json
+import time
+from collections import defaultdict
+
+from payloads import load
+
+from travisbot.codec import PREFERENCE, get_codec
+
+
+def bench(codec, texts, rounds):
+    """Return the best decoding and encoding times."""
+    decode = encode = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        objs = [codec.loads(t) for t in texts]
+        decode = min(decode, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for obj in objs:
+            codec.dumps(obj)
+        encode = min(encode, time.perf_counter() - start)
+    return decode, encode
+
+
+def main(payloads, rounds):
+    """Compare every codec installed, by event type."""
+    texts = defaultdict(list)
+    for payload in payloads:
+        texts[payload['t'] or 'OP {}'.format(payload['op'])].append(
+            json.dumps(payload))
+
+    codecs = []
+    for name in PREFERENCE:
+        try:
+            codecs.append(get_codec(name))
+        except ImportError:
+            print("{} is not installed".format(name))
+
+    print("{:16s} {:>6s} {:>8s} {:>14s} {:>14s}".format(
+        "event", "count", "codec", "decode µs/ev", "encode µs/ev"))
+    for event, batch in sorted(texts.items(), key=lambda x: -len(x[1])):
+        for codec in codecs:
+            decode, encode = bench(codec, batch, rounds)
+            print("{:16s} {:6d} {:>8s} {:14.2f} {:14.2f}".format(
+                event, len(batch), codec.name,
+                decode / len(batch) * 1e6, encode / len(batch) * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("-r", "--rounds", type=int, default=3)
+    parser.add_argument("--capture", help="JSON lines of gateway payloads")
+    args = parser.parse_args()
+
+    main(load(args.capture, count=args.count), args.rounds)
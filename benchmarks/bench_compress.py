@@ -0,0 +1,87 @@
+"""Benchmark the gateway compression modes.
+
+Replays a gateway session, compressed as Discord would, and reports the
+bytes on the wire and the CPU time to decode each event.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_compress.py -n 20000
+    (travisbot)$ python benchmarks/bench_compress.py --capture gateway.jsonl
+"""
+
+import argparse
+import json
+import time
+import zlib
+
+from payloads import load
+
+from travisbot.compress import Inflator
+
+LARGE = 1024
+"""Discord only compresses large payloads in the ``payload`` mode."""
+
+
+def frames(payloads):
+    """Return the frames of every compression mode."""
+    texts = [json.dumps(p, separators=(',', ':')).encode() for p in payloads]
+
+    payload = [zlib.compress(t) if len(t) > LARGE else t.decode()
+               for t in texts]
+
+    deflator = zlib.compressobj()
+    stream = [deflator.compress(t) + deflator.flush(zlib.Z_SYNC_FLUSH)
+              for t in texts]
+
+    return {'none': [t.decode() for t in texts],
+            'payload': payload,
+            'zlib-stream': stream}
+
+
+def decode_none(frames):
+    """Decode plain text frames."""
+    for frame in frames:
+        json.loads(frame)
+
+
+def decode_payload(frames):
+    """Decode frames compressed one by one."""
+    for frame in frames:
+        if isinstance(frame, bytes):
+            frame = zlib.decompress(frame).decode()
+        json.loads(frame)
+
+
+def decode_stream(frames):
+    """Decode frames sharing one compression context."""
+    inflator = Inflator()
+    for frame in frames:
+        json.loads(inflator.feed(frame).decode())
+
+
+def main(payloads, rounds):
+    """Decode the frames of every mode."""
+    decoders = {'none': decode_none, 'payload': decode_payload,
+                'zlib-stream': decode_stream}
+
+    print("{} events".format(len(payloads)))
+    print("mode          bytes/event   cpu µs/event")
+    for mode, data in frames(payloads).items():
+        size = sum(len(f) for f in data)
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.process_time()
+            decoders[mode](data)
+            best = min(best, time.process_time() - start)
+        print("{:12s} {:12.1f} {:14.2f}".format(
+            mode, size / len(data), best / len(data) * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("-r", "--rounds", type=int, default=3)
+    parser.add_argument("--capture", help="JSON lines of gateway payloads")
+    args = parser.parse_args()
+
+    main(load(args.capture, count=args.count), args.rounds)
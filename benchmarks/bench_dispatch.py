@@ -0,0 +1,79 @@
+"""Benchmark decoding and handling dispatches, lazily or not.
+
+The bot only subscribes to ``MESSAGE_CREATE``, every other dispatch of the
+replayed session is skipped when lazy.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_dispatch.py -n 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from payloads import load
+
+from travisbot import etf
+from travisbot.bot import Bot
+
+
+def frames(payloads, encoding):
+    """Encode the dispatches of the session."""
+    dispatches = [p for p in payloads if p['op'] == 0 and p['t'] != 'READY']
+    if encoding == 'etf':
+        return [etf.dumps(p) for p in dispatches]
+    return [json.dumps(p, separators=(',', ':')) for p in dispatches]
+
+
+async def replay(bot, data):
+    """Decode and handle every frame."""
+    for frame in data:
+        await bot._handle(bot._decode(frame))
+    await bot.supervisor.join()
+
+
+def run(loop, encoding, lazy, data):
+    """Return the CPU time per frame and the peak memory."""
+    bot = Bot('ws://localhost', 'token', None, loop.create_future(),
+              encoding=encoding, lazy=lazy, state=False)
+
+    @bot.event()
+    async def on_message_create(data):
+        pass
+
+    tracemalloc.start()
+    start = time.process_time()
+    loop.run_until_complete(replay(bot, data))
+    elapsed = time.process_time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Without tracemalloc slowing it down.
+    start = time.process_time()
+    loop.run_until_complete(replay(bot, data))
+    elapsed = time.process_time() - start
+    return elapsed / len(data), peak
+
+
+def main(payloads):
+    """Compare the lazy decoding for both encodings."""
+    loop = asyncio.get_event_loop()
+    print("encoding  lazy   cpu µs/frame   peak memory")
+    for encoding in ('json', 'etf'):
+        data = frames(payloads, encoding)
+        for lazy in (False, True):
+            cpu, peak = run(loop, encoding, lazy, data)
+            print("{:8s} {!s:5s} {:14.2f} {:10.1f}MB".format(
+                encoding, lazy, cpu * 1e6, peak / 2 ** 20))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("--capture", help="JSON lines of gateway payloads")
+    args = parser.parse_args()
+
+    main(load(args.capture, count=args.count))
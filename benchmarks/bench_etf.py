@@ -0,0 +1,59 @@
+"""Benchmark the etf gateway encoding against json.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_etf.py -n 20000
+"""
+
+import argparse
+import json
+import time
+
+from payloads import load
+
+from travisbot import etf
+from travisbot.codec import PREFERENCE, get_codec
+
+
+def bench(loads, frames, rounds):
+    """Return the best decoding time."""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.process_time()
+        for frame in frames:
+            loads(frame)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main(payloads, rounds):
+    """Compare sizes and decoding times."""
+    texts = [json.dumps(p, separators=(',', ':')) for p in payloads]
+    terms = [etf.dumps(p) for p in payloads]
+
+    print("{} events".format(len(payloads)))
+    print("encoding        bytes/event   cpu µs/event")
+    for name in PREFERENCE:
+        try:
+            codec = get_codec(name)
+        except ImportError:
+            continue
+        elapsed = bench(codec.loads, texts, rounds)
+        print("json ({:7s}) {:12.1f} {:14.2f}".format(
+            name, sum(len(t.encode()) for t in texts) / len(texts),
+            elapsed / len(texts) * 1e6))
+
+    elapsed = bench(etf.loads, terms, rounds)
+    print("etf  (python)  {:12.1f} {:14.2f}".format(
+        sum(len(t) for t in terms) / len(terms),
+        elapsed / len(terms) * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("-r", "--rounds", type=int, default=3)
+    parser.add_argument("--capture", help="JSON lines of gateway payloads")
+    args = parser.parse_args()
+
+    main(load(args.capture, count=args.count), args.rounds)
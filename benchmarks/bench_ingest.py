@@ -0,0 +1,177 @@
+"""Benchmark the webhook throughput, by number of worker processes.
+
+With no worker, the web application runs in the process of the bot, as
+``python -m travisbot`` does by default. Otherwise the workers share a port
+and forward the notifications over a Unix socket to this process, which
+only queues them. Client processes flood the port with signed
+notifications, a ticker measures how late the event loop of the bot is.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_ingest.py -n 5000 -w 1 2 4
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+from aiohttp import ClientSession, web
+from OpenSSL import crypto
+
+from bench_verify import ticker
+from travisbot.certificate import Certificate
+from travisbot.ingest import Ingest, start_workers, stop_workers
+from travisbot.queue import NotificationQueue
+from travisbot.travis import keypair, sign
+from travisbot.web import make_app
+
+HOST = "127.0.0.1"
+
+PAYLOAD = json.dumps({'id': 1, 'status_message': 'Passed',
+                      'padding': 'x' * 4000})
+
+
+async def load_certificate(key):
+    """Return a certificate of the PEM public key, as Travis gives."""
+    certificate = crypto.X509()
+    certificate.set_pubkey(crypto.load_publickey(crypto.FILETYPE_PEM, key))
+    return certificate
+
+
+def free_port():
+    """Return a port nobody listens on, for the workers to share."""
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def client(url, signature, count, concurrency, results):
+    """Flood the server with signed notifications, in another process."""
+    async def flood():
+        semaphore = asyncio.Semaphore(concurrency)
+        refused = 0
+
+        async def one(session):
+            nonlocal refused
+            async with semaphore:
+                async with session.post(url, data={'payload': PAYLOAD},
+                                        headers={'Signature': signature}
+                                        ) as response:
+                    if not (await response.json())['ok']:
+                        refused += 1
+
+        async with ClientSession() as session:
+            await asyncio.gather(*(one(session) for _ in range(count)))
+        return refused
+
+    results.put(asyncio.new_event_loop().run_until_complete(flood()))
+
+
+async def wait_listening(url, timeout=10):
+    """Wait for a worker to answer."""
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url.replace("notifications", "stats")):
+                    return
+            except OSError:
+                if loop.time() > deadline:
+                    raise
+                await asyncio.sleep(.05)
+
+
+async def run(workers, key, signature, count, concurrency, clients):
+    """Run one scenario, return the throughput and loop lags."""
+    queue = NotificationQueue(maxsize=count + 1)
+    port = free_port()
+    url = "http://{}:{}/notifications".format(HOST, port)
+    fetch = functools.partial(load_certificate, key)
+
+    runner = ingest = None
+    processes = []
+    if workers:
+        path = os.path.join(tempfile.mkdtemp(), "ingest.sock")
+        ingest = Ingest(path, queue.put)
+        await ingest.start()
+        processes = start_workers(workers, path, HOST, port, fetch=fetch,
+                                  executor="inline")
+    else:
+        runner = web.AppRunner(make_app(queue.put,
+                                        certificate=Certificate(fetch),
+                                        dedupe=False))
+        await runner.setup()
+        await web.TCPSite(runner, HOST, port).start()
+    await wait_listening(url)
+    # Give the other workers the time to start listening too.
+    await asyncio.sleep(.5 if workers > 1 else 0)
+
+    lags = []
+    tick = asyncio.ensure_future(ticker(lags))
+    results = multiprocessing.Queue()
+    flooders = [multiprocessing.Process(
+        target=client,
+        args=(url, signature, count // clients, concurrency, results))
+        for _ in range(clients)]
+    start = time.perf_counter()
+    for flooder in flooders:
+        flooder.start()
+    loop = asyncio.get_event_loop()
+    refused = 0
+    for _ in flooders:
+        refused += await loop.run_in_executor(None, results.get)
+    elapsed = time.perf_counter() - start
+    for flooder in flooders:
+        flooder.join()
+    tick.cancel()
+
+    if workers:
+        stop_workers(processes)
+        await ingest.close()
+    else:
+        await runner.cleanup()
+
+    lags.sort()
+    return (queue.qsize() / elapsed, refused, lags[len(lags) // 2],
+            lags[int(len(lags) * .99)])
+
+
+async def main(count, concurrency, clients, workers, bits):
+    """Run every scenario."""
+    pkey, _ = keypair(bits)
+    # The certificate cannot be pickled, for the workers.
+    key = crypto.dump_publickey(crypto.FILETYPE_PEM, pkey)
+    signature = sign(pkey, PAYLOAD)
+
+    print("workers   webhooks/sec   refused   lag p50    lag p99")
+    for n in workers:
+        rate, refused, p50, p99 = await run(n, key, signature, count,
+                                            concurrency, clients)
+        print("{:7d} {:14.1f} {:9d} {:8.2f}ms {:8.2f}ms".format(
+            n, rate, refused, p50 * 1000, p99 * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50,
+                        help="requests in flight, by client process")
+    parser.add_argument("--clients", type=int,
+                        default=max(multiprocessing.cpu_count() // 2, 1),
+                        help="client processes")
+    parser.add_argument("-w", "--workers", type=int, nargs="+",
+                        default=[0, 1, 2, 4],
+                        help="worker processes, 0 for none")
+    parser.add_argument("-b", "--bits", type=int, default=2048)
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(
+        main(args.count, args.concurrency, args.clients, args.workers,
+             args.bits))
@@ -0,0 +1,66 @@
+"""Load test the webhook server, up to the messages in Discord.
+
+The webhooks are signed with a local key, posted at the given concurrency,
+then delivered by a bot to a stub of the Discord REST API.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_load.py -n 5000 -c 50 --window 0
+"""
+
+import argparse
+import asyncio
+import logging
+
+from travisbot import logs
+from travisbot.conf import QUEUE_SIZE
+from travisbot.loadtest import load
+
+
+def milliseconds(stats, key):
+    """Format a latency, in milliseconds."""
+    return "{:.3f}ms".format(stats[key] * 1e3) if stats[key] else "-"
+
+
+def main(**kwargs):
+    """Run the load test, print the report."""
+    # The refused webhooks are counted, not logged one by one.
+    listener = logs.setup(logging.ERROR)
+    loop = asyncio.get_event_loop()
+    try:
+        stats = loop.run_until_complete(load(**kwargs))
+    finally:
+        listener.stop()
+
+    print("{requests} webhooks ({refused} refused, {duplicates} duplicates) "
+          "in {seconds:.2f}s, {requests_per_second:.0f} requests/s".format(
+              **stats))
+    for name in ("latency", "delivery_latency"):
+        if stats[name]:
+            print("{}: p50 {}, p95 {}, p99 {}, max {}".format(
+                name, *(milliseconds(stats[name], key)
+                        for key in ("p50", "p95", "p99", "max"))))
+    print("delivered: {delivered}, messages: {messages}, "
+          "edits: {edits}".format(**stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("--builds", type=int, default=100,
+                        help="distinct builds, each one signed once")
+    parser.add_argument("-b", "--bits", type=int, default=2048)
+    parser.add_argument("--executor", default="inline",
+                        choices=("inline", "thread", "process"))
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="notifications waiting, the next are refused")
+    parser.add_argument("--window", type=float, default=.5,
+                        help="seconds the bot batches the notifications")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="skip the webhooks of a build already queued")
+    args = parser.parse_args()
+
+    main(count=args.count, concurrency=args.concurrency, builds=args.builds,
+         bits=args.bits, executor=args.executor, dedupe=args.dedupe,
+         queue_size=args.queue_size, batch_window=args.window)
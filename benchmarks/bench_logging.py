@@ -0,0 +1,123 @@
+"""Benchmark the event loop lag caused by logging.
+
+A ticker wakes up every millisecond and records how late it is, while the
+events are logged in bursts: with ``print``, with a plain
+:class:`logging.StreamHandler` writing from the event loop, then with the
+JSON lines written by the background thread of :func:`travisbot.logs.setup`.
+
+Writing to a local file is cheap, the standard error of a service usually
+ends up in a pipe (journald, docker) blocking now and then: ``--delay``
+makes each write that slow.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_logging.py -n 50000
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from travisbot import logs
+from travisbot.latency import Latency
+
+log = logging.getLogger("travisbot.bench")
+
+
+class SlowStream:
+    """A stream blocking on each write, like a busy pipe."""
+
+    def __init__(self, stream, delay):
+        """Init the stream."""
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        """Write the text, slowly."""
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        """Flush the stream."""
+        self.stream.flush()
+
+
+async def tick(lag, interval=.001):
+    """Record how late the loop wakes us up."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag.add(time.perf_counter() - start - interval)
+
+
+async def produce(write, events, burst):
+    """Log the events, by bursts, yielding to the loop in between."""
+    for i in range(0, events, burst):
+        for j in range(i, i + burst):
+            write(j)
+        await asyncio.sleep(0)
+
+
+async def run(write, events, burst):
+    """Return the duration and the lag of the loop, while logging."""
+    lag = Latency(events)
+    ticker = asyncio.ensure_future(tick(lag))
+    await asyncio.sleep(.01)
+    start = time.perf_counter()
+    await produce(write, events, burst)
+    duration = time.perf_counter() - start
+    ticker.cancel()
+    return duration, lag
+
+
+def configure(mode, stream):
+    """Set the root logger up, return a function to undo it."""
+    root = logging.getLogger()
+    if mode == "queue":
+        # Unbounded, to write as many lines as the other modes.
+        listener = logs.setup(logging.INFO, stream, maxsize=0)
+        return listener.stop
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s %(message)s"))
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+    return handler.flush
+
+
+async def main(events, burst, delay):
+    """Compare the three ways of logging."""
+    print("mode      events/s   lag p50 ms   lag p99 ms   lag max ms")
+    for mode in ("print", "stream", "queue"):
+        with tempfile.TemporaryFile("w") as output:
+            stream = SlowStream(output, delay)
+            stop = configure(mode, stream)
+            if mode == "print":
+                def write(i):
+                    print("dispatch MESSAGE_CREATE {} guild 42".format(i),
+                          file=stream)
+            else:
+                def write(i):
+                    log.info("dispatch %s %d", "MESSAGE_CREATE", i,
+                             extra={"guild": 42})
+            duration, lag = await run(write, events, burst)
+            stop()
+        print("{:6s} {:11.0f} {:12.3f} {:12.3f} {:12.3f}".format(
+            mode, events / duration, lag.percentile(.5) * 1e3,
+            lag.percentile(.99) * 1e3, lag.stats()["max"] * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--events", type=int, default=50000)
+    parser.add_argument("--burst", type=int, default=100,
+                        help="events logged without yielding to the loop")
+    parser.add_argument("--delay", type=float, default=.00005,
+                        help="seconds blocked by each write")
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(
+        main(args.events, args.burst, args.delay))
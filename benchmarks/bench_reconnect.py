@@ -0,0 +1,106 @@
+"""Benchmark the time to recover from dropped gateway connections.
+
+Runs a local fake gateway streaming ``-n`` events as fast as it can,
+dropping the connection every ``--every`` events, in turns: closing it
+abruptly, asking to reconnect (op 7) and aborting the TCP connection. The
+missed events are replayed on resume, like Discord does.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_reconnect.py -n 20000 --every 1000
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from travisbot.backoff import Backoff
+from travisbot.bot import Bot
+
+
+async def gateway(request):
+    """Stream the events, dropping the connection regularly."""
+    state = request.app["state"]
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    await ws.send_json({"op": 10, "d": {"heartbeat_interval": 45000}})
+
+    msg = await ws.receive_json()
+    if msg["op"] == 2:
+        seq = 0
+        await ws.send_json({"op": 0, "s": 0, "t": "READY",
+                            "d": {"session_id": "abc", "user": {}}})
+    else:
+        seq = msg["d"]["seq"]
+        await ws.send_json({"op": 0, "s": seq, "t": "RESUMED", "d": {}})
+
+    drop = state["drops"] % 3
+    for _ in range(state["every"]):
+        seq += 1
+        if seq > state["count"]:
+            # Until the bot is done.
+            await ws.receive()
+            return ws
+        await ws.send_json({"op": 0, "s": seq, "t": "MESSAGE_CREATE",
+                            "d": {"n": seq}})
+
+    state["drops"] += 1
+    if drop == 0:
+        await ws.close(code=1011)
+    elif drop == 1:
+        await ws.send_json({"op": 7, "d": None})
+        await ws.receive()
+    else:
+        request.transport.abort()
+    return ws
+
+
+async def main(count, every):
+    """Run the bot against the fake gateway, report the recoveries."""
+    app = web.Application()
+    app["state"] = {"count": count, "every": every, "drops": 0}
+    app.router.add_get("/", gateway)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    running = asyncio.Future()
+    bot = Bot("ws://127.0.0.1:{}/".format(port).rstrip("/"), "token",
+              asyncio.Queue().get, running, compress=None, state=False,
+              backoff=Backoff(base=.1))
+    received = set()
+
+    @bot.event()
+    async def on_message_create(data):
+        received.add(data["n"])
+        if len(received) == count:
+            running.set_result(None)
+
+    start = time.perf_counter()
+    await bot.run()
+    elapsed = time.perf_counter() - start
+    await runner.cleanup()
+
+    recoveries = sorted(bot.recoveries)
+    print("{} events in {:.2f}s, {} drops, {} resumed, {} lost".format(
+        count, elapsed, app["state"]["drops"], bot.resumes,
+        count - len(received)))
+    if recoveries:
+        print("time to recover: p50 {:.1f}ms, p95 {:.1f}ms, max {:.1f}ms"
+              .format(recoveries[len(recoveries) // 2] * 1000,
+                      recoveries[int(len(recoveries) * .95)] * 1000,
+                      recoveries[-1] * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("--every", type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(main(args.count,
+                                                     args.every))
@@ -0,0 +1,95 @@
+"""Replay a gateway capture against a real bot, on localhost.
+
+The capture is one recorded with ``python -m travisbot --record PATH``, or
+a synthetic session of ``-n`` dispatches arriving at ``--rate`` per second,
+with the webhooks of a few builds, started then finished. It is replayed as
+fast as possible, or ``--speed`` times faster than captured.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_replay.py -n 20000 --speed 10
+    (travisbot)$ python benchmarks/bench_replay.py --capture session.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+
+from payloads import events
+
+from travisbot.recorder import CONNECT, TEXT, WEBHOOK, read
+from travisbot.replay import replay
+
+URL = "wss://gateway.discord.gg/?v=6&encoding=json"
+
+
+def synthetic(count, rate, webhooks, retries=0):
+    """Return the frames of a synthetic session.
+
+    :param retries: Times each webhook is delivered again, as Travis does
+                    when it sees no acknowledgement.
+    """
+    frames = [(0, CONNECT, URL)]
+    every = max(count // (webhooks or 1), 1)
+    for i, payload in enumerate(events(count=count)):
+        frames.append((i / rate, TEXT, json.dumps(payload)))
+        if webhooks and i % every in (0, every * 9 // 10):
+            frames.extend([(i / rate, WEBHOOK, json.dumps({
+                "id": i // every,
+                "status_message": "Passed" if i % every else "Pending",
+                "author_name": "greut",
+                "type": "push",
+                "compare_url": "http://example.org/",
+                "build_url": "http://example.org/",
+                "repository": {"owner_name": "greut", "name": "travisbot"}
+            }))] * (1 + retries))
+    return frames
+
+
+def milliseconds(stats, key):
+    """Format a latency, in milliseconds."""
+    return "{:.3f}ms".format(stats[key] * 1e3) if stats[key] else "-"
+
+
+def main(frames, speed, memory, chunk):
+    """Replay the frames, print the report."""
+    loop = asyncio.get_event_loop()
+    stats = loop.run_until_complete(replay(frames, speed=speed,
+                                           memory=memory, chunk=chunk))
+
+    print("{events} events ({lost} lost) in {seconds:.2f}s, "
+          "{events_per_second:.0f} events/s".format(**stats))
+    print("cpu: {:.2f}s".format(stats["cpu_seconds"]))
+    if stats["peak_memory"] is not None:
+        print("peak memory: {:.1f}MB".format(stats["peak_memory"] / 2 ** 20))
+    for name in ("latency", "webhook_latency"):
+        if stats[name]:
+            print("{}: p50 {}, p95 {}, max {}".format(
+                name, *(milliseconds(stats[name], key)
+                        for key in ("p50", "p95", "max"))))
+    print("webhooks delivered: {webhooks}, skipped: {duplicates}, "
+          "messages: {messages}, edits: {edits}".format(**stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capture", help="frames recorded by the bot")
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=1000,
+                        help="synthetic dispatches per second")
+    parser.add_argument("--webhooks", type=int, default=10)
+    parser.add_argument("--retries", type=int, default=0,
+                        help="deliveries of the same synthetic webhook")
+    parser.add_argument("--speed", type=float,
+                        help="times faster than captured, else flat out")
+    parser.add_argument("--memory", action="store_true",
+                        help="trace the peak memory, slower")
+    args = parser.parse_args()
+
+    if args.capture:
+        frames = list(read(args.capture))
+    else:
+        frames = synthetic(args.count, args.rate, args.webhooks,
+                           args.retries)
+    # The synthetic session holds no member chunks to answer with.
+    main(frames, args.speed, args.memory, chunk=bool(args.capture))
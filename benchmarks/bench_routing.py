@@ -0,0 +1,88 @@
+"""Benchmark routing the notifications, indexed or by a linear scan.
+
+``--repos`` repositories each get a route for their failures on master and
+a route for anything else, after a few organisation-wide ones. The linear
+scan tries every route of the file with :func:`fnmatch.fnmatch`, the
+:class:`travisbot.routing.Table` only the routes of the repository.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_routing.py -n 100000 --repos 500
+"""
+
+import argparse
+import random
+import time
+from fnmatch import fnmatch
+
+from travisbot.routing import Table
+
+STATUSES = ("Passed", "Failed", "Fixed", "Broken", "Still Failing")
+
+
+def routes(repos):
+    """Return the routes of the file."""
+    routes = [{"repository": "acme/docs-*", "channel": 1},
+              {"repository": "*/*", "branch": "gh-pages", "channel": 2}]
+    for i in range(repos):
+        repository = "acme/repo{}".format(i)
+        routes.append({"repository": repository, "branch": "master",
+                       "status": ["Failed", "Broken", "Still Failing"],
+                       "channel": 1000 + i})
+        routes.append({"repository": repository, "channel": 2000 + i})
+    return routes
+
+
+def linear(routes, data):
+    """Return the channel of the first route matching, trying them all."""
+    repository = "{0[owner_name]}/{0[name]}".format(data["repository"])
+    for route in routes:
+        if not fnmatch(repository, route["repository"]):
+            continue
+        if not fnmatch(data["branch"], route.get("branch", "*")):
+            continue
+        status = route.get("status", ["*"])
+        if any(fnmatch(data["status_message"], s) for s in status):
+            return route["channel"]
+    return None
+
+
+def notifications(count, repos, seed=42):
+    """Return notifications of random repositories."""
+    rand = random.Random(seed)
+    return [{
+        "status_message": rand.choice(STATUSES),
+        "branch": rand.choice(("master", "master", "feature", "gh-pages")),
+        "repository": {"owner_name": "acme",
+                       "name": "repo{}".format(rand.randrange(repos))}
+    } for _ in range(count)]
+
+
+def main(count, repos):
+    """Route the same notifications both ways."""
+    config = routes(repos)
+    data = notifications(count, repos)
+    table = Table(config)
+
+    start = time.perf_counter()
+    expected = [linear(config, d) for d in data]
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    channels = [table.route(d) for d in data]
+    indexed = time.perf_counter() - start
+
+    assert channels == expected
+    print("{} routes, {} notifications".format(len(config), count))
+    print("linear scan: {:10.2f} µs/notification".format(scan / count * 1e6))
+    print("indexed:     {:10.2f} µs/notification".format(
+        indexed / count * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=20000)
+    parser.add_argument("--repos", type=int, default=500)
+    args = parser.parse_args()
+
+    main(args.count, args.repos)
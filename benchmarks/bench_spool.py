@@ -0,0 +1,93 @@
+"""Benchmark the webhooks rate sustained with and without the spool.
+
+Floods the (unsigned) fake ``GET /notifications`` endpoint, which goes
+through the same queue writer side as the real one, while a consumer
+acknowledges the notifications. A local certificate stands for the one
+of Travis, nothing is fetched from it.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_spool.py -n 5000 -c 50
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+from aiohttp import ClientSession, web
+
+from travisbot.certificate import Certificate
+from travisbot.queue import NotificationQueue
+from travisbot.spool import Spool
+from travisbot.travis import keypair
+from travisbot.web import make_app
+
+
+async def flood(count, concurrency, spooled, certificate):
+    """Send ``count`` webhooks, return the rate and the spool stats."""
+    async def fetch():
+        return certificate
+
+    queue = NotificationQueue(maxsize=count)
+    put, ack, spool = queue.put, None, None
+    directory = tempfile.TemporaryDirectory()
+    if spooled:
+        spool = Spool(directory.name, queue.put)
+        spool.open()
+        put, ack = spool.put, spool.ack
+
+    async def consume():
+        while True:
+            data = await queue.get()
+            if ack:
+                ack(data)
+
+    runner = web.AppRunner(make_app(put, certificate=Certificate(fetch)))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = "http://127.0.0.1:{}/notifications".format(port)
+
+    consumer = asyncio.ensure_future(consume())
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(session):
+        async with semaphore:
+            async with session.get(url) as response:
+                assert response.status == 200
+
+    async with ClientSession() as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(session) for _ in range(count)))
+        rate = count / (time.perf_counter() - start)
+
+    consumer.cancel()
+    await runner.cleanup()
+    stats = spool.stats() if spool else None
+    if spool:
+        spool.close()
+    directory.cleanup()
+    return rate, stats
+
+
+async def main(count, concurrency):
+    """Run both scenarios."""
+    _, certificate = keypair()
+    before, _ = await flood(count, concurrency, False, certificate)
+    after, stats = await flood(count, concurrency, True, certificate)
+
+    print("in memory:  {:8.1f} webhooks/sec".format(before))
+    print("spooled:    {:8.1f} webhooks/sec".format(after))
+    print("fsync calls: {commits} for {written} webhooks".format(**stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(
+        main(args.count, args.concurrency))
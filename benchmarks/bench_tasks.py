@@ -0,0 +1,71 @@
+"""Benchmark the per-frame cost of tracking the bot's background tasks.
+
+With ``--inflight`` tasks already running, e.g. slow event callbacks or
+messages being sent, each frame spawns a callback. The list of futures
+rebuilt after every frame (the old behaviour) costs more as tasks pile up,
+the :class:`travisbot.supervisor.Supervisor` stays flat.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_tasks.py -n 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from travisbot.supervisor import Supervisor
+
+
+async def callback(data):
+    """Handle an event, quickly."""
+
+
+async def legacy(frames, inflight):
+    """Spawn and rescan a list of futures for every frame."""
+    futures = list(inflight)
+    start = time.perf_counter()
+    for i in range(frames):
+        futures.append(asyncio.ensure_future(callback(i)))
+        futures = [f for f in futures if not f.done()]
+        await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def supervised(frames, inflight):
+    """Spawn through the supervisor."""
+    supervisor = Supervisor({"event": len(inflight) + 100})
+    for task in inflight:
+        supervisor._start(task, "event")
+    start = time.perf_counter()
+    for i in range(frames):
+        supervisor.spawn(callback(i), "event")
+        await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def main(frames, counts):
+    """Compare both, with more and more tasks in flight."""
+    release = asyncio.Event()
+    print("in flight   legacy µs/frame   supervisor µs/frame")
+    for count in counts:
+        results = []
+        for run in (legacy, supervised):
+            inflight = [asyncio.ensure_future(release.wait())
+                        for _ in range(count)]
+            results.append(await run(frames, inflight) / frames * 1e6)
+            for task in inflight:
+                task.cancel()
+            await asyncio.gather(*inflight, return_exceptions=True)
+        print("{:9d} {:17.2f} {:21.2f}".format(count, *results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--frames", type=int, default=5000)
+    parser.add_argument("--inflight", type=int, nargs="+",
+                        default=[0, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(
+        main(args.frames, args.inflight))
@@ -0,0 +1,111 @@
+"""Benchmark the webhook signature verification, inline or offloaded.
+
+The web application runs with a local RSA key in place of the Travis one
+while a separate process floods it with signed notifications. A ticker
+measures how late the event loop is, as the gateway heartbeat would be.
+
+.. code-block:: console
+
+    (travisbot)$ python benchmarks/bench_verify.py -n 2000 -c 50
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+
+from aiohttp import ClientSession, web
+
+from travisbot.certificate import Certificate, make_executor
+from travisbot.queue import NotificationQueue
+from travisbot.travis import keypair, sign
+from travisbot.web import make_app
+
+PAYLOAD = json.dumps({'id': 1, 'status_message': 'Passed',
+                      'padding': 'x' * 4000})
+
+
+def client(url, signature, count, concurrency, results):
+    """Flood the server with signed notifications, in another process."""
+    async def flood():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(session):
+            async with semaphore:
+                async with session.post(url, data={'payload': PAYLOAD},
+                                        headers={'Signature': signature}
+                                        ) as response:
+                    assert (await response.json())['ok']
+
+        async with ClientSession() as session:
+            start = time.perf_counter()
+            await asyncio.gather(*(one(session) for _ in range(count)))
+            return count / (time.perf_counter() - start)
+
+    results.put(asyncio.new_event_loop().run_until_complete(flood()))
+
+
+async def ticker(lags, interval=.005):
+    """Record how late the loop wakes us up."""
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def run(kind, pkey, certificate, count, concurrency):
+    """Run one scenario, return the throughput and loop lags."""
+    async def fetch():
+        return certificate
+
+    queue = NotificationQueue(maxsize=count + 1)
+    app = make_app(queue.put, certificate=Certificate(
+        fetch, executor=make_executor(kind, 4)))
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = "http://127.0.0.1:{}/notifications".format(port)
+    signature = sign(pkey, PAYLOAD)
+
+    lags = []
+    tick = asyncio.ensure_future(ticker(lags))
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=client, args=(url, signature, count, concurrency, results))
+    process.start()
+    loop = asyncio.get_event_loop()
+    rate = await loop.run_in_executor(None, results.get)
+    process.join()
+
+    tick.cancel()
+    await runner.cleanup()
+    lags.sort()
+    return rate, lags[len(lags) // 2], lags[int(len(lags) * .99)], lags[-1]
+
+
+async def main(count, concurrency, bits):
+    """Run every scenario."""
+    pkey, certificate = keypair(bits)
+
+    print("executor   webhooks/sec   lag p50    lag p99    lag max")
+    for kind in ('inline', 'thread', 'process'):
+        rate, p50, p99, top = await run(kind, pkey, certificate, count,
+                                        concurrency)
+        print("{:8s} {:12.1f} {:8.2f}ms {:8.2f}ms {:8.2f}ms".format(
+            kind, rate, p50 * 1000, p99 * 1000, top * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-b", "--bits", type=int, default=4096)
+    args = parser.parse_args()
+
+    asyncio.get_event_loop().run_until_complete(
+        main(args.count, args.concurrency, args.bits))
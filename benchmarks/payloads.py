@@ -0,0 +1,134 @@
+"""Synthetic gateway payloads, looking like a busy bot's.
+
+A capture, one JSON payload per line, may be given instead to the
+benchmarks with ``--capture``.
+"""
+
+import json
+import random
+
+STATUSES = ('online', 'idle', 'dnd', 'offline')
+
+
+def snowflake(rand):
+    """Return a random Discord id."""
+    return str(rand.randrange(10 ** 17, 10 ** 18))
+
+
+def user(rand):
+    """Return a user object."""
+    return {
+        'id': snowflake(rand),
+        'username': 'user{}'.format(rand.randrange(10 ** 6)),
+        'discriminator': '{:04d}'.format(rand.randrange(10000)),
+        'avatar': '{:032x}'.format(rand.getrandbits(128)),
+        'bot': False
+    }
+
+
+def guild_create(rand, members=1000):
+    """Return a GUILD_CREATE dispatch."""
+    guild_id = snowflake(rand)
+    roles = [snowflake(rand) for _ in range(10)]
+    users = [user(rand) for _ in range(members)]
+    return {
+        'op': 0, 's': None, 't': 'GUILD_CREATE',
+        'd': {
+            'id': guild_id,
+            'name': 'guild {}'.format(guild_id[-4:]),
+            'owner_id': users[0]['id'],
+            'large': members > 250,
+            'member_count': members,
+            'roles': [{'id': r, 'name': 'role', 'color': 0, 'hoist': False,
+                       'position': i, 'permissions': 104324161,
+                       'managed': False, 'mentionable': False}
+                      for i, r in enumerate(roles)],
+            'channels': [{'id': snowflake(rand), 'type': 0,
+                          'name': 'channel-{}'.format(i), 'position': i,
+                          'topic': None, 'permission_overwrites': []}
+                         for i in range(20)],
+            'members': [{'user': u, 'nick': None, 'deaf': False,
+                         'mute': False,
+                         'joined_at': '2017-06-01T12:00:00.000000+00:00',
+                         'roles': rand.sample(roles, 2)}
+                        for u in users],
+            'presences': [{'user': {'id': u['id']},
+                           'status': rand.choice(STATUSES), 'game': None}
+                          for u in users[:members // 2]]
+        }
+    }
+
+
+def presence_update(rand, guild_id):
+    """Return a PRESENCE_UPDATE dispatch."""
+    return {
+        'op': 0, 's': None, 't': 'PRESENCE_UPDATE',
+        'd': {
+            'user': {'id': snowflake(rand)},
+            'guild_id': guild_id,
+            'status': rand.choice(STATUSES),
+            'roles': [],
+            'game': {'name': 'game', 'type': 0}
+        }
+    }
+
+
+def typing_start(rand, guild_id):
+    """Return a TYPING_START dispatch."""
+    return {
+        'op': 0, 's': None, 't': 'TYPING_START',
+        'd': {'user_id': snowflake(rand), 'channel_id': snowflake(rand),
+              'timestamp': 1496318400}
+    }
+
+
+def message_create(rand, guild_id):
+    """Return a MESSAGE_CREATE dispatch."""
+    return {
+        'op': 0, 's': None, 't': 'MESSAGE_CREATE',
+        'd': {
+            'id': snowflake(rand),
+            'channel_id': snowflake(rand),
+            'author': user(rand),
+            'content': 'hello ' * rand.randrange(1, 20),
+            'timestamp': '2017-06-01T12:00:00.000000+00:00',
+            'tts': False, 'mention_everyone': False, 'mentions': [],
+            'mention_roles': [], 'attachments': [], 'embeds': [],
+            'pinned': False, 'type': 0
+        }
+    }
+
+
+def events(count=10000, guilds=5, members=1000, seed=42):
+    """Return a gateway session: HELLO, READY, guilds then events."""
+    rand = random.Random(seed)
+    payloads = [
+        {'op': 10, 's': None, 't': None,
+         'd': {'heartbeat_interval': 41250, '_trace': ['gateway']}},
+        {'op': 0, 's': None, 't': 'READY',
+         'd': {'v': 6, 'user': user(rand), 'session_id': 'session',
+               'guilds': [], 'private_channels': [], '_trace': ['gateway']}}
+    ]
+    ids = []
+    for _ in range(guilds):
+        payload = guild_create(rand, members)
+        ids.append(payload['d']['id'])
+        payloads.append(payload)
+
+    kinds = (presence_update,) * 6 + (typing_start,) * 2 + (message_create,)
+    for _ in range(count):
+        payloads.append(rand.choice(kinds)(rand, rand.choice(ids)))
+
+    for i, payload in enumerate(payloads[1:], 1):
+        payload['s'] = i
+    # The order of the keys sent by Discord.
+    return [{'t': p['t'], 's': p['s'], 'op': p['op'], 'd': p['d']}
+            for p in payloads]
+
+
+def load(filename=None, **kwargs):
+    """Return the payloads of a capture, or synthetic ones."""
+    if not filename:
+        return events(**kwargs)
+    with open(filename, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
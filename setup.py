@@ -34,11 +34,16 @@ setup(
         'Topic :: System :: Monitoring'
     ),
     install_requires=(
-        'aiohttp>=2.1.0',
+        'aiohttp>=3.0',
         'PyOpenSSL>=17.0.0'
     ),
     extras_require={
-        'fast': ('cchardet', 'aiodns'),  # making it faster (recommended)
+        'fast': (  # making it faster (recommended)
+            'cchardet',
+            'aiodns',
+            'ujson',
+            'orjson; python_version >= "3.6"'
+        ),
         'qa': ('flake8', 'isort', 'pycodestyle', 'pydocstyle', 'rstcheck'),
         'docs': ('Sphinx>=1.6.0', 'sphinxcontrib-trio')
     },
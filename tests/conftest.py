@@ -0,0 +1,37 @@
+"""Shared fixtures."""
+
+import asyncio
+
+import pytest
+
+from OpenSSL import crypto
+from travisbot.travis import keypair
+
+
+class Travis:
+    """A fake Travis, counting the fetches of its certificate."""
+
+    def __init__(self):
+        """Init with a new key."""
+        self.rotate()
+        self.fetches = 0
+
+    def rotate(self):
+        """Change the key."""
+        self.pkey, self.certificate = keypair(1024)
+
+    async def fetch(self):
+        """Return the certificate, like the Travis configuration."""
+        self.fetches += 1
+        await asyncio.sleep(.01)
+        return self.certificate
+
+    def sign(self, data):
+        """Sign the data with the private key."""
+        return crypto.sign(self.pkey, data, 'sha1')
+
+
+@pytest.fixture
+def travis():
+    """Create a fake Travis."""
+    return Travis()
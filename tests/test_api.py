@@ -0,0 +1,43 @@
+"""Testing the api module."""
+
+import pytest
+
+from aiohttp import web
+from travisbot.api import Client, api
+
+
+@pytest.fixture
+def app(loop):
+    """Create a stub of the Discord REST API."""
+    async def messages(request):
+        request.app['requests'].append(request)
+        return web.json_response({'id': request.match_info['id']})
+
+    app = web.Application(loop=loop)
+    app['requests'] = []
+    app.router.add_post('/channels/{id}/messages', messages)
+    return app
+
+
+async def test_client_reuse(test_server, app, loop):
+    """Test the client keeps its session between calls."""
+    server = await test_server(app)
+    client = Client('secret', url=str(server.make_url('')).rstrip('/'),
+                    loop=loop)
+
+    assert client.closed
+    data = await api('/channels/42/messages', 'POST', client=client,
+                     json={'content': 'hello'})
+    session = client.session
+    await api('/channels/42/messages', 'POST', client=client,
+              json={'content': 'world'})
+
+    assert data == {'id': '42'}
+    assert session is client.session
+    assert not client.closed
+    request = app['requests'][0]
+    assert request.headers['Authorization'] == 'Bot secret'
+    assert request.headers['User-Agent'].startswith('TravisBot')
+
+    await client.close()
+    assert client.closed
@@ -0,0 +1,62 @@
+"""Testing the batch module."""
+
+import asyncio
+
+import pytest
+
+from travisbot.batch import Batcher, embed
+from travisbot.travis import notification
+
+
+@pytest.fixture
+def queue(loop):
+    """Create the notifications queue."""
+    return asyncio.Queue(loop=loop)
+
+
+async def test_group(queue, loop):
+    """Test notifications are grouped by repository and branch."""
+    for i in range(25):
+        queue.put_nowait(notification(i, 'Pending'))
+    queue.put_nowait(notification(100, 'Pending', branch='dev'))
+    queue.put_nowait(notification(200, 'Pending', name='other'))
+
+    batcher = Batcher(queue.get, window=.01, loop=loop)
+    messages = [await batcher.get() for _ in range(5)]
+
+    assert [len(m) for m in messages] == [10, 10, 5, 1, 1]
+    assert messages[3][0]['branch'] == 'dev'
+    assert messages[4][0]['repository']['name'] == 'other'
+    assert queue.empty()
+    assert not batcher.ready
+
+
+async def test_collapse(queue, loop):
+    """Test a newer status replaces the previous one of the same build."""
+    queue.put_nowait(notification(1, 'Pending'))
+    queue.put_nowait(notification(2, 'Pending'))
+    queue.put_nowait(notification(1, 'Passed'))
+
+    batcher = Batcher(queue.get, window=.01, loop=loop)
+    message = await batcher.get()
+
+    assert [embed(d)['title'] for d in message] == [
+        'greut/travisbot Pending',
+        'greut/travisbot Passed'
+    ]
+    assert batcher.received == 3
+    assert batcher.collapsed == 1
+
+
+async def test_cancel(queue, loop):
+    """Test cancelling keeps the notifications already collected."""
+    batcher = Batcher(queue.get, window=10, loop=loop)
+    task = asyncio.ensure_future(batcher.get())
+    queue.put_nowait(notification(1, 'Pending'))
+    await asyncio.sleep(.01)
+    task.cancel()
+
+    batcher.window = .01
+    message = await batcher.get()
+
+    assert len(message) == 1
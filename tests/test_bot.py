@@ -0,0 +1,355 @@
+"""Testing the bot module."""
+
+import asyncio
+import json
+import zlib
+
+import pytest
+
+from aiohttp import WSMessage, WSMsgType, web
+from travisbot import etf
+from travisbot.backoff import Backoff
+from travisbot.bot import Bot, GatewayClosed
+from travisbot.compress import Inflator
+
+
+class FakeWebSocket:
+    """Replay the given messages."""
+
+    def __init__(self, messages):
+        """Init with the messages to receive."""
+        self.messages = list(messages)
+        self.sent = []
+
+    async def receive(self):
+        """Return the next message."""
+        if not self.messages:
+            return WSMessage(WSMsgType.CLOSE, 1000, None)
+        return self.messages.pop(0)
+
+    async def send_str(self, data):
+        """Keep the data sent."""
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        """Keep the data sent, as is."""
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        """Keep the close code."""
+        self.close_code = code
+
+
+def make_bot(loop, **kwargs):
+    """Create a bot, not connected."""
+    return Bot('ws://localhost', 'token', None, loop.create_future(),
+               **kwargs)
+
+
+async def test_zlib_stream(loop):
+    """Test receiving payloads sharing a compression context."""
+    deflator = zlib.compressobj()
+    frames = []
+    for i in range(3):
+        data = json.dumps({'op': 0, 's': i, 't': 'TEST', 'd': {}}).encode()
+        frames.append(deflator.compress(data) +
+                      deflator.flush(zlib.Z_SYNC_FLUSH))
+    # The last message is split in two frames.
+    frames[2:] = [frames[2][:5], frames[2][5:]]
+
+    bot = make_bot(loop, compress='zlib-stream')
+    bot.inflator = Inflator()
+    bot.ws = FakeWebSocket(WSMessage(WSMsgType.BINARY, frame, None)
+                           for frame in frames)
+
+    assert [(await bot._receive())['s'] for _ in range(3)] == [0, 1, 2]
+    assert await bot._receive() is None
+    assert bot.inflator.received == sum(len(f) for f in frames)
+
+
+async def test_payload(loop):
+    """Test receiving a payload compressed alone."""
+    data = zlib.compress(b'{"op": 11}')
+    bot = make_bot(loop, compress='payload')
+    bot.ws = FakeWebSocket([WSMessage(WSMsgType.BINARY, data, None),
+                            WSMessage(WSMsgType.TEXT, '{"op": 1}', None)])
+
+    assert await bot._receive() == {'op': 11}
+    assert await bot._receive() == {'op': 1}
+
+
+@pytest.mark.parametrize('codec', ('json', 'ujson', 'orjson'))
+async def test_codec(loop, codec):
+    """Test the payloads go through the chosen codec."""
+    pytest.importorskip(codec)
+    bot = make_bot(loop, codec=codec)
+    bot.ws = FakeWebSocket([
+        WSMessage(WSMsgType.TEXT, '{"op":0,"t":"X","s":1,"d":"é"}', None)])
+
+    assert bot.codec.name == codec
+    assert await bot._receive() == {'op': 0, 't': 'X', 's': 1, 'd': 'é'}
+    await bot.update_status('travisbot')
+    assert bot.ws.sent[0]['d']['game']['name'] == 'travisbot'
+
+
+async def test_etf(loop):
+    """Test the etf encoding, compressed or not."""
+    deflator = zlib.compressobj()
+    data = etf.dumps({'op': 11, 'd': None})
+    frame = deflator.compress(data) + deflator.flush(zlib.Z_SYNC_FLUSH)
+
+    bot = make_bot(loop, encoding='etf', compress='payload')
+    bot.ws = FakeWebSocket([WSMessage(WSMsgType.BINARY, data, None),
+                            WSMessage(WSMsgType.BINARY,
+                                      zlib.compress(data), None)])
+    assert await bot._receive() == {'op': 11, 'd': None}
+    assert await bot._receive() == {'op': 11, 'd': None}
+
+    bot = make_bot(loop, encoding='etf', compress='zlib-stream')
+    bot.inflator = Inflator()
+    bot.ws = FakeWebSocket([WSMessage(WSMsgType.BINARY, frame, None)])
+    assert await bot._receive() == {'op': 11, 'd': None}
+
+    await bot.update_status('travisbot')
+    assert etf.loads(bot.ws.sent[0])['op'] == bot.STATUS_UPDATE
+
+
+@pytest.mark.parametrize('encoding', ('json', 'etf'))
+async def test_lazy(loop, encoding):
+    """Test the dispatches nobody subscribed to are not decoded."""
+    bot = make_bot(loop, encoding=encoding, lazy=True)
+    received = []
+
+    @bot.event()
+    async def on_message_create(data):
+        received.append(data)
+
+    payloads = [{'t': t, 's': s, 'op': 0, 'd': {'content': 'x' * 300}}
+                for s, t in enumerate(('TYPING_START', 'MESSAGE_CREATE'))]
+    if encoding == 'etf':
+        frames = [WSMessage(WSMsgType.BINARY, etf.dumps(p), None)
+                  for p in payloads]
+    else:
+        frames = [WSMessage(WSMsgType.TEXT, json.dumps(p, separators=(
+            ',', ':')), None) for p in payloads]
+    bot.ws = FakeWebSocket(frames)
+
+    typing = await bot._receive()
+    assert typing == {'t': 'TYPING_START', 's': 0, 'op': 0}
+    await bot._handle(typing)
+    await bot._handle(await bot._receive())
+    await bot.supervisor.join()
+
+    assert bot.last_sequence == 1
+    assert bot.skipped == {'TYPING_START': 1}
+    assert received == [{'content': 'x' * 300}]
+
+
+async def test_state(loop):
+    """Test the state is updated before the callbacks."""
+    bot = make_bot(loop)
+    seen = []
+
+    @bot.event()
+    async def on_guild_create(data):
+        seen.append(bot.state.get_guild(data['id']).name)
+
+    await bot._handle({'op': 0, 's': 1, 't': 'GUILD_CREATE',
+                       'd': {'id': '1', 'name': 'travis', 'members': []}})
+    await bot.supervisor.join()
+    await bot._handle({'op': 0, 's': 2, 't': 'GUILD_UPDATE',
+                       'd': {'id': '1', 'name': 'travis-ci'}})
+
+    assert seen == ['travis']
+    assert bot.guilds[1].name == 'travis-ci'
+    assert 'PRESENCE_UPDATE' in bot.subscriptions
+    assert bot.skipped == {}
+    assert make_bot(loop, state=False).guilds == {}
+
+
+async def test_request_members(loop):
+    """Test the members of the large guilds are requested in chunks."""
+    bot = make_bot(loop, chunk_concurrency=1)
+    bot.ws = FakeWebSocket([])
+
+    for guild_id in ('1', '2'):
+        await bot._handle({'op': 0, 's': 1, 't': 'GUILD_CREATE',
+                           'd': {'id': guild_id, 'large': True}})
+    await asyncio.sleep(0)
+    # One guild at a time.
+    assert [m['d']['guild_id'] for m in bot.ws.sent] == ['1']
+    first, second = bot.chunks[1], bot.chunks[2]
+    assert bot.request_members(1) is first
+
+    for i in range(2):
+        await bot._handle({'op': 0, 's': 2, 't': 'GUILD_MEMBERS_CHUNK',
+                           'd': {'guild_id': '1', 'chunk_index': i,
+                                 'chunk_count': 2,
+                                 'members': [{'user': {'id': str(i)}}]}})
+        await asyncio.sleep(0)
+    assert await first == 2
+    assert sorted(bot.state.get_guild(1).members) == [0, 1]
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert bot.ws.sent[-1]['op'] == bot.REQUEST_GUILD_MEMBERS
+    assert bot.ws.sent[-1]['d']['guild_id'] == '2'
+
+    await bot._handle({'op': 0, 's': 3, 't': 'GUILD_MEMBERS_CHUNK',
+                       'd': {'guild_id': 2, 'members': []}})
+    assert await second == 1
+    await bot.supervisor.join()
+    assert bot.chunks == {}
+
+    bot.chunk_timeout = 0
+    with pytest.raises(asyncio.TimeoutError):
+        await bot.request_members(3)
+    assert bot.skipped == {}
+
+
+@pytest.fixture
+def gateway(loop):
+    """Create a fake gateway dropping the connection in various ways.
+
+    The events are numbered, the first connection is closed abruptly, the
+    second one asks to reconnect and the third one invalidates the session.
+    """
+    async def handler(request):
+        state = request.app['state']
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        state['connections'] += 1
+        drop = state['connections']
+
+        async def dispatch(t, d):
+            state['seq'] += 1
+            await ws.send_json({'op': 0, 's': state['seq'], 't': t, 'd': d})
+
+        async def events():
+            for _ in range(3):
+                await dispatch('MESSAGE_CREATE', {'n': state['seq'] + 1})
+            if drop == 1:
+                await ws.close(code=1011)
+            elif drop == 2:
+                await ws.send_json({'op': 7, 'd': None})
+
+        await ws.send_json({'op': 10, 'd': {'heartbeat_interval': 45000}})
+        async for msg in ws:
+            data = msg.json()
+            if data['op'] == 2:
+                state['identified'] += 1
+                await dispatch('READY', {'session_id': 'abc', 'user': {}})
+                await events()
+            elif data['op'] == 6:
+                state['resumed'].append(data['d']['seq'])
+                if drop == 3:
+                    await ws.send_json({'op': 9, 'd': False})
+                else:
+                    await dispatch('RESUMED', {})
+                    await events()
+        return ws
+
+    app = web.Application(loop=loop)
+    app['state'] = {'connections': 0, 'seq': 0, 'identified': 0,
+                    'resumed': []}
+    app.router.add_get('/', handler)
+    return app
+
+
+async def test_reconnect(loop, test_server, gateway):
+    """Test the session is resumed, or not, without losing events."""
+    server = await test_server(gateway)
+    state = gateway['state']
+    running = loop.create_future()
+    bot = Bot(str(server.make_url('/')).rstrip('/'), 'token',
+              asyncio.Queue().get, running, compress=None, state=False,
+              backoff=Backoff(base=.01))
+    bot.INVALID_SESSION_DELAY = (0, .01)
+    received = []
+
+    @bot.event()
+    async def on_message_create(data):
+        received.append(data['n'])
+        if len(received) == 9:
+            running.set_result(None)
+
+    await asyncio.wait_for(bot.run(), 5)
+
+    assert received == [2, 3, 4, 6, 7, 8, 10, 11, 12]
+    assert state['resumed'] == [4, 8]
+    assert state['identified'] == 2
+    stats = bot.stats()
+    assert stats['reconnects'] == 2 and stats['resumes'] == 1
+    assert len(bot.recoveries) == 2
+    assert 0 < stats['recover_max'] < 1
+
+
+async def test_fatal(loop, test_server):
+    """Test the bot gives up when the token is refused."""
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({'op': 10, 'd': {'heartbeat_interval': 45000}})
+        await ws.receive()
+        await ws.close(code=4004)
+        return ws
+
+    app = web.Application(loop=loop)
+    app.router.add_get('/', handler)
+    server = await test_server(app)
+    bot = Bot(str(server.make_url('/')).rstrip('/'), 'token',
+              asyncio.Queue().get, loop.create_future(), compress=None)
+    sent = []
+
+    async def send():
+        await asyncio.sleep(.1)
+        sent.append(True)
+
+    # A message still being sent when the gateway gives up.
+    bot.supervisor.spawn(send(), "send")
+
+    with pytest.raises(GatewayClosed) as e:
+        await asyncio.wait_for(bot.run(), 5)
+    assert e.value.code == 4004
+    assert sent == [True]
+
+
+async def test_heartbeat(loop):
+    """Test the latency is measured, and a zombie connection closed."""
+    bot = make_bot(loop)
+    bot.ws = FakeWebSocket([])
+    bot.last_sequence = 42
+
+    # Asked by the gateway.
+    await bot._handle({'op': 1, 'd': None})
+    assert bot.ws.sent == [{'op': 1, 'd': 42}]
+    await asyncio.sleep(.01)
+    await bot._handle({'op': 11})
+    assert bot.beat is None
+    assert bot.latency.count == 1 and bot.latency.last >= .01
+    assert bot.stats()['latency']['p50'] == bot.latency.last
+
+    bot.ws_running = loop.create_future()
+    bot.interval = .01
+    await asyncio.wait_for(bot._heartbeat(), 1)
+    assert len(bot.ws.sent) == 2
+    assert bot.ws.close_code == 4000
+    assert bot.zombies == 1
+
+
+async def test_failed(loop, caplog):
+    """Test a failing consumer is logged, and the connection closed."""
+    async def get():
+        raise RuntimeError('broken queue')
+
+    bot = make_bot(loop)
+    bot.ws = FakeWebSocket([])
+    bot.ws_running = loop.create_future()
+    bot.batcher.get = get
+
+    task = asyncio.ensure_future(bot.consume())
+    task.add_done_callback(bot._failed)
+    await asyncio.wait([task])
+    await asyncio.sleep(0)
+    assert 'connection task failed' in caplog.text
+    assert 'broken queue' in caplog.text
+    assert bot.ws.close_code == 4000
@@ -0,0 +1,120 @@
+"""Testing the cache module."""
+
+from travisbot import etf
+from travisbot.cache import Cache
+
+
+def guild():
+    """Return a small GUILD_CREATE dispatch data."""
+    return {
+        'id': '1',
+        'name': 'travis',
+        'owner_id': '10',
+        'channels': [{'id': '2', 'name': 'bots', 'type': 0, 'position': 0,
+                      'topic': 'ignored'}],
+        'members': [{'user': {'id': str(i), 'username': 'u{}'.format(i),
+                              'discriminator': '0001', 'avatar': None},
+                     'nick': None, 'roles': ['5'],
+                     'joined_at': '2017-06-01T12:00:00+00:00'}
+                    for i in (10, 11)],
+        'presences': [{'user': {'id': '10'}, 'status': 'online'}]
+    }
+
+
+def test_guild_create():
+    """Test the guild, its channels, members and presences."""
+    cache = Cache()
+    cache.apply('GUILD_CREATE', guild())
+
+    g = cache.get_guild('1')
+    assert g.name == 'travis' and g.owner_id == 10
+    assert list(g.members) == [10, 11]
+    assert cache.get_channel(2).name == 'bots'
+    assert cache.get_member(1, 10).status == 'online'
+    assert cache.get_member(1, 11).status is None
+    assert cache.get_member(1, 11).user.username == 'u11'
+    # The roles of the members share the same ids.
+    assert g.members[10].roles[0] is g.members[11].roles[0]
+    assert not hasattr(g.members[10], 'joined_at')
+    assert not hasattr(g.members[10], '__dict__')
+
+
+def test_deltas():
+    """Test the events updating the cache."""
+    cache = Cache()
+    cache.apply('GUILD_CREATE', guild())
+
+    cache.apply('PRESENCE_UPDATE', {'guild_id': '1', 'user': {'id': '11'},
+                                    'status': 'dnd'})
+    cache.apply('GUILD_MEMBER_ADD', {'guild_id': '1', 'nick': 'new',
+                                     'user': {'id': '12', 'username': 'u'}})
+    cache.apply('GUILD_MEMBER_UPDATE', {'guild_id': '1', 'nick': 'nick',
+                                        'roles': [], 'user': {'id': '10'}})
+    cache.apply('GUILD_MEMBER_REMOVE', {'guild_id': '1',
+                                        'user': {'id': '11'}})
+    cache.apply('CHANNEL_CREATE', {'guild_id': '1', 'id': '3', 'name': 'x'})
+    cache.apply('CHANNEL_UPDATE', {'guild_id': '1', 'id': '2', 'name': 'y'})
+    cache.apply('CHANNEL_DELETE', {'guild_id': '1', 'id': '3'})
+    cache.apply('GUILD_UPDATE', {'id': '1', 'name': 'travis-ci'})
+
+    g = cache.get_guild(1)
+    assert g.name == 'travis-ci'
+    assert sorted(g.members) == [10, 12]
+    assert g.members[10].nick == 'nick' and g.members[10].roles == ()
+    assert g.members[10].status == 'online'
+    assert g.members[12].nick == 'new'
+    assert list(g.channels) == [2] and g.channels[2].name == 'y'
+    assert sorted(cache.users) == [10, 12]
+
+    cache.apply('GUILD_DELETE', {'id': '1', 'unavailable': True})
+    assert cache.get_guild(1).unavailable
+    cache.apply('GUILD_DELETE', {'id': '1'})
+    assert cache.get_guild(1) is None
+    assert cache.get_channel(2) is None
+    assert cache.users == {}
+
+
+def test_users():
+    """Test a user is kept while a guild still has it as a member."""
+    cache = Cache()
+    cache.apply('GUILD_CREATE', guild())
+    cache.apply('GUILD_CREATE', dict(guild(), id='2', channels=[]))
+    assert cache.get_member(1, 10).user is cache.get_member(2, 10).user
+
+    cache.apply('GUILD_DELETE', {'id': '1'})
+    assert sorted(cache.users) == [10, 11]
+    cache.apply('GUILD_MEMBER_REMOVE', {'guild_id': '2',
+                                        'user': {'id': '11'}})
+    assert sorted(cache.users) == [10]
+
+
+def test_fields():
+    """Test keeping only some fields, from etf data."""
+    cache = Cache(member_fields=(), user_fields=('username',))
+    assert 'PRESENCE_UPDATE' not in cache.events
+    data = etf.loads(etf.dumps(dict(guild(), id=1)))
+    cache.apply('GUILD_CREATE', data)
+
+    member = cache.get_member('1', '10')
+    assert member.user.username == 'u10'
+    assert not hasattr(member, 'status')
+    assert not hasattr(member.user, 'discriminator')
+
+
+def test_footprint():
+    """Test the memory footprint grows with the members."""
+    cache = Cache()
+    cache.apply('GUILD_CREATE', guild())
+    small = cache.footprint()
+
+    data = guild()
+    data['members'] *= 50
+    for i, member in enumerate(data['members']):
+        member['user'] = dict(member['user'], id=str(100 + i))
+    cache.apply('GUILD_CREATE', data)
+    footprint = cache.footprint()
+
+    assert footprint['total'] == sum(v for k, v in footprint.items()
+                                     if k != 'total')
+    assert footprint['members'] > small['members']
+    assert footprint['channels'] == small['channels']
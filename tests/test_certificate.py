@@ -0,0 +1,63 @@
+"""Testing the certificate module."""
+
+import asyncio
+
+import pytest
+
+from OpenSSL import crypto
+from travisbot.certificate import Certificate, make_executor
+
+
+async def test_single_fetch(travis, loop):
+    """Test concurrent requests share the same fetch."""
+    certificate = Certificate(travis.fetch, loop=loop)
+    data = b'{"id": 1}'
+
+    await asyncio.gather(*(certificate.verify(travis.sign(data), data)
+                           for _ in range(10)))
+
+    assert travis.fetches == 1
+
+
+async def test_rotation(travis, loop):
+    """Test a new key is fetched when the signature does not match."""
+    certificate = Certificate(travis.fetch, retry=0, loop=loop)
+    await certificate.start()
+    await certificate.get()
+    assert travis.fetches == 1
+
+    travis.rotate()
+    data = b'{"id": 2}'
+    await certificate.verify(travis.sign(data), data)
+    assert travis.fetches == 2
+
+    with pytest.raises(crypto.Error):
+        await certificate.verify(b'forged', data)
+    assert travis.fetches == 3
+
+    await certificate.stop()
+
+
+async def test_no_refetch(travis, loop):
+    """Test forged signatures do not fetch the key over and over."""
+    certificate = Certificate(travis.fetch, retry=60, loop=loop)
+
+    for _ in range(3):
+        with pytest.raises(crypto.Error):
+            await certificate.verify(b'forged', b'{}')
+    assert travis.fetches == 1
+
+
+@pytest.mark.parametrize('kind', ('thread', 'process'))
+async def test_executor(travis, loop, kind):
+    """Test the signatures are verified by the workers."""
+    certificate = Certificate(travis.fetch, executor=make_executor(kind, 2),
+                              loop=loop)
+    data = b'{"id": 3}'
+
+    await asyncio.gather(*(certificate.verify(travis.sign(data), data)
+                           for _ in range(4)))
+    with pytest.raises(crypto.Error):
+        await certificate.verify(b'forged', data)
+
+    await certificate.stop()
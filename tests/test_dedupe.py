@@ -0,0 +1,64 @@
+"""Testing the dedupe module."""
+
+from travisbot.dedupe import Deduplicator
+
+
+class Clock:
+    """A clock moved by hand."""
+
+    def __init__(self):
+        """Init the clock, at zero."""
+        self.now = 0
+
+    def __call__(self):
+        """Return the time."""
+        return self.now
+
+
+def test_ttl():
+    """Test a notification is only skipped while remembered."""
+    clock = Clock()
+    seen = Deduplicator(ttl=10, clock=clock)
+    started = {'id': 1, 'state': 'started'}
+
+    assert seen.add(started)
+    clock.now = 9
+    assert not seen.add(dict(started))
+    assert seen.add({'id': 1, 'state': 'passed'})
+    clock.now = 10
+    assert seen.add(started)
+    assert seen.stats() == {
+        'duplicates': 1, 'expired': 1, 'evicted': 0, 'size': 2}
+
+
+def test_maxsize():
+    """Test the oldest notifications are forgotten, not to grow."""
+    seen = Deduplicator(maxsize=3, clock=Clock())
+    for build in range(5):
+        assert seen.add({'id': build})
+    assert not seen.add({'id': 4})
+    assert seen.add({'id': 0})
+    assert len(seen.ring) == 3
+    assert seen.stats()['evicted'] == 3
+
+
+def test_discard():
+    """Test a notification discarded, then added again, is remembered."""
+    clock = Clock()
+    seen = Deduplicator(ttl=10, clock=clock)
+    assert seen.add({'id': 1})
+    seen.discard({'id': 1})
+    clock.now = 5
+    assert seen.add({'id': 1})
+    clock.now = 12
+    # Only the first arrival expired.
+    assert not seen.add({'id': 1})
+
+
+def test_unknown():
+    """Test the notifications without a build are never skipped."""
+    seen = Deduplicator()
+    assert seen.add({'status_message': 'test'})
+    assert seen.add({'status_message': 'test'})
+    assert seen.add([])
+    assert seen.stats()['size'] == 0
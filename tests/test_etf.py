@@ -0,0 +1,107 @@
+"""Testing the etf module."""
+
+import zlib
+
+import pytest
+
+from travisbot import etf
+
+HELLO = bytes.fromhex(
+    '83'  # version
+    '74 00000004'  # map of 4
+    '64 0002 6f70' '61 0a'  # op: 10
+    '64 0001 64'  # d:
+    '74 00000001'
+    '64 0012 6865617274626561745f696e74657276616c'  # heartbeat_interval
+    '62 0000a122'  # 41250
+    '64 0001 73' '64 0003 6e696c'  # s: nil
+    '64 0001 74' '64 0003 6e696c'  # t: nil
+)
+"""HELLO, as sent by the gateway, with atom keys."""
+
+DISPATCH = bytes.fromhex(
+    '83'
+    '74 00000004'
+    '73 02 6f70' '61 00'  # op: 0
+    '73 01 73' '62 0000002a'  # s: 42
+    '73 01 74' '6d 0000000e 4d4553534147455f435245415445'  # t: MESSAGE_CREATE
+    '73 01 64'
+    '74 00000005'
+    '73 02 6964' '6e 08 00 00001c0d4d9a4c04'  # id: snowflake
+    '73 07 636f6e74656e74' '6d 00000006 68c3a96c6c6f'  # content: héllo
+    '73 08 6d656e74696f6e73' '6a'  # mentions: []
+    '73 03 747473' '73 05 66616c7365'  # tts: false
+    '73 05 7363616c65' '46 3ff8000000000000'  # scale: 1.5
+)
+"""MESSAGE_CREATE, as sent by the gateway."""
+
+
+def test_hello():
+    """Test decoding the HELLO payload."""
+    assert etf.loads(HELLO) == {
+        'op': 10,
+        'd': {'heartbeat_interval': 41250},
+        's': None,
+        't': None
+    }
+
+
+def test_dispatch():
+    """Test decoding a dispatch, with a snowflake id."""
+    data = etf.loads(DISPATCH)
+
+    assert data['t'] == 'MESSAGE_CREATE'
+    assert data['s'] == 42
+    assert data['d'] == {
+        'id': 0x044c9a4d0d1c0000,
+        'content': 'héllo',
+        'mentions': [],
+        'tts': False,
+        'scale': 1.5
+    }
+
+
+@pytest.mark.parametrize('fixture', (HELLO, DISPATCH))
+def test_round_trip(fixture):
+    """Test the decoded fixtures survive being encoded again."""
+    data = etf.loads(fixture)
+    assert etf.loads(etf.dumps(data)) == data
+
+
+@pytest.mark.parametrize('term', (
+    0, 255, 256, -1, 2 ** 31, -2 ** 63, 2 ** 2100, 0.25, '', 'é',
+    [], [1, [2, [3]]], (1, 'a'), {}, {'a': {'b': None}}, True, b'\xff'
+))
+def test_terms(term):
+    """Test encoding and decoding various terms."""
+    assert etf.loads(etf.dumps(term)) == term
+
+
+def test_compressed():
+    """Test decoding a compressed term."""
+    term = etf.dumps({'content': 'x' * 100})[1:]
+    data = bytes([etf.VERSION, etf.COMPRESSED]) + \
+        len(term).to_bytes(4, 'big') + zlib.compress(term)
+
+    assert etf.loads(data) == {'content': 'x' * 100}
+
+
+def test_invalid():
+    """Test the errors are reported."""
+    with pytest.raises(etf.ETFError):
+        etf.loads(b'{"op": 1}')
+    with pytest.raises(etf.ETFError):
+        etf.loads(HELLO[:-3])
+    with pytest.raises(TypeError):
+        etf.dumps(object())
+
+
+def test_peek():
+    """Test reading a dispatch without its data."""
+    assert etf.peek(DISPATCH) == {'op': 0, 's': 42, 't': 'MESSAGE_CREATE'}
+    assert etf.peek(HELLO) == {'op': 10, 's': None, 't': None}
+    assert etf.peek(etf.dumps([1])) is None
+
+    term = {'d': {'a': [1, (2, 'x'), {'b': 2 ** 64}], 'c': None, 'e': 1.5},
+            't': 'X'}
+    assert etf.peek(etf.dumps(term)) == {'t': 'X'}
@@ -0,0 +1,157 @@
+"""Testing the ingest module."""
+
+import asyncio
+import base64
+import json
+
+import pytest
+
+from travisbot.certificate import Certificate
+from travisbot.dedupe import Deduplicator
+from travisbot.ingest import Forwarder, Ingest
+from travisbot.queue import NotificationQueue, QueueFull
+from travisbot.web import make_app
+
+
+@pytest.fixture
+def path(tmpdir):
+    """Return the path of the socket."""
+    return str(tmpdir.join('ingest.sock'))
+
+
+async def test_forward(path, loop):
+    """Test the answers of the bot reach the workers, in order."""
+    queue = NotificationQueue(2, loop=loop)
+    ingest = Ingest(path, queue.put, dedupe=Deduplicator())
+    await ingest.start()
+    forwarder = Forwarder(path)
+
+    results = await asyncio.gather(*(
+        forwarder.put({'id': build, 'state': 'passed'})
+        for build in (1, 1, 2, 3)), return_exceptions=True)
+
+    assert results[:3] == [None] * 3
+    assert isinstance(results[3], QueueFull)
+    assert [(await queue.get())['id'] for _ in range(2)] == [1, 2]
+    assert ingest.stats() == {'queued': 2, 'duplicates': 1, 'full': 1,
+                              'invalid': 0, 'errors': 0, 'connections': 1}
+    assert forwarder.stats()['duplicates'] == 1
+    assert forwarder.stats()['connects'] == 1
+
+    # Refused, then remembered, so that its retry goes through.
+    await forwarder.put({'id': 3, 'state': 'passed'})
+    assert (await queue.get())['id'] == 3
+
+    await forwarder.close()
+    await ingest.close()
+
+
+async def test_cancelled(path, loop):
+    """Test an answer to a cancelled webhook is skipped."""
+    queue = NotificationQueue(loop=loop)
+    ingest = Ingest(path, queue.put)
+    await ingest.start()
+    forwarder = Forwarder(path)
+
+    cancelled = asyncio.ensure_future(forwarder.put({'id': 1}))
+    while not forwarder.pending:
+        await asyncio.sleep(0)
+    cancelled.cancel()
+    await forwarder.put({'id': 2})
+
+    assert not forwarder.reading.done()
+    assert queue.qsize() == 2
+    await forwarder.close()
+    await ingest.close()
+
+
+async def test_failing(path, loop):
+    """Test a notification the bot fails to queue is refused, alone."""
+    queued = []
+
+    async def put(data):
+        if data['id'] == 1:
+            raise OSError('No space left on device')
+        queued.append(data['id'])
+
+    ingest = Ingest(path, put)
+    await ingest.start()
+    forwarder = Forwarder(path)
+
+    with pytest.raises(QueueFull):
+        await forwarder.put({'id': 1})
+    await forwarder.put({'id': 2})
+    assert queued == [2]
+    assert ingest.stats()['errors'] == 1
+    await forwarder.close()
+    await ingest.close()
+
+
+async def test_timeout(path, loop):
+    """Test the worker connects again when the bot does not answer."""
+    queue = NotificationQueue(loop=loop)
+    stuck = asyncio.Event()
+
+    async def put(data):
+        if data['id'] == 1:
+            await stuck.wait()
+        await queue.put(data)
+
+    ingest = Ingest(path, put)
+    await ingest.start()
+    forwarder = Forwarder(path, timeout=.05)
+
+    with pytest.raises(QueueFull):
+        await forwarder.put({'id': 1})
+    await forwarder.put({'id': 2})
+    assert (await queue.get())['id'] == 2
+    assert forwarder.stats()['timeouts'] == 1
+    assert forwarder.stats()['connects'] == 2
+
+    stuck.set()
+    await forwarder.close()
+    await ingest.close()
+
+
+async def test_unreachable(path, loop):
+    """Test the notifications are refused while the bot is away."""
+    queue = asyncio.Queue(loop=loop)
+    forwarder = Forwarder(path)
+    with pytest.raises(QueueFull):
+        await forwarder.put({'id': 1})
+    assert forwarder.stats()['errors'] == 1
+
+    ingest = Ingest(path, queue.put)
+    await ingest.start()
+    await forwarder.put({'id': 1})
+    assert (await queue.get()) == {'id': 1}
+
+    await forwarder.close()
+    await ingest.close()
+
+
+async def test_worker(path, test_client, loop, travis):
+    """Test a worker answers Travis with what the bot answered."""
+    queue = NotificationQueue(1, loop=loop)
+    ingest = Ingest(path, queue.put, dedupe=Deduplicator())
+    await ingest.start()
+    forwarder = Forwarder(path)
+    app = make_app(forwarder.put, loop, dedupe=False,
+                   certificate=Certificate(travis.fetch, loop=loop))
+    client = await test_client(app)
+
+    statuses = []
+    for build in (1, 1, 2):
+        payload = json.dumps({'id': build, 'state': 'passed'})
+        signature = base64.b64encode(travis.sign(payload.encode('utf-8')))
+        resp = await client.post('/notifications', data={'payload': payload},
+                                 headers={'Signature': signature.decode()})
+        statuses.append(resp.status)
+
+    assert statuses == [200, 200, 503]
+    assert (await queue.get())['id'] == 1
+    resp = await client.get('/stats')
+    assert 'dedupe' not in await resp.json()
+
+    await forwarder.close()
+    await ingest.close()
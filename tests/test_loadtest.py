@@ -0,0 +1,28 @@
+"""Testing the loadtest module."""
+
+from travisbot.loadtest import load
+
+
+async def test_load(loop):
+    """Test every signed webhook is answered, then delivered."""
+    stats = await load(count=40, concurrency=8, builds=4, bits=1024,
+                       batch_window=0)
+
+    assert stats['requests'] == stats['delivered'] == 40
+    assert stats['refused'] == stats['duplicates'] == 0
+    assert stats['messages'] >= 1
+    assert stats['latency']['count'] == 40
+    assert stats['latency']['p99'] >= stats['latency']['p50'] > 0
+    assert stats['delivery_latency']['p50'] >= stats['latency']['p50']
+    assert stats['requests_per_second'] > 0
+
+
+async def test_dedupe(loop):
+    """Test the webhooks of a build already queued are not delivered."""
+    stats = await load(count=20, concurrency=1, builds=2, bits=1024,
+                       batch_window=0, dedupe=True)
+
+    # The ones in flight when their build is delivered count as delivered.
+    assert stats['duplicates'] + stats['delivered'] == 20
+    assert stats['duplicates'] >= 10
+    assert stats['messages'] <= 2
@@ -0,0 +1,67 @@
+"""Testing the logs module."""
+
+import io
+import json
+import logging
+import queue
+import sys
+
+from travisbot.logs import JSONFormatter, QueueHandler, Sampler, setup
+
+
+def make_record(msg, **extra):
+    """Build a record, as the loggers do."""
+    return logging.makeLogRecord(dict(extra, msg=msg, name='test',
+                                      levelname='INFO'))
+
+
+def test_sampler():
+    """Test one record out of rate is kept, by key."""
+    sampler = Sampler(3)
+    kept = [sampler.filter(make_record('x', sample='t')) for _ in range(7)]
+    assert kept == [True, False, False, True, False, False, True]
+    assert sampler.filter(make_record('y', sample='other'))
+    assert sampler.filter(make_record('z'))
+
+
+def test_json():
+    """Test the extra attributes and the exceptions are kept."""
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = make_record('oops', exc_info=sys.exc_info(), shard=1)
+    line = json.loads(JSONFormatter().format(record))
+    assert line['message'] == 'oops'
+    assert line['shard'] == 1
+    assert 'ZeroDivisionError' in line['exc']
+
+
+def test_full():
+    """Test the records are dropped once the queue is full."""
+    handler = QueueHandler(queue.Queue(2))
+    for i in range(5):
+        handler.handle(make_record('%d', args=(i,)))
+    assert handler.dropped == 3
+    assert handler.queue.get_nowait().msg == '0'
+
+
+def test_setup():
+    """Test the records are written by the listener."""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    stream = io.StringIO()
+    listener = setup(logging.DEBUG, stream, sample=2)
+    try:
+        log = logging.getLogger('travisbot.test')
+        for i in range(4):
+            log.debug("event %d", i, extra={'sample': 'event'})
+        log.info("done")
+    finally:
+        listener.stop()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line['message'] for line in lines] == [
+        'event 0', 'event 2', 'done']
+    assert [line.get('count') for line in lines] == [1, 3, None]
@@ -0,0 +1,176 @@
+"""Testing the messages module."""
+
+import asyncio
+
+from aiohttp import ClientConnectionError
+
+from travisbot.api import APIError
+from travisbot.backoff import Backoff
+from travisbot.bot import Bot
+from travisbot.messages import Message, MessageIndex
+from travisbot.travis import notification
+
+
+def make_bot(loop, messages=None):
+    """Create a bot recording the calls instead of sending them."""
+    acked = []
+    bot = Bot('ws://localhost', 'token', None, loop.create_future(),
+              ack=acked.append, state=False, messages=messages)
+    bot.acked = acked
+    bot.calls = []
+    bot.throttled = asyncio.Event()
+    bot.throttled.set()
+
+    async def send_message(channel, data):
+        await bot.throttled.wait()
+        bot.calls.append(('POST', None, [e['title'] for e in data['embeds']]))
+        return {'id': str(len(bot.calls))}
+
+    async def edit_message(channel, message, data):
+        await bot.throttled.wait()
+        if message == 'deleted':
+            raise APIError(404, 'Not Found')
+        bot.calls.append(('PATCH', message,
+                          [e['title'] for e in data['embeds']]))
+        return {'id': message}
+
+    bot.send_message = send_message
+    bot.edit_message = edit_message
+    return bot
+
+
+async def test_edit(loop):
+    """Test the next notifications of a build edit its message."""
+    bot = make_bot(loop)
+    bot.route([notification(1, 'Pending'), notification(2, 'Pending')])
+    await bot.supervisor.join()
+    bot.route([notification(2, 'Passed')])
+    await bot.supervisor.join()
+    bot.route([notification(3, 'Pending')])
+    await bot.supervisor.join()
+
+    assert bot.calls == [
+        ('POST', None, ['greut/travisbot Pending'] * 2),
+        ('PATCH', '1', ['greut/travisbot Pending',
+                        'greut/travisbot Passed']),
+        ('POST', None, ['greut/travisbot Pending'])
+    ]
+    assert len(bot.acked) == 4
+    assert bot.stats()['messages']['hits'] == 1
+
+
+async def test_coalesce(loop):
+    """Test the edits waiting behind a slow call are sent once."""
+    bot = make_bot(loop)
+    bot.throttled.clear()
+    bot.route([notification(1, 'Pending')])
+    await asyncio.sleep(0)
+    for status in ('Passed', 'Fixed', 'Failed'):
+        bot.route([notification(1, status)])
+    bot.throttled.set()
+    await bot.supervisor.join()
+
+    assert bot.calls == [
+        ('POST', None, ['greut/travisbot Pending']),
+        ('PATCH', '1', ['greut/travisbot Failed'])
+    ]
+    channel = bot.stats()['channels'][bot.router.table.default]
+    assert channel['coalesced'] == 2
+    assert channel['sent'] == 2
+    assert len(bot.acked) == 4
+
+
+async def test_deleted(loop):
+    """Test a message deleted meanwhile is posted again."""
+    bot = make_bot(loop)
+    bot.route([notification(1, 'Pending')])
+    await bot.supervisor.join()
+    bot.messages.get(bot.router.table.default, 1).id = 'deleted'
+    bot.route([notification(1, 'Passed')])
+    await bot.supervisor.join()
+
+    assert [call[0] for call in bot.calls] == ['POST', 'POST']
+    assert bot.messages.get(bot.router.table.default, 1).id == '2'
+
+
+async def test_unreachable(loop):
+    """Test a message is sent again once Discord is reachable."""
+    bot = make_bot(loop)
+    send_message = bot.send_message
+    failures = [ClientConnectionError('refused'), asyncio.TimeoutError()]
+
+    async def flaky(channel, data):
+        if failures:
+            raise failures.pop(0)
+        return await send_message(channel, data)
+
+    bot.send_message = flaky
+    bot.route([notification(1, 'Pending'), notification(2, 'Pending')])
+    outbox = bot.outboxes[bot.router.table.default]
+    outbox.backoff = Backoff(0, 0)
+    await bot.supervisor.join()
+
+    assert bot.calls == [('POST', None, ['greut/travisbot Pending'] * 2)]
+    assert len(bot.acked) == 2
+    assert outbox.stats()['errors'] == 2
+
+
+async def test_refused(loop):
+    """Test a message is sent again after a 5xx, not after a 4xx."""
+    bot = make_bot(loop)
+    send_message = bot.send_message
+    failures = [APIError(502, 'Bad Gateway'), APIError(429, 'Too Many'),
+                None, APIError(403, 'Forbidden')]
+
+    async def failing(channel, data):
+        failure = failures.pop(0)
+        if failure is not None:
+            raise failure
+        return await send_message(channel, data)
+
+    bot.send_message = failing
+    bot.route([notification(1, 'Pending')])
+    outbox = bot.outboxes[bot.router.table.default]
+    outbox.backoff = Backoff(0, 0)
+    await bot.supervisor.join()
+    assert len(bot.calls) == 1 and len(bot.acked) == 1
+    assert outbox.stats()['errors'] == 2
+
+    # Refused for good, it is not sent again.
+    bot.route([notification(2, 'Pending')])
+    await bot.supervisor.join()
+    assert len(bot.calls) == 1 and len(bot.acked) == 2
+    assert failures == []
+
+
+async def test_persist(tmpdir, loop):
+    """Test the messages are still edited after a restart."""
+    path = str(tmpdir.join('messages.json'))
+    messages = MessageIndex(path=path, delay=0)
+    bot = make_bot(loop, messages)
+    bot.route([notification(1, 'Pending')])
+    await bot.supervisor.join()
+    await messages.saving
+    assert messages.stats()['saves'] == 1
+    messages.close()
+
+    messages = MessageIndex(path=path)
+    messages.open()
+    bot = make_bot(loop, messages)
+    bot.route([notification(1, 'Passed')])
+    await bot.supervisor.join()
+
+    assert bot.calls == [('PATCH', '1', ['greut/travisbot Passed'])]
+
+
+def test_lru():
+    """Test the least recently used builds are forgotten."""
+    messages = MessageIndex(maxsize=3)
+    for build in range(4):
+        messages.add(Message(1, str(build), [build], [{}]))
+    assert messages.get(1, 1) is not None
+    messages.add(Message(1, '4', [4], [{}]))
+
+    assert list(messages.builds) == [(1, 3), (1, 1), (1, 4)]
+    assert messages.stats()['evicted'] == 2
+    assert [m.id for m in messages.messages()] == ['3', '1', '4']
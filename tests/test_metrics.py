@@ -0,0 +1,36 @@
+"""Testing the metrics module."""
+
+from travisbot.metrics import Registry
+
+
+def test_histogram():
+    """Test the buckets are cumulative, with the sum and the count."""
+    registry = Registry()
+    histogram = registry.histogram('rest_seconds', 'REST calls.',
+                                   ('route',), buckets=(.1, 1))
+    for value in (.05, .1, .5, 2):
+        histogram.observe(value, 'GET /gateway')
+
+    assert histogram.count('GET /gateway') == 4
+    assert histogram.count('POST /') == 0
+    assert registry.render().splitlines()[2:] == [
+        'rest_seconds_bucket{route="GET /gateway",le="0.1"} 2',
+        'rest_seconds_bucket{route="GET /gateway",le="1"} 3',
+        'rest_seconds_bucket{route="GET /gateway",le="+Inf"} 4',
+        'rest_seconds_sum{route="GET /gateway"} 2.65',
+        'rest_seconds_count{route="GET /gateway"} 4'
+    ]
+
+
+def test_gauge():
+    """Test the gauges are read when rendered, the labels escaped."""
+    registry = Registry()
+    depth = [3]
+    registry.gauge('depth', 'Queue depth.', lambda: depth[0])
+    counter = registry.counter('events_total', 'Events.', ('type',))
+    counter.inc('"quoted"', value=2)
+
+    depth[0] = 5
+    lines = registry.render().splitlines()
+    assert 'depth 5' in lines
+    assert r'events_total{type="\"quoted\""} 2' in lines
@@ -0,0 +1,63 @@
+"""Testing the queue module."""
+
+import asyncio
+
+import pytest
+
+from travisbot.queue import (COALESCE, DROP_OLDEST, REJECT, NotificationQueue,
+                             QueueFull)
+
+
+async def test_reject(loop):
+    """Test a full queue refuses new notifications."""
+    queue = NotificationQueue(2, REJECT, loop=loop)
+    await queue.put({'id': 1})
+    await queue.put({'id': 2})
+
+    with pytest.raises(QueueFull):
+        await queue.put({'id': 3})
+
+    assert (await queue.get())['id'] == 1
+    assert queue.stats()['rejected'] == 1
+
+
+async def test_drop_oldest(loop):
+    """Test a full queue forgets the oldest notification."""
+    queue = NotificationQueue(2, DROP_OLDEST, loop=loop)
+    for i in range(3):
+        await queue.put({'id': i})
+
+    assert [await queue.get(), await queue.get()] == [{'id': 1}, {'id': 2}]
+    assert queue.stats()['dropped'] == 1
+
+
+async def test_coalesce(loop):
+    """Test a newer status replaces the queued one, in place."""
+    queue = NotificationQueue(2, COALESCE, loop=loop)
+    await queue.put({'id': 1, 'status': 'pending'})
+    await queue.put({'id': 2, 'status': 'pending'})
+    await queue.put({'id': 1, 'status': 'passed'})
+
+    with pytest.raises(QueueFull):
+        await queue.put({'id': 3, 'status': 'pending'})
+
+    assert (await queue.get())['status'] == 'passed'
+    await queue.put({'id': 1, 'status': 'failed'})
+    assert queue.qsize() == 2
+    assert queue.stats()['coalesced'] == 1
+
+
+async def test_wait(loop):
+    """Test a reader waits for the next notification."""
+    queue = NotificationQueue(loop=loop)
+    cancelled = asyncio.ensure_future(queue.get())
+    task = asyncio.ensure_future(queue.get())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await queue.put({'id': 1})
+
+    assert (await task) == {'id': 1}
+    stats = queue.stats()
+    assert stats['size'] == 0
+    assert stats['get'] == 1
+    assert stats['wait_max'] >= 0
@@ -0,0 +1,103 @@
+"""Testing the rate limits of the api module."""
+
+import pytest
+
+from aiohttp import web
+from travisbot.api import APIError, Client
+
+
+@pytest.fixture
+def app(loop):
+    """Create a fake Discord answering with rate limit headers.
+
+    The bucket allows two calls per 100ms, the global limit kicks in once.
+    """
+    async def messages(request):
+        state = request.app['state']
+        now = loop.time()
+        state['calls'].append(now)
+
+        if state['global']:
+            state['global'] -= 1
+            return web.json_response({'message': 'slow down',
+                                      'retry_after': 50,
+                                      'global': True}, status=429)
+
+        if now >= state['reset']:
+            state['remaining'] = 2
+            state['reset'] = now + .1
+        if not state['remaining']:
+            return web.json_response({'message': 'too fast',
+                                      'retry_after': 100,
+                                      'global': False}, status=429)
+
+        state['remaining'] -= 1
+        return web.json_response({'id': len(state['calls'])}, headers={
+            'X-RateLimit-Limit': '2',
+            'X-RateLimit-Remaining': str(state['remaining']),
+            'X-RateLimit-Reset-After': str(state['reset'] - now)
+        })
+
+    async def forbidden(request):
+        return web.json_response({'message': 'Missing Access'}, status=403)
+
+    app = web.Application(loop=loop)
+    app['state'] = {'calls': [], 'remaining': 2, 'reset': 0, 'global': 0}
+    app.router.add_post('/channels/{id}/messages', messages)
+    app.router.add_post('/channels/{id}/pins', forbidden)
+    return app
+
+
+@pytest.fixture
+def state(app):
+    """Return the state of the fake Discord."""
+    return app['state']
+
+
+@pytest.fixture
+async def client(test_server, app, loop):
+    """Create a client to the fake Discord."""
+    server = await test_server(app)
+    client = Client('secret', url=str(server.make_url('')).rstrip('/'),
+                    loop=loop)
+    yield client
+    await client.close()
+
+
+async def test_bucket(client, state):
+    """Test the calls wait for the bucket to reset, without any 429."""
+    for _ in range(5):
+        await client.request('/channels/1/messages', 'POST', json={})
+
+    calls = state['calls']
+    assert len(calls) == 5
+    assert calls[2] - calls[0] >= .09
+    assert calls[4] - calls[2] >= .09
+    assert client.ratelimit.waited > 0
+
+
+async def test_global(client, state):
+    """Test a global 429 is retried after the given delay."""
+    state['global'] = 1
+    data = await client.request('/channels/1/messages', 'POST', json={})
+
+    calls = state['calls']
+    assert data == {'id': 2}
+    assert calls[1] - calls[0] >= .04
+
+
+async def test_retries(client, state):
+    """Test giving up on a call after too many 429."""
+    state['global'] = client.retries
+
+    with pytest.raises(APIError) as e:
+        await client.request('/channels/1/messages', 'POST', json={})
+    assert e.value.status == 429
+
+
+async def test_error(client):
+    """Test a failure is reported as an exception."""
+    with pytest.raises(APIError) as e:
+        await client.request('/channels/1/pins', 'POST')
+    assert e.value.status == 403
+    assert e.value.body['message'] == 'Missing Access'
@@ -0,0 +1,80 @@
+"""Testing the recorder and replay modules."""
+
+import io
+import json
+import zlib
+
+import pytest
+
+from travisbot.recorder import BINARY, CONNECT, TEXT, WEBHOOK, Recorder, read
+from travisbot.replay import replay
+from travisbot.travis import notification
+
+
+def session(count, compress=None):
+    """Return the frames of a short session, with a webhook."""
+    payloads = [
+        {'op': 10, 'd': {'heartbeat_interval': 45000}},
+        {'op': 0, 's': 1, 't': 'READY', 'd': {
+            'session_id': 'abc', 'user': {}, 'guilds': [],
+            'resume_gateway_url': 'wss://gateway.discord.gg'}}
+    ] + [
+        {'op': 0, 's': i + 2, 't': 'MESSAGE_CREATE', 'd': {'id': str(i)}}
+        for i in range(count)
+    ]
+    url = 'wss://gateway.discord.gg/?v=6&encoding=json'
+    if compress:
+        url += '&compress=' + compress
+        deflator = zlib.compressobj()
+    frames = [(0, CONNECT, url)]
+    for i, payload in enumerate(payloads):
+        data = json.dumps(payload)
+        if compress:
+            frames.append((i / 100, BINARY, deflator.compress(
+                data.encode()) + deflator.flush(zlib.Z_SYNC_FLUSH)))
+        else:
+            frames.append((i / 100, TEXT, data))
+    frames.insert(3, (.015, WEBHOOK, json.dumps(notification(1, 'Passed'))))
+    return frames
+
+
+@pytest.mark.parametrize('compress', (None, 'zlib-stream'))
+async def test_replay(loop, compress):
+    """Test the bot handles every frame, and records them again."""
+    frames = session(20, compress)
+    recorder = Recorder(io.StringIO())
+    stats = await replay(frames, batch_window=0, recorder=recorder)
+
+    assert stats['events'] == 22
+    assert stats['lost'] == 0
+    assert stats['webhooks'] == stats['messages'] == 1
+    assert stats['latency']['count'] == 22
+    assert stats['latency']['p99'] >= stats['latency']['p50'] > 0
+    assert stats['cpu_seconds'] > 0
+    assert stats['peak_memory'] is None
+
+    recorded = list(read(io.StringIO(recorder.file.getvalue())))
+    assert [(kind, data) for _, kind, data in recorded[1:]] == [
+        (kind, data) for _, kind, data in frames[1:] if kind != WEBHOOK]
+    # Resumes stay local.
+    assert recorded[0][2].startswith('ws://127.0.0.1:')
+
+
+async def test_reconnect(loop):
+    """Test the bot resumes where a new connection was captured."""
+    frames = session(4)
+    frames[5:5] = [(.03, CONNECT, frames[0][2]), frames[1]]
+    stats = await replay(frames, batch_window=0)
+
+    assert stats['events'] == 7
+    assert stats['lost'] == 0
+    assert stats['webhooks'] == 1
+
+
+async def test_speed(loop):
+    """Test the captured pace is kept, faster."""
+    frames = session(10)
+    stats = await replay(frames, speed=2, memory=True, batch_window=0)
+
+    assert stats['seconds'] >= .05
+    assert stats['peak_memory'] > 0
@@ -0,0 +1,183 @@
+"""Testing the routing module."""
+
+import asyncio
+import json
+import os
+
+from travisbot.bot import Bot
+from travisbot.queue import NotificationQueue
+from travisbot.routing import Router, Table
+from travisbot.travis import notification
+
+ROUTES = [
+    {'repository': '*/docs', 'channel': 1},
+    {'repository': 'greut/travisbot', 'branch': 'master',
+     'status': ['Broken', 'Failed', 'Still Failing'], 'channel': 2},
+    {'repository': 'greut/*', 'branch': 'release-*', 'channel': 3},
+    {'repository': 'greut/travisbot', 'channel': 4}
+]
+
+
+def test_table():
+    """Test the first route of the file matching wins."""
+    table = Table(ROUTES, default=5)
+
+    assert table.route(notification(1, 'Failed')) == 2
+    assert table.route(notification(1, 'still failing')) == 2
+    assert table.route(notification(1, 'Passed')) == 4
+    assert table.route(notification(1, 'Failed', branch='release-1')) == 3
+    assert table.route(notification(1, 'Passed', name='docs')) == 1
+    assert table.route(notification(1, 'Passed', name='other')) == 5
+    assert table.route(dict(notification(1, 'Passed'), repository={
+        'owner_name': 'acme', 'name': 'docs'})) == 1
+
+    assert len(table.candidates) == 4
+    assert [rule.channel for rule in table.candidates[
+        ('greut', 'travisbot')]] == [2, 3, 4]
+
+
+def test_drop():
+    """Test the notifications matching nothing go nowhere."""
+    router = Router()
+    router.table = Table(ROUTES[:1])
+    assert router.route(notification(1, 'Passed')) is None
+    assert router.stats()['dropped'] == 1
+
+
+async def test_reload(tmpdir, loop):
+    """Test the file is reloaded when changed, unless invalid."""
+    path = str(tmpdir.join('routes.json'))
+    with open(path, 'w') as f:
+        json.dump({'default': '7', 'routes': ROUTES}, f)
+    router = Router(path, interval=.01)
+    assert router.route(notification(1, 'Passed')) == 4
+
+    watching = asyncio.ensure_future(router.watch())
+    with open(path, 'w') as f:
+        json.dump({'routes': [{'repository': 'greut/*', 'channel': 8}]}, f)
+    os.utime(path, (0, 1))
+    await asyncio.sleep(.05)
+    assert router.route(notification(1, 'Passed')) == 8
+    assert router.table.default == router.default
+
+    with open(path, 'w') as f:
+        f.write('{"routes": [{"repository": "greut/*"}]}')
+    os.utime(path, (0, 2))
+    await asyncio.sleep(.05)
+    watching.cancel()
+
+    assert router.route(notification(1, 'Passed')) == 8
+    assert router.stats()['reloads'] == 2
+    assert router.stats()['errors'] == 1
+
+
+async def test_outboxes(loop):
+    """Test a throttled channel does not hold the others back."""
+    router = Router()
+    router.table = Table([{'repository': 'greut/slow', 'channel': 1},
+                          {'repository': 'greut/*', 'channel': 2}])
+    acked = []
+    bot = Bot('ws://localhost', 'token', None, loop.create_future(),
+              ack=acked.append, router=router, channel_queue_size=2,
+              state=False)
+    throttled = asyncio.Event()
+    sent = []
+
+    async def send_message(channel, data):
+        if channel == 1:
+            await throttled.wait()
+        sent.append((channel, len(data['embeds'])))
+        return {'id': str(len(sent))}
+
+    bot.send_message = send_message
+    for i in range(4):
+        bot.route([notification(i, 'Passed', name='slow'),
+                   notification(i, 'Passed', name='fast')])
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    assert sent == [(2, 1)] * 4
+    assert bot.stats()['channels'][1] == {
+        'sent': 0, 'coalesced': 0, 'errors': 0, 'waiting': 3}
+
+    throttled.set()
+    await bot.supervisor.join()
+    assert sent[4:] == [(1, 1)] * 4
+    assert len(acked) == 8
+
+
+async def test_backpressure(loop):
+    """Test the queue is no longer read while an outbox is full."""
+    router = Router()
+    router.table = Table([{'repository': 'greut/*', 'channel': 1}])
+    queue = NotificationQueue(maxsize=10)
+    acked = []
+    bot = Bot('ws://localhost', 'token', queue.get, loop.create_future(),
+              ack=acked.append, router=router, channel_queue_size=2,
+              batch_window=0, state=False)
+    throttled = asyncio.Event()
+
+    async def send_message(channel, data):
+        await throttled.wait()
+        return {'id': '1'}
+
+    bot.send_message = send_message
+    for i in range(6):
+        await queue.put(notification(i, 'Passed'))
+    bot.ws_running = loop.create_future()
+    consuming = asyncio.ensure_future(bot.consume())
+    await asyncio.sleep(.05)
+
+    # One message being sent, two waiting, one held back, the rest is left
+    # in the queue.
+    assert bot.stats()['channels'][1]['waiting'] == 2
+    assert bot.stats()['held'] == 1
+    assert queue.qsize() == 2
+
+    throttled.set()
+    await asyncio.sleep(.05)
+    assert queue.qsize() == 0
+    bot.ws_running.set_result(None)
+    await asyncio.wait_for(consuming, 1)
+    await bot.supervisor.join()
+    assert len(acked) == 6
+
+
+async def test_slow_channel(loop):
+    """Test a full outbox does not hold the other channels back."""
+    router = Router()
+    router.table = Table([{'repository': 'greut/slow', 'channel': 1},
+                          {'repository': 'greut/*', 'channel': 2}])
+    queue = NotificationQueue(maxsize=10)
+    acked = []
+    bot = Bot('ws://localhost', 'token', queue.get, loop.create_future(),
+              ack=acked.append, router=router, channel_queue_size=2,
+              batch_window=0, state=False)
+    throttled = asyncio.Event()
+    sent = []
+
+    async def send_message(channel, data):
+        if channel == 1:
+            await throttled.wait()
+        sent.append(channel)
+        return {'id': str(len(sent))}
+
+    bot.send_message = send_message
+    for i in range(3):
+        await queue.put(notification(i, 'Passed', name='slow'))
+    for i in range(5):
+        await queue.put(notification(10 + i, 'Passed', name='fast'))
+    bot.ws_running = loop.create_future()
+    consuming = asyncio.ensure_future(bot.consume())
+    await asyncio.sleep(.05)
+
+    # The slow channel is full, the fast one drained the queue.
+    assert bot.stats()['channels'][1]['waiting'] == 2
+    assert sent == [2] * 5
+    assert queue.qsize() == 0
+
+    throttled.set()
+    bot.ws_running.set_result(None)
+    await asyncio.wait_for(consuming, 1)
+    await bot.supervisor.join()
+    assert len(acked) == 8
@@ -0,0 +1,141 @@
+"""Testing the shard module."""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from aiohttp import ClientConnectionError, WSMsgType, web
+from travisbot.api import Client
+from travisbot.shard import ShardCrashed, ShardManager
+from travisbot.travis import notification
+
+GUILD_ID = 1 << 22
+"""A guild of the second shard, out of two."""
+
+
+@pytest.fixture
+def app(loop):
+    """Create a fake Discord gateway, asking for two shards."""
+    async def gateway_bot(request):
+        return web.json_response({
+            'url': 'ws://{}/gateway'.format(request.host),
+            'shards': 2,
+            'session_start_limit': {'max_concurrency': 1}
+        })
+
+    async def channel(request):
+        return web.json_response({'id': request.match_info['id'],
+                                  'guild_id': str(GUILD_ID)})
+
+    async def messages(request):
+        request.app['state']['messages'].append(await request.json())
+        return web.json_response({'id': '1'})
+
+    async def gateway(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({'op': 10, 'd': {'heartbeat_interval': 45000}})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            data = msg.json()
+            if data['op'] == 2 and request.app['state']['refused']:
+                await ws.close(code=4004)
+            elif data['op'] == 2:
+                request.app['state']['identified'].append(
+                    (loop.time(), data['d']['shard']))
+                await ws.send_json({'op': 0, 's': 1, 't': 'READY', 'd': {
+                    'session_id': 'abc', 'user': {}, 'guilds': []}})
+        return ws
+
+    app = web.Application(loop=loop)
+    app['state'] = {'identified': [], 'messages': [], 'refused': False}
+    app.router.add_get('/gateway/bot', gateway_bot)
+    app.router.add_get('/gateway', gateway)
+    app.router.add_get('/channels/{id}', channel)
+    app.router.add_post('/channels/{id}/messages', messages)
+    return app
+
+
+@pytest.mark.parametrize('processes', (0, 1))
+async def test_manager(loop, test_server, app, processes):
+    """Test the shards identify in turn and get their notifications."""
+    server = await test_server(app)
+    state = app['state']
+    queue = asyncio.Queue()
+    acked = []
+    manager = ShardManager('token', queue.get, loop.create_future(),
+                           client=Client('token', url=str(
+                               server.make_url('')).rstrip('/')),
+                           processes=processes, identify_delay=.1,
+                           ack=acked.append, compress=None, batch_window=0)
+    await manager.start()
+    await queue.put(notification(1, 'Passed'))
+
+    for _ in range(100):
+        if acked and len(manager.ready) == 2:
+            break
+        await asyncio.sleep(.05)
+    await manager.stop()
+
+    (first, a), (second, b) = state['identified']
+    assert sorted([a, b]) == [[0, 2], [1, 2]]
+    assert second - first >= .1
+    assert manager.stats()['ready'] == [0, 1]
+    assert manager.routed == [0, 1]
+    assert manager.guilds == {manager.channel_id: str(GUILD_ID)}
+    assert [data['id'] for data in acked] == [1]
+    assert len(state['messages']) == 1
+
+
+async def test_crashed(loop, test_server, app):
+    """Test the manager stops once a shard gives up."""
+    server = await test_server(app)
+    app['state']['refused'] = True
+    manager = ShardManager('token', asyncio.Queue().get, loop.create_future(),
+                           client=Client('token', url=str(
+                               server.make_url('')).rstrip('/')),
+                           processes=0, identify_delay=0, compress=None)
+
+    with pytest.raises(ShardCrashed) as e:
+        await asyncio.wait_for(manager.run(), 5)
+    assert e.value.args[0] in (0, 1)
+    assert 'GatewayClosed(4004)' in e.value.args[1]
+
+
+async def test_unreachable(loop):
+    """Test a channel not fetched goes to the first shard, until it is."""
+    failures = [ClientConnectionError('refused'), asyncio.TimeoutError()]
+
+    class FlakyClient(Client):
+        async def request(self, path, *args, **kwargs):
+            if failures:
+                raise failures.pop(0)
+            return {'id': path.split('/')[-1], 'guild_id': str(GUILD_ID)}
+
+    manager = ShardManager('token', None, loop.create_future(),
+                           client=FlakyClient('token'))
+    manager.count = 2
+    assert await manager.route(1) == 0
+    assert await manager.route(1) == 0
+    assert await manager.route(1) == 1
+    assert manager.guilds == {1: str(GUILD_ID)}
+
+
+async def test_pump(loop):
+    """Test the manager fails once the notifications are no longer routed."""
+    async def get():
+        raise RuntimeError('broken queue')
+
+    manager = ShardManager('token', get, loop.create_future(),
+                           gateway={'url': 'ws://localhost', 'shards': 1},
+                           processes=0)
+
+    async def run_shards(*args):
+        pass
+
+    with patch('travisbot.shard._run_shards', run_shards):
+        with pytest.raises(ShardCrashed) as e:
+            await asyncio.wait_for(manager.run(), 5)
+    assert 'broken queue' in e.value.args[1]
@@ -0,0 +1,129 @@
+"""Testing the spool module."""
+
+import os
+
+import pytest
+
+from travisbot.queue import DROP_OLDEST, NotificationQueue, QueueFull
+from travisbot.spool import Spool
+
+
+def reopen(spool, loop):
+    """Open the spool again, as after a restart."""
+    spool.close()
+    queue = NotificationQueue(loop=loop)
+    spool = Spool(spool.directory, queue.put,
+                  segment_size=spool.segment_size, loop=loop)
+    return spool, queue, spool.open()
+
+
+async def test_replay(tmpdir, loop):
+    """Test the notifications not delivered are replayed."""
+    queue = NotificationQueue(loop=loop)
+    spool = Spool(str(tmpdir), queue.put, loop=loop)
+    assert spool.open() == []
+
+    for i in range(3):
+        await spool.put({'id': i})
+    spool.ack(await queue.get())
+    await spool.sync()
+
+    spool, queue, notifications = reopen(spool, loop)
+    assert [n['id'] for n in notifications] == [1, 2]
+
+    await spool.replay(notifications)
+    assert queue.qsize() == 2
+    spool.close()
+
+
+async def test_superseded(tmpdir, loop):
+    """Test delivering the latest status of a build acks the older ones."""
+    queue = NotificationQueue(loop=loop)
+    spool = Spool(str(tmpdir), queue.put, loop=loop)
+    spool.open()
+
+    await spool.put({'id': 1, 'state': 'started'})
+    await spool.put({'id': 2, 'state': 'started'})
+    await spool.put({'id': 1, 'state': 'passed'})
+    for _ in range(2):
+        await queue.get()
+    spool.ack(await queue.get())
+    await spool.sync()
+
+    spool, queue, notifications = reopen(spool, loop)
+    assert notifications == [{'id': 2, 'state': 'started', '_spool': (0, 27)}]
+    spool.close()
+
+
+async def test_dropped(tmpdir, loop):
+    """Test the notifications dropped by the queue no longer hold it."""
+    queue = NotificationQueue(2, DROP_OLDEST, loop=loop)
+    spool = Spool(str(tmpdir), queue.put, loop=loop)
+    queue.on_drop = spool.drop
+    spool.open()
+
+    await spool.put({'id': 1, 'state': 'started'})
+    await spool.put({'id': 2, 'state': 'started'})
+    await spool.put({'id': 3, 'state': 'started'})
+    spool.ack(await queue.get())
+    await spool.sync()
+    assert spool.stats()['dropped'] == 1
+    assert spool.checkpoint > (0, 0)
+
+    spool, queue, notifications = reopen(spool, loop)
+    assert [n['id'] for n in notifications] == [3]
+    spool.close()
+
+
+async def test_refused(tmpdir, loop):
+    """Test a refused notification does not release the queued ones."""
+    queue = NotificationQueue(1, loop=loop)
+    spool = Spool(str(tmpdir), queue.put, loop=loop)
+    spool.open()
+
+    await spool.put({'id': 1, 'state': 'started'})
+    with pytest.raises(QueueFull):
+        await spool.put({'id': 1, 'state': 'passed'})
+    assert len(spool.pending) == 1
+    await spool.sync()
+
+    spool, queue, notifications = reopen(spool, loop)
+    assert [n['state'] for n in notifications] == ['started']
+    spool.close()
+
+
+async def test_torn_write(tmpdir, loop):
+    """Test a partially written notification is discarded."""
+    queue = NotificationQueue(loop=loop)
+    spool = Spool(str(tmpdir), queue.put, loop=loop)
+    spool.open()
+    await spool.put({'id': 1})
+    spool.file.write(b'{"id":')
+    spool.close()
+
+    spool, queue, notifications = reopen(spool, loop)
+    assert [n['id'] for n in notifications] == [1]
+    await spool.put({'id': 2})
+
+    spool, queue, notifications = reopen(spool, loop)
+    assert [n['id'] for n in notifications] == [1, 2]
+    spool.close()
+
+
+async def test_rotation(tmpdir, loop):
+    """Test the delivered segments are removed."""
+    queue = NotificationQueue(loop=loop)
+    spool = Spool(str(tmpdir), queue.put, segment_size=20, loop=loop)
+    spool.open()
+
+    for i in range(5):
+        await spool.put({'id': i, 'x': 'y'})
+    assert len(os.listdir(str(tmpdir))) == 3
+
+    for _ in range(4):
+        spool.ack(await queue.get())
+    await spool.sync()
+
+    assert spool.segments() == [2]
+    assert spool.stats()['pending'] == 1
+    spool.close()
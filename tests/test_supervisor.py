@@ -0,0 +1,59 @@
+"""Testing the supervisor module."""
+
+import asyncio
+
+from travisbot.supervisor import Supervisor
+
+
+async def test_limit(loop):
+    """Test the tasks over the limit wait for a slot."""
+    supervisor = Supervisor({'event': 2})
+    release = asyncio.Event()
+    started = []
+
+    async def work(i):
+        started.append(i)
+        await release.wait()
+
+    tasks = [supervisor.spawn(work(i), 'event') for i in range(5)]
+    supervisor.spawn(work('other'))
+    await asyncio.sleep(0)
+
+    assert tasks[2:] == [None] * 3
+    assert sorted(started, key=str) == [0, 1, 'other']
+    assert len(supervisor) == 6
+    assert supervisor.stats()['event'] == {
+        'running': 2, 'waiting': 3, 'done': 0, 'errors': 0}
+
+    release.set()
+    await supervisor.join()
+    assert sorted(started, key=str) == [0, 1, 2, 3, 4, 'other']
+    assert len(supervisor) == 0
+    assert supervisor.stats()['event']['done'] == 5
+
+
+async def test_errors(loop):
+    """Test the exceptions are reported, not lost."""
+    errors = []
+    supervisor = Supervisor(on_error=lambda c, e: errors.append((c, e)))
+
+    async def fail():
+        raise ValueError("boom")
+
+    supervisor.spawn(fail(), 'send')
+    await supervisor.join()
+
+    assert [(c, str(e)) for c, e in errors] == [('send', 'boom')]
+    assert supervisor.stats()['send']['errors'] == 1
+
+
+async def test_cancel(loop):
+    """Test the tasks are cancelled, the waiting ones dropped."""
+    supervisor = Supervisor({'event': 1})
+    for _ in range(2):
+        supervisor.spawn(asyncio.sleep(10), 'event')
+    supervisor.cancel()
+    await supervisor.join()
+
+    assert len(supervisor) == 0
+    assert supervisor.stats()['event']['errors'] == 0
@@ -1,17 +1,23 @@
 """Testing the web module."""
 
 import asyncio
+import base64
+import json
 import pytest
 
 from aiohttp import web
+from travisbot.certificate import Certificate
+from travisbot.metrics import REST_SAVED, WEBHOOKS
+from travisbot.queue import NotificationQueue
 from travisbot.web import make_app
 
 
 @pytest.fixture
-def app(loop):
+def app(loop, travis):
     """Create the app for testing."""
     queue = asyncio.Queue(loop=loop)
-    app = make_app(queue.put, loop)
+    certificate = Certificate(travis.fetch, loop=loop)
+    app = make_app(queue.put, loop, certificate=certificate)
 
     app['config']['queue'] = queue
 
@@ -29,3 +35,115 @@ async def test_fake(test_client, app):
 
     status = await app['config']['queue'].get()
     assert 'status_message' in status
+
+
+async def test_notifications(test_client, app, travis):
+    """Test a signed notification is queued, a forged one is not."""
+    client = await test_client(app)
+    payload = json.dumps({'id': 1, 'status_message': 'Passed'})
+    signature = base64.b64encode(travis.sign(payload.encode('utf-8')))
+
+    resp = await client.post('/notifications', data={'payload': payload},
+                             headers={'Signature': signature.decode()})
+    assert (await resp.json())['ok']
+    assert travis.fetches == 1
+
+    resp = await client.post('/notifications', data={'payload': payload},
+                             headers={'Signature': 'Zm9yZ2Vk'})
+    assert not (await resp.json())['ok']
+
+    status = await app['config']['queue'].get()
+    assert status['id'] == 1
+    assert app['config']['queue'].empty()
+
+
+async def test_duplicate(test_client, app, travis):
+    """Test a webhook delivered again is acknowledged, but not queued."""
+    saved = REST_SAVED.get('duplicate')
+    client = await test_client(app)
+    payload = json.dumps({'id': 1, 'state': 'passed'})
+    signature = base64.b64encode(travis.sign(payload.encode('utf-8')))
+
+    for _ in range(2):
+        resp = await client.post('/notifications', data={'payload': payload},
+                                 headers={'Signature': signature.decode()})
+        assert resp.status == 200
+        assert (await resp.json())['ok']
+
+    assert app['config']['queue'].qsize() == 1
+    assert REST_SAVED.get('duplicate') == saved + 1
+    resp = await client.get('/stats')
+    assert (await resp.json())['dedupe']['duplicates'] == 1
+
+
+async def test_full(test_client, loop, travis):
+    """Test a full queue is reported with a 503."""
+    queue = NotificationQueue(1, loop=loop)
+    app = make_app(queue.put, loop, stats={'queue': queue.stats},
+                   certificate=Certificate(travis.fetch, loop=loop))
+    client = await test_client(app)
+
+    resp = await client.get('/notifications')
+    assert resp.status == 200
+    resp = await client.get('/notifications')
+    assert resp.status == 503
+
+    payload = json.dumps({'id': 1, 'state': 'passed'})
+    signature = base64.b64encode(travis.sign(payload.encode('utf-8')))
+    for _ in range(2):
+        # Not remembered, Travis retries it.
+        resp = await client.post('/notifications', data={'payload': payload},
+                                 headers={'Signature': signature.decode()})
+        assert resp.status == 503
+
+    resp = await client.get('/stats')
+    data = await resp.json()
+    assert data['queue']['size'] == 1
+    assert data['queue']['rejected'] == 3
+    assert data['dedupe']['duplicates'] == 0
+
+
+async def test_metrics(test_client, app, travis):
+    """Test the webhooks are counted, and exposed for Prometheus."""
+    verified = WEBHOOKS.get('verified')
+    rejected = WEBHOOKS.get('rejected')
+    client = await test_client(app)
+    payload = json.dumps({'id': 1})
+    signature = base64.b64encode(travis.sign(payload.encode('utf-8')))
+
+    for sig in (signature.decode(), 'Zm9yZ2Vk'):
+        await client.post('/notifications', data={'payload': payload},
+                          headers={'Signature': sig})
+
+    assert WEBHOOKS.get('verified') == verified + 1
+    assert WEBHOOKS.get('rejected') == rejected + 1
+
+    resp = await client.get('/metrics')
+    assert resp.status == 200
+    text = await resp.text()
+    assert '# TYPE travisbot_verify_seconds histogram' in text
+    assert 'travisbot_webhooks_total{{result="verified"}} {}'.format(
+        verified + 1) in text
+    assert 'travisbot_verify_seconds_bucket{le="+Inf"}' in text
+
+
+async def test_no_webhooks(test_client, loop):
+    """Test only the statistics and metrics are served, e.g. with workers."""
+    async def fetch():
+        raise AssertionError('not fetched without webhooks')
+
+    queue = NotificationQueue(1, loop=loop)
+    app = make_app(queue.put, loop, stats={'queue': queue.stats},
+                   certificate=Certificate(fetch, loop=loop), webhooks=False)
+    client = await test_client(app)
+
+    resp = await client.get('/notifications')
+    assert resp.status == 404
+    resp = await client.post('/notifications', data={'payload': '{}'})
+    assert resp.status == 404
+    assert queue.qsize() == 0
+
+    resp = await client.get('/stats')
+    assert (await resp.json())['queue']['size'] == 0
+    resp = await client.get('/metrics')
+    assert resp.status == 200
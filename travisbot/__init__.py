@@ -2,7 +2,7 @@
 
 import sys
 
-from .api import api  # noqa
+from .api import Client, api  # noqa
 from .bot import Bot  # noqa
 from .conf import URL, HOST, PORT, TRAVIS_CONFIG_URL  # noqa
 from .web import make_app  # noqa
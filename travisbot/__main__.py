@@ -1,37 +1,76 @@
 """Main program."""
 
+import argparse
 import asyncio
 import logging
 import os
+import signal
 import sys
+import tempfile
 import warnings
 
-from . import HOST, PORT, Bot, api, make_app
+from . import HOST, PORT, Bot, Client, api, logs, make_app
+from .certificate import EXECUTORS, Certificate, make_executor
+from .conf import (DEDUPE_SIZE, DEDUPE_TTL, LOG_SAMPLE, QUEUE_POLICY,
+                   QUEUE_SIZE, VERIFY_EXECUTOR, VERIFY_WORKERS)
+from .dedupe import Deduplicator
+from .ingest import Ingest, start_workers, stop_workers
+from .messages import MessageIndex
+from .metrics import REGISTRY
+from .queue import POLICIES, NotificationQueue
+from .recorder import Recorder
+from .routing import Router
+from .shard import ShardManager
+from .spool import Spool
 
+log = logging.getLogger('travisbot')
 
-async def main(token, queue, running):
-    """Run main program."""
-    response = await api("/gateway")
-    bot = Bot(response['url'], token, queue, running)
+
+async def main(token, queue, running, ack=None, stats=None, shards=None,
+               processes=None, recorder=None, router=None, messages=None):
+    """Run main program.
+
+    The bot is sharded when Discord recommends it, or when asked to. Only
+    the frames of an unsharded bot are recorded.
+    """
+    client = Client(token)
+    try:
+        response = await api("/gateway/bot", client=client)
+    except Exception:
+        await client.close()
+        raise
+    if (shards or response['shards']) > 1:
+        manager = ShardManager(token, queue, running, client=client,
+                               gateway=response, shards=shards,
+                               processes=processes, ack=ack, router=router,
+                               messages=messages and messages.path)
+        if stats is not None:
+            stats['shards'] = manager.stats
+        log.info("starting %d shards", shards or response['shards'])
+        if recorder is not None:
+            log.warning("the gateway frames of the shards are not recorded")
+        await manager.run()
+        return
+
+    bot = Bot(response['url'], token, queue, running, client=client, ack=ack,
+              recorder=recorder, router=router, messages=messages)
+    if stats is not None:
+        stats['gateway'] = bot.stats
 
     @bot.event()
     async def on_ready(data):
         """Handle the READY event."""
         bot.user = data['user']
-        print(("connected as {user[username]}"
-               "#{user[discriminator]}").format(user=bot.user))
+        log.info("connected as %s#%s", bot.user['username'],
+                 bot.user['discriminator'])
 
     @bot.event()
     async def on_guild_create(data):
-        """Handle the GUILD_CREATE event."""
-        bot.guilds[data['id']] = data
-        print("joined {data[name]}".format(data=data))
+        """Handle the GUILD_CREATE event, once in the state."""
+        guild = bot.state.get_guild(data['id'])
+        log.info("joined %s (%d members)", guild.name, len(guild.members))
 
-    @bot.event()
-    async def on_presence_update(data):
-        """Handle the PRESENCE_UPDATE event."""
-        # XXX update the guilds.presences list.
-        print("{data[user][id]} is {data[status]}".format(data=data))
+    # The presences and other guild events update bot.state.
 
     # Other events:
     # on_typing_start
@@ -43,40 +82,179 @@ async def main(token, queue, running):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m travisbot",
+                                     description="Travis bot for Discord.")
+    parser.add_argument("--debug", action="store_true",
+                        help="asyncio debug mode, slowing the event loop")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--log-sample", type=int, default=LOG_SAMPLE,
+                        help="log one frequent event out of that many")
+    parser.add_argument("--record", metavar="PATH",
+                        help="capture the gateway frames and the webhooks")
+    parser.add_argument("--routes", metavar="PATH",
+                        help="channels of the repositories, as JSON")
+    parser.add_argument("--messages", metavar="PATH",
+                        help="keep the messages of the builds, to edit them "
+                             "after a restart")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="processes serving the webhooks, apart from "
+                             "the gateway")
+    parser.add_argument("--socket", metavar="PATH",
+                        default=os.path.join(tempfile.gettempdir(),
+                                             "travisbot-{}.sock".format(
+                                                 os.getpid())),
+                        help="where the workers forward the webhooks")
+    # The options below default from the environment variable of the same
+    # name, e.g. QUEUE_SIZE.
+    parser.add_argument("--queue-size", type=int,
+                        default=os.environ.get('QUEUE_SIZE', QUEUE_SIZE),
+                        help="notifications waiting to be sent")
+    parser.add_argument("--queue-policy", choices=POLICIES,
+                        default=os.environ.get('QUEUE_POLICY', QUEUE_POLICY),
+                        help="what to do with a notification once full")
+    parser.add_argument("--spool", metavar="PATH",
+                        default=os.environ.get('SPOOL'),
+                        help="keep the notifications until delivered, to "
+                             "replay them after a restart")
+    parser.add_argument("--verify-executor", choices=EXECUTORS,
+                        default=os.environ.get('VERIFY_EXECUTOR',
+                                               VERIFY_EXECUTOR),
+                        help="where the webhook signatures are checked")
+    parser.add_argument("--verify-workers", type=int,
+                        default=os.environ.get('VERIFY_WORKERS',
+                                               VERIFY_WORKERS),
+                        help="threads or processes checking them")
+    parser.add_argument("--dedupe-ttl", type=float,
+                        default=os.environ.get('DEDUPE_TTL', DEDUPE_TTL),
+                        help="seconds a webhook is remembered, to skip it "
+                             "when delivered again")
+    parser.add_argument("--dedupe-size", type=int,
+                        default=os.environ.get('DEDUPE_SIZE', DEDUPE_SIZE),
+                        help="webhooks remembered")
+    parser.add_argument("--shards", type=int,
+                        default=os.environ.get('SHARDS'),
+                        help="gateway shards, as recommended by Discord by "
+                             "default")
+    parser.add_argument("--shard-processes", type=int,
+                        default=os.environ.get('SHARD_PROCESSES'),
+                        help="processes running the shards, one per CPU by "
+                             "default")
+    args = parser.parse_args()
+
     token = os.environ.get('TOKEN')
     if not token:
         print("Please put the TOKEN in the env variables.", file=sys.stderr)
         sys.exit(1)
 
-    debug = True
+    listener = logs.setup(args.log_level, sample=args.log_sample)
+
+    queue = NotificationQueue(maxsize=args.queue_size,
+                              policy=args.queue_policy)
+
+    stats = {'queue': queue.stats}
+    REGISTRY.gauge('travisbot_queue_depth',
+                   "Notifications waiting to be sent.", queue.qsize)
+    put, ack = queue.put, None
+
+    spool = None
+    if args.spool:
+        spool = Spool(args.spool, queue.put)
+        put, ack = spool.put, spool.ack
+        queue.on_drop = spool.drop
+        stats['spool'] = spool.stats
 
-    queue = asyncio.Queue()
+    verify = {
+        'executor': args.verify_executor,
+        'verify_workers': args.verify_workers
+    }
+    executor = make_executor(verify['executor'], verify['verify_workers'])
 
-    app = make_app(queue.put)
+    recorder = Recorder(args.record) if args.record else None
+
+    router = Router(args.routes)
+    stats['routes'] = router.stats
+
+    messages = MessageIndex(path=args.messages)
+    messages.open()
+
+    dedupe = Deduplicator(ttl=args.dedupe_ttl, maxsize=args.dedupe_size)
+
+    ingest = None
+    if args.workers:
+        ingest = Ingest(args.socket, put, dedupe=dedupe, recorder=recorder)
+        stats['ingest'] = ingest.stats
+
+    # With workers, only the statistics and metrics of the bot.
+    app = make_app(put, stats=stats,
+                   certificate=Certificate(executor=executor),
+                   recorder=recorder, dedupe=dedupe,
+                   webhooks=ingest is None)
 
     loop = asyncio.get_event_loop()
-    if debug:
+    if args.debug:
         loop.set_debug(True)
         logging.getLogger('asyncio').setLevel(logging.DEBUG)
-        logging.getLogger('asyncio').addHandler(logging.StreamHandler())
         warnings.simplefilter('always', ResourceWarning)
     handler = app.make_handler(loop=loop)
     loop.run_until_complete(app.startup())
 
-    server = loop.create_server(handler, host=HOST, port=PORT)
+    port, workers = PORT, []
+    if ingest:
+        loop.run_until_complete(ingest.start())
+        workers = start_workers(args.workers, args.socket, HOST, PORT,
+                                log_level=args.log_level, **verify)
+        log.info("%d workers listening on %s:%s", len(workers), HOST, PORT)
+        # The bot listens on the next port.
+        port = PORT + 1
+
+    if args.routes:
+        # Reloaded when changed, or right away on SIGHUP.
+        asyncio.ensure_future(router.watch())
+        loop.add_signal_handler(signal.SIGHUP, router.reload)
+
+    if spool:
+        notifications = spool.open()
+        log.info("replaying %d notifications", len(notifications))
+        asyncio.ensure_future(spool.replay(notifications))
+
+    def stopped(task):
+        """Stop the program when the bot stopped on its own."""
+        if not running.done():
+            running.set_result(None)
+
+    status = 0
+    server = loop.create_server(handler, host=HOST, port=port)
     try:
         srv = loop.run_until_complete(server)
-        print("Listening on {HOST}:{PORT}... Ctrl-C to close."
-              .format(HOST=HOST, PORT=PORT))
+        log.info("listening on %s:%s, Ctrl-C to close", HOST, port)
 
         running = asyncio.Future()
-        task = asyncio.ensure_future(main(token, queue.get, running))
+        task = asyncio.ensure_future(main(
+            token, queue.get, running, ack, app['stats'],
+            shards=args.shards, processes=args.shard_processes,
+            recorder=recorder, router=router, messages=messages))
+        # e.g. the token is refused, or a shard crashed.
+        task.add_done_callback(stopped)
         loop.run_until_complete(running)
+        loop.run_until_complete(task)
     except KeyboardInterrupt:
-        print("Closing...")
+        log.info("closing")
         running.cancel()
-        loop.run_forever()
-        running.exception()
+        loop.run_until_complete(asyncio.wait([task]))
+    except Exception:
+        log.exception("the bot stopped")
+        status = 1
     finally:
         srv.close()
+        if ingest:
+            stop_workers(workers)
+            loop.run_until_complete(ingest.close())
+        if spool:
+            spool.close()
+        if recorder:
+            recorder.close()
+        messages.close()
         loop.close()
+        listener.stop()
+    sys.exit(status)
@@ -1,25 +1,149 @@
 """Discord REST API tools."""
 
-from aiohttp import ClientSession
+import time
 
-from .conf import URL
+from aiohttp import ClientSession, TCPConnector
 
+from .codec import get_codec
+from .conf import KEEPALIVE_TIMEOUT, LIMIT_PER_HOST, RETRIES, URL
+from .metrics import REST_RESPONSES, REST_SECONDS, route_label
+from .ratelimit import RateLimiter, retry_after, route
 
-async def api(path, method="GET", token=None, **kwargs):
-    """Return the JSON body of a call to Discord REST API."""
-    defaults = {
-        "headers": {
-            "User-Agent": "TravisBot (https://github.com/greut/travisbot)"
-        }
-    }
+USER_AGENT = "TravisBot (https://github.com/greut/travisbot)"
 
-    if token:
-        defaults["headers"]["Authorization"] = "Bot {0}".format(token)
 
-    kwargs = dict(defaults, **kwargs)
+class APIError(Exception):
+    """Unsuccessful call to the Discord REST API."""
 
-    with ClientSession() as session:
-        url = "{URL}{path}".format(URL=URL, path=path)
-        async with session.request(method, url, **kwargs) as response:
-            assert 200 == response.status, response.reason
-            return await response.json()
+    def __init__(self, status, reason, body=None):
+        """Init the error from the response."""
+        super().__init__(status, reason)
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+    @property
+    def temporary(self):
+        """Tell whether the call may succeed later, e.g. Discord is down."""
+        return self.status == 429 or self.status >= 500
+
+
+class Client:
+    """Long-lived Discord REST client sharing one keep-alive connection pool.
+
+    The underlying :class:`aiohttp.ClientSession` is created lazily, on the
+    first request, so the client may be built outside of a running loop.
+    """
+
+    def __init__(self, token=None, url=URL, limit_per_host=LIMIT_PER_HOST,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, retries=RETRIES,
+                 codec=None, loop=None):
+        """Init the client.
+
+        :param token: The Discord API token
+        :param url: The Discord HTTP API endpoint
+        :param limit_per_host: Maximum of simultaneous connections per host
+        :param keepalive_timeout: Seconds an idle connection is kept open
+        :param retries: Attempts at a call answered by a 429
+        :param codec: JSON library name, the fastest installed by default.
+        """
+        self.token = token
+        self.url = url
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.retries = retries
+        self.codec = get_codec(codec)
+        self.loop = loop
+
+        self.ratelimit = RateLimiter(loop=loop)
+        """Rate limit buckets of the Discord REST API."""
+
+        self.session = None
+        """Shared HTTP session, see :meth:`open`."""
+
+    @property
+    def closed(self):
+        """Tell whether the connection pool is shut (or never opened)."""
+        return self.session is None or self.session.closed
+
+    def open(self):
+        """Return the shared session, creating it when needed."""
+        if self.closed:
+            connector = TCPConnector(limit_per_host=self.limit_per_host,
+                                     keepalive_timeout=self.keepalive_timeout,
+                                     loop=self.loop)
+            self.session = ClientSession(connector=connector,
+                                         headers={"User-Agent": USER_AGENT},
+                                         json_serialize=self.codec.dumps,
+                                         loop=self.loop)
+        return self.session
+
+    async def close(self):
+        """Close the shared session and all its pooled connections."""
+        if not self.closed:
+            await self.session.close()
+        self.session = None
+
+    async def request(self, path, method="GET", token=None, **kwargs):
+        """Return the JSON body of a call to Discord REST API.
+
+        Calls are held back while their bucket is exhausted, and retried
+        after the given delay when rate limited anyway.
+
+        :raises APIError: when the call fails or is rate limited too often.
+        """
+        token = token or self.token
+        if token:
+            headers = dict(kwargs.pop("headers", {}))
+            headers.setdefault("Authorization", "Bot {0}".format(token))
+            kwargs["headers"] = headers
+
+        url = "{URL}{path}".format(URL=self.url, path=path)
+        bucket = self.ratelimit.bucket(method, path)
+        label = route_label(route(method, path))
+        for _ in range(self.retries):
+            async with bucket:
+                start = time.perf_counter()
+                async with self.open().request(method, url,
+                                               **kwargs) as response:
+                    REST_SECONDS.observe(time.perf_counter() - start, label)
+                    REST_RESPONSES.inc(label, response.status)
+                    bucket.update(response.headers)
+                    if response.status == 204:
+                        return None
+
+                    if response.content_type == "application/json":
+                        body = await response.json(loads=self.codec.loads)
+                    else:
+                        body = {"message": await response.text()}
+                    if response.status < 300:
+                        return body
+
+                    if response.status != 429:
+                        raise APIError(response.status, response.reason,
+                                       body)
+
+                    delay = retry_after(response.headers, body)
+                    if body.get("global") or \
+                            response.headers.get("X-RateLimit-Global"):
+                        self.ratelimit.block(delay)
+                    else:
+                        bucket.block(delay)
+
+        raise APIError(429, "Too Many Requests")
+
+
+async def api(path, method="GET", token=None, client=None, **kwargs):
+    """Return the JSON body of a call to Discord REST API.
+
+    :param client: A :class:`Client` to reuse, otherwise a one-shot client
+                   is created (and closed) for this call only.
+    """
+    if client is not None:
+        return await client.request(path, method, token=token, **kwargs)
+
+    client = Client(token)
+    try:
+        return await client.request(path, method, **kwargs)
+    finally:
+        await client.close()
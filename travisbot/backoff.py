@@ -0,0 +1,45 @@
+"""Jittered exponential backoff."""
+
+import random
+
+from .conf import RECONNECT_BASE, RECONNECT_MAX
+
+
+class Backoff:
+    """Delays between attempts, growing exponentially.
+
+    The first attempt is immediate. Each delay is then picked at random
+    below an exponentially growing cap, so that many clients failing
+    together do not come back together.
+
+    >>> backoff = Backoff(base=1, cap=4, rand=random.Random(42))
+    >>> [round(backoff.delay(), 2) for _ in range(5)]
+    [0, 0.64, 0.05, 1.1, 0.89]
+    >>> backoff.reset()
+    >>> backoff.delay()
+    0
+    """
+
+    def __init__(self, base=RECONNECT_BASE, cap=RECONNECT_MAX, rand=None):
+        """Init the backoff.
+
+        :param base: Maximum seconds of the second attempt.
+        :param cap: Maximum seconds of any attempt.
+        :param rand: The :class:`random.Random` picking the delays.
+        """
+        self.base = base
+        self.cap = cap
+        self.rand = rand or random.Random()
+        self.attempts = 0
+
+    def delay(self):
+        """Return the seconds to wait before the next attempt."""
+        attempts, self.attempts = self.attempts, self.attempts + 1
+        if not attempts:
+            return 0
+        return self.rand.uniform(
+            0, min(self.cap, self.base * 2 ** (attempts - 1)))
+
+    def reset(self):
+        """Start over, after a success."""
+        self.attempts = 0
@@ -0,0 +1,115 @@
+"""Batching of the Travis notifications into Discord messages."""
+
+import asyncio
+from collections import OrderedDict, deque
+
+from .conf import BATCH_SIZE, BATCH_WINDOW, EMBEDS_PER_MESSAGE
+
+
+def embed(data):
+    """Build the Discord embed of a Travis notification."""
+    return {
+        "title": ("{data[repository][owner_name]}/"
+                  "{data[repository][name]} "
+                  "{data[status_message]}").format(data=data),
+        "type": "rich",
+        "description": ("{data[author_name]} {data[type]} "
+                        "<{data[compare_url]}>").format(data=data),
+        "url": data['build_url']
+    }
+
+
+def group(data):
+    """Return the key grouping the notifications into the same message.
+
+    >>> group({'repository': {'owner_name': 'greut', 'name': 'travisbot'},
+    ...        'branch': 'master'})
+    ('greut/travisbot', 'master')
+    """
+    repository = data['repository']
+    return ("{0[owner_name]}/{0[name]}".format(repository),
+            data.get('branch'))
+
+
+class Batcher:
+    """Collect the notifications arriving together and pack them.
+
+    Notifications are grouped by repository and branch, a newer one for
+    the same build replaces the previous status.
+    """
+
+    def __init__(self, get, window=BATCH_WINDOW, size=BATCH_SIZE,
+                 limit=EMBEDS_PER_MESSAGE, loop=None):
+        """Init the batcher.
+
+        :param get: The Queue reader side.
+        :param window: Seconds to wait for more notifications.
+        :param size: Maximum of notifications collected in one window.
+        :param limit: Maximum of notifications in one message.
+        """
+        self._get = get
+        self.window = window
+        self.size = size
+        self.limit = limit
+        self.loop = loop or asyncio.get_event_loop()
+
+        self.groups = OrderedDict()
+        """Notifications being collected, by group then build."""
+
+        self.ready = deque()
+        """Lists of notifications, ready to be sent."""
+
+        self.received = 0
+        """Number of notifications read from the queue."""
+
+        self.collapsed = 0
+        """Number of notifications replaced by a newer one."""
+
+    async def get(self):
+        """Return the next list of notifications to send together.
+
+        It is safe to cancel, notifications already collected are kept for
+        the next call.
+        """
+        while not self.ready:
+            await self._collect()
+        return self.ready.popleft()
+
+    async def _collect(self):
+        """Read notifications for a window of time."""
+        if not self.groups:
+            self._add(await self._get())
+
+        deadline = self.loop.time() + self.window
+        count = sum(len(builds) for builds in self.groups.values())
+        while count < self.size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                data = await asyncio.wait_for(self._get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            count += self._add(data)
+
+        self._flush()
+
+    def _add(self, data):
+        """Add a notification, return the number of new builds."""
+        self.received += 1
+        builds = self.groups.setdefault(group(data), OrderedDict())
+        build = data.get('id', id(data))
+        if builds.pop(build, None) is not None:
+            self.collapsed += 1
+            builds[build] = data
+            return 0
+        builds[build] = data
+        return 1
+
+    def _flush(self):
+        """Pack the collected notifications into messages."""
+        for builds in self.groups.values():
+            notifications = list(builds.values())
+            for i in range(0, len(notifications), self.limit):
+                self.ready.append(notifications[i:i + self.limit])
+        self.groups.clear()
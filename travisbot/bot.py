@@ -1,14 +1,59 @@
 """Discord bot."""
 
 import asyncio
-import json
+import logging
+import random
+import time
 import zlib
-from concurrent.futures import CancelledError
+from collections import OrderedDict, deque
 from urllib.parse import urlencode
 
-from aiohttp import ClientSession, WSMsgType
-
-from . import api
+from aiohttp import ClientError, ClientSession, WSMsgType
+
+from .api import APIError, Client, api
+from .backoff import Backoff
+from .batch import Batcher, embed
+from .cache import Cache
+from .codec import get_codec
+from .compress import PAYLOAD, ZLIB_STREAM, Inflator
+from .conf import (BATCH_WINDOW, CHANNEL_QUEUE_SIZE, CHUNK_CONCURRENCY,
+                   CHUNK_TIMEOUT, EVENT_CONCURRENCY, GATEWAY_COMPRESS,
+                   GATEWAY_ENCODING, LARGE_THRESHOLD, LAZY_SIZE)
+from .etf import VERSION, ETFCodec
+from .latency import Latency
+from .messages import Message, MessageIndex
+from .metrics import (DECODE_SECONDS, GATEWAY_EVENTS, HEARTBEAT_SECONDS,
+                      RECONNECTS, ZOMBIES)
+from .recorder import BINARY, CONNECT, TEXT
+from .routing import Outbox, Router
+from .supervisor import Supervisor
+
+log = logging.getLogger(__name__)
+
+FATAL = {
+    4004,  # Authentication failed
+    4010,  # Invalid shard
+    4011,  # Sharding required
+    4012,  # Invalid API version
+    4013,  # Invalid intents
+    4014   # Disallowed intents
+}
+"""Close codes the bot cannot recover from."""
+
+INVALIDATING = {
+    4007,  # Invalid seq
+    4009   # Session timed out
+}
+"""Close codes after which the session cannot be resumed."""
+
+
+class GatewayClosed(Exception):
+    """The gateway closed the connection for good."""
+
+    def __init__(self, code):
+        """Init the error from the close code."""
+        super().__init__(code)
+        self.code = code
 
 
 class Bot:
@@ -22,20 +67,73 @@ class Bot:
     IDENTIFY = 2
     STATUS_UPDATE = 3
     RESUME = 6
+    RECONNECT = 7
+    REQUEST_GUILD_MEMBERS = 8
     INVALID_SESSION = 9
     HELLO = 10
     HEARTBEAT_ACK = 11
 
-    def __init__(self, url, token, get, running):
+    INVALID_SESSION_DELAY = (1, 5)
+    """Seconds to wait, at random, before identifying again."""
+
+    def __init__(self, url, token, get, running, client=None,
+                 channel_queue_size=CHANNEL_QUEUE_SIZE,
+                 batch_window=BATCH_WINDOW, ack=None,
+                 compress=GATEWAY_COMPRESS, codec=None,
+                 encoding=GATEWAY_ENCODING, lazy=True, intents=None,
+                 state=None, large_threshold=LARGE_THRESHOLD, chunk=True,
+                 chunk_concurrency=CHUNK_CONCURRENCY,
+                 chunk_timeout=CHUNK_TIMEOUT, shard=None,
+                 before_identify=None, backoff=None,
+                 event_concurrency=EVENT_CONCURRENCY, recorder=None,
+                 router=None, messages=None):
         """Init the bot.
 
         :param url: The Gateway URL (WebSocket)
         :param token: The Discord API token
         :param get: The Queue reader side.
+        :param client: The REST :class:`~travisbot.api.Client` to share.
+        :param channel_queue_size: Messages waiting for one channel, above
+                                   which the queue is no longer read.
+        :param batch_window: Seconds to collect notifications into a message.
+        :param ack: Called with each notification delivered, e.g.
+                    :meth:`~travisbot.spool.Spool.ack`.
+        :param compress: Gateway compression, ``payload``, ``zlib-stream``
+                         or ``None``.
+        :param codec: JSON library name, the fastest installed by default.
+        :param encoding: Gateway encoding, ``json`` or ``etf``.
+        :param lazy: Skip decoding the dispatches nobody subscribed to.
+        :param intents: Gateway intents bitmask, sent at identify.
+        :param state: The :class:`~travisbot.cache.Cache` of the guilds, a
+                      default one when ``None``, none when ``False``.
+        :param large_threshold: Members above which a guild comes with its
+                                online members only.
+        :param chunk: Request the members of the large guilds, once they
+                      are created.
+        :param chunk_concurrency: Maximum of guilds being requested at once.
+        :param chunk_timeout: Seconds to receive the members of a guild.
+        :param shard: The shard id and the number of shards, if sharded.
+        :param before_identify: Coroutine function awaited before each
+                                identify, e.g. to respect the rate limit.
+        :param backoff: The :class:`~travisbot.backoff.Backoff` between
+                        two reconnections.
+        :param event_concurrency: Maximum of event callbacks running at
+                                  once.
+        :param recorder: The :class:`~travisbot.recorder.Recorder` capturing
+                         the frames received.
+        :param router: The :class:`~travisbot.routing.Router` giving the
+                       channel of each notification, the default channel
+                       when ``None``.
+        :param messages: The :class:`~travisbot.messages.MessageIndex` of
+                         the messages to edit, an in-memory one when
+                         ``None``.
         """
         self.url = url
         self.running = running
 
+        self.client = client or Client(token, codec=codec)
+        """Pooled Discord REST client, closed when the bot stops."""
+
         self.ws_running = None
 
         self.last_sequence = None
@@ -47,23 +145,108 @@ class Bot:
         self.ws = None
         """WebSocket connection."""
 
+        if encoding not in ("json", "etf"):
+            raise ValueError("unknown encoding {!r}".format(encoding))
+        self.encoding = encoding
+        self.codec = ETFCodec() if encoding == "etf" else get_codec(codec)
+        """Codec of the gateway payloads."""
+
+        self.compress = compress
+        self.inflator = None
+        """Decompression context of a ``zlib-stream`` connection."""
+
         self.interval = None
         """Heartbeat interval, in seconds."""
 
         self.get = get
         """Reading endpoint of the queue."""
 
-        self.channel_id = 309734242085109760
-        """Channel called #bots."""
+        self.batcher = Batcher(get, window=batch_window)
+        """Packs the notifications from the queue into messages."""
+
+        self.ack = ack
+
+        self.router = router or Router()
+        """Channel of each notification."""
+
+        self.channel_queue_size = channel_queue_size
+        self.outboxes = {}
+        """Messages waiting to be sent, by channel."""
+
+        self.held = []
+        """Notifications read, waiting for room in the outbox of their
+        channel."""
+
+        self.messages = messages or MessageIndex()
+        """Message of each build, edited by its next notifications."""
+
+        self.shard = shard
+        self.before_identify = before_identify
+
+        self.lazy = lazy
+        self.intents = intents
+
+        self.backoff = backoff or Backoff()
+
+        self.resume_url = None
+        """Gateway URL to resume the session with, when given."""
+
+        self.disconnected = None
+        """Loop time the connection was lost, until it is recovered."""
+
+        self.recoveries = deque(maxlen=100)
+        """Seconds from the loss of a connection to the READY or RESUMED."""
+
+        self.reconnects = 0
+        self.resumes = 0
+
+        self.latency = Latency()
+        """Round-trip times of the heartbeats."""
+
+        self.beat = None
+        """Loop time of the last heartbeat, ``None`` once acknowledged."""
+
+        self.zombies = 0
+        """Connections closed for not acknowledging a heartbeat."""
 
         # Metadata
         self.session_id = None
         self.user = None
-        self.guilds = {}
         self.events = {}
 
-        # all the tasks
-        self.futures = []
+        self.subscriptions = {"READY", "RESUMED"}
+        """Dispatch events being decoded, by name."""
+
+        self.state = Cache() if state is None else state or None
+        """Guilds, members, presences and channels, kept up to date."""
+        if self.state is not None:
+            self.subscriptions.update(self.state.events)
+
+        self.large_threshold = large_threshold
+        self.chunk = chunk and self.state is not None
+        self.chunk_timeout = chunk_timeout
+        self.chunking = asyncio.Semaphore(chunk_concurrency)
+        """Limits the guilds having their members requested at once."""
+
+        self.chunks = {}
+        """Completion of the member requests, by guild id."""
+        self.subscribe("guild_members_chunk")
+
+        self.skipped = {}
+        """Count of the dispatches not handled, by name."""
+
+        self.supervisor = Supervisor({"event": event_concurrency})
+        """Background tasks: events, messages being sent..."""
+
+        self.connection = []
+        """Tasks of the current connection, heartbeat and consumer."""
+
+        self.recorder = recorder
+
+    @property
+    def guilds(self):
+        """The guilds, by id."""
+        return self.state.guilds if self.state is not None else {}
 
     def event(self, prefix='on_'):
         """Decorate an function to register a dispatch event.
@@ -72,10 +255,16 @@ class Bot:
         """
         def decorate(f):
             if f.__name__.startswith(prefix):
-                self.events[f.__name__[len(prefix):]] = f
+                name = f.__name__[len(prefix):]
+                self.events[name] = f
+                self.subscribe(name)
             return f
         return decorate
 
+    def subscribe(self, *events):
+        """Decode the given dispatch events, e.g. ``guild_create``."""
+        self.subscriptions.update(event.upper() for event in events)
+
     async def _identify(self):
         """Send the identify/resume message performing the authentication."""
         if not self.session_id:
@@ -84,10 +273,19 @@ class Bot:
                 "d": {
                     "token": self.token,
                     "properties": {},
-                    "compress": True,
-                    "large_threshold": 250
+                    "compress": self.compress == PAYLOAD,
+                    "large_threshold": self.large_threshold,
+                    # No presences, nor typing events, unless asked for.
+                    "guild_subscriptions": bool(self.subscriptions & {
+                        "PRESENCE_UPDATE", "TYPING_START"})
                 }
             }
+            if self.intents is not None:
+                msg["d"]["intents"] = self.intents
+            if self.shard is not None:
+                msg["d"]["shard"] = list(self.shard)
+            if self.before_identify is not None:
+                await self.before_identify()
         else:
             msg = {
                 "op": self.RESUME,
@@ -98,10 +296,14 @@ class Bot:
                 }
             }
 
-        await self.ws.send_json(msg)
+        await self.send(msg)
 
     async def _heartbeat(self):
-        """Send beats regularly to keep the ws connected."""
+        """Send beats regularly to keep the ws connected.
+
+        A beat not acknowledged by the next one means the connection is
+        dead, though not closed, it is closed so the bot resumes.
+        """
         while not self.ws_running.done():
             # Wait for the future or send the heartbeat
             try:
@@ -110,51 +312,197 @@ class Bot:
                 await asyncio.wait_for(asyncio.shield(self.ws_running),
                                        self.interval)
             except asyncio.TimeoutError:
-                print("heartbeat", self.last_sequence)
-                await self.ws.send_json({
-                    "op": self.HEARTBEAT,
-                    "d": self.last_sequence
-                })
+                if self.beat is not None:
+                    log.warning("heartbeat not acknowledged, reconnecting")
+                    self.zombies += 1
+                    ZOMBIES.inc()
+                    # Not a normal closure, the session stays valid.
+                    await self.ws.close(code=4000)
+                    return
+                log.debug("heartbeat", extra={'seq': self.last_sequence})
+                await self._beat()
+
+    async def _beat(self):
+        """Send a heartbeat, timing it until acknowledged."""
+        self.beat = asyncio.get_event_loop().time()
+        await self.send({
+            "op": self.HEARTBEAT,
+            "d": self.last_sequence
+        })
 
     # XXX move this outside the bot class.
 
     async def consume(self):
-        """Consume the queue and post messages in Discord."""
+        """Consume the queue and post messages in Discord.
+
+        The notifications of a channel whose outbox is full are held back,
+        and the queue is left alone until it has room, so that it fills up
+        and the webhooks are refused, rather than messages dropped. The
+        other channels go on meanwhile.
+        """
         while not self.ws_running.done():
-            task = asyncio.ensure_future(self.get())
+            task = asyncio.ensure_future(self._next())
             done, pending = await asyncio.wait(
                 [task, self.ws_running],
                 return_when=asyncio.FIRST_COMPLETED)
 
             if task in done:
-                data = task.result()
-                f = asyncio.ensure_future(self.send_message(self.channel_id, {
-                    "embed": {
-                        "title": ("{data[repository][owner_name]}/"
-                                  "{data[repository][name]} "
-                                  "{data[status_message]}"
-                                  ).format(data=data),
-                        "type": "rich",
-                        "description": ("{data[author_name]} {data[type]} "
-                                        "<{data[compare_url]}>"
-                                        ).format(data=data),
-                        "url": data['build_url']
-                    }
-                }))
-                self.futures.append(f)
+                task.result()
             else:
                 task.cancel()
                 break
 
+    async def _next(self):
+        """Route the next notifications, or the ones held back."""
+        if not self.held:
+            self.held = await self.batcher.get()
+
+        ready, held, full = [], [], None
+        for data in self.held:
+            outbox = self.outboxes.get(self.router.route(data))
+            if outbox is not None and outbox.full():
+                held.append(data)
+                full = full or outbox
+            else:
+                ready.append(data)
+        self.held = held
+        self.route(ready)
+        if full is not None:
+            await full.wait()
+
+    def route(self, notifications):
+        """Queue the notifications in the outboxes of their channels.
+
+        The builds already having a message get it edited, the other ones
+        a new message. The ones routed nowhere are acknowledged right away.
+        It never waits, :meth:`consume` holds the notifications back
+        beforehand.
+        """
+        channels = OrderedDict()
+        for data in notifications:
+            channel = self.router.route(data)
+            if channel is None:
+                if self.ack:
+                    self.ack(data)
+                continue
+            channels.setdefault(channel, []).append(data)
+
+        for channel, notifications in channels.items():
+            outbox = self.outboxes.get(channel)
+            if outbox is None:
+                outbox = self.outboxes[channel] = Outbox(
+                    channel, self.channel_queue_size)
+
+            new = None
+            for data in notifications:
+                build = data.get('id')
+                message = None
+                if build is not None:
+                    message = self.messages.get(channel, build)
+                if message is None:
+                    new = new or Message(channel)
+                    new.update(build, embed(data), data)
+                else:
+                    message.update(build, embed(data), data)
+                    self._queue(outbox, message)
+            if new is not None:
+                self.messages.add(new)
+                self._queue(outbox, new)
+
+    def _queue(self, outbox, message):
+        """Queue the message, unless it is already waiting."""
+        outbox.put(message)
+        if outbox.task is None:
+            outbox.task = self.supervisor.spawn(self._drain(outbox), "send")
+
+    async def _drain(self, outbox):
+        """Send the messages of the outbox, one at a time.
+
+        A message Discord could not be reached for, or failed to handle,
+        is queued again, and sent after a delay.
+        """
+        try:
+            while outbox.messages:
+                message = outbox.get()
+                try:
+                    if await self._send(message):
+                        outbox.counters['sent'] += 1
+                        outbox.backoff.reset()
+                except (APIError, ClientError, asyncio.TimeoutError) as e:
+                    outbox.counters['errors'] += 1
+                    log.warning("cannot send to channel %s: %r",
+                                outbox.channel, e,
+                                extra={'sample': 'send error'})
+                    outbox.put(message)
+                    await asyncio.sleep(outbox.backoff.delay())
+        finally:
+            outbox.task = None
+
+    async def _send(self, message):
+        """Post the message, or edit it, in its latest state.
+
+        Its notifications are acknowledged once sent, or refused by
+        Discord. They are kept in the message when Discord cannot be
+        reached, or answers with a 429 or 5xx.
+
+        :return: whether anything was sent.
+        :raises APIError: when the error is temporary.
+        :raises ClientError: when Discord cannot be reached.
+        :raises asyncio.TimeoutError: when Discord does not answer.
+        """
+        if not message.dirty:
+            return False
+        version, notifications = message.version, message.notifications
+        message.notifications = []
+        data = {"embeds": list(message.embeds)}
+        try:
+            if message.id is not None:
+                try:
+                    await self.edit_message(message.channel, message.id, data)
+                except APIError as e:
+                    if e.status != 404:
+                        raise
+                    # Deleted meanwhile, it is posted again.
+                    message.id = None
+            if message.id is None:
+                response = await self.send_message(message.channel, data)
+                message.id = response['id']
+            message.sent = version
+            self.messages.changed()
+        except APIError as e:
+            if e.temporary:
+                message.notifications[:0] = notifications
+                raise
+            log.error("cannot send message: %s", e.status,
+                      extra={'body': e.body})
+        except (ClientError, asyncio.TimeoutError):
+            # Along with the ones added meanwhile, for the next attempt.
+            message.notifications[:0] = notifications
+            raise
+
+        if self.ack:
+            for data in notifications:
+                self.ack(data)
+        return True
+
     async def send_message(self, channel, data):
         """Send a message into the given channel."""
         return await api("/channels/{}/messages".format(channel), "POST",
                          token=self.token,
+                         client=self.client,
+                         json=data)
+
+    async def edit_message(self, channel, message, data):
+        """Edit a message of the given channel."""
+        return await api("/channels/{}/messages/{}".format(channel, message),
+                         "PATCH",
+                         token=self.token,
+                         client=self.client,
                          json=data)
 
     async def update_status(self, status):
         """Update the game status."""
-        return await self.ws.send_json({
+        return await self.send({
             "op": self.STATUS_UPDATE,
             "d": {
                 "idle_since": None,
@@ -164,58 +512,249 @@ class Bot:
             }
         })
 
-    async def _receive(self):
-        """Read the WebSocket and handles the various cases."""
-        msg = await self.ws.receive()
+    def request_members(self, guild_id):
+        """Request all the members of a guild, in chunks.
 
-        if msg.type == WSMsgType.TEXT:
-            return json.loads(msg.data)
+        The guilds are requested a few at a time, the others wait.
 
-        elif msg.type == WSMsgType.BINARY:
-            return json.loads(zlib.decompress(msg.data))
+        :return: a future done once every chunk of the guild is received.
+        """
+        guild_id = int(guild_id)
+        future = self.chunks.get(guild_id)
+        if future is None or future.done():
+            future = self.chunks[guild_id] = asyncio.Future()
+            self.supervisor.spawn(self._request_members(guild_id, future),
+                                  "chunk")
+        return future
+
+    async def _request_members(self, guild_id, future):
+        """Send the request, keeping the slot until it is complete."""
+        async with self.chunking:
+            try:
+                await self.send({
+                    "op": self.REQUEST_GUILD_MEMBERS,
+                    "d": {
+                        "guild_id": str(guild_id),
+                        "query": "",
+                        "limit": 0
+                    }
+                })
+                await asyncio.wait_for(asyncio.shield(future),
+                                       self.chunk_timeout)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                if self.chunks.get(guild_id) is future:
+                    del self.chunks[guild_id]
+
+    def _chunk(self, data):
+        """Complete the request of the guild after its last chunk."""
+        if data.get('chunk_index', 0) + 1 < data.get('chunk_count', 1):
+            return
+        future = self.chunks.get(int(data['guild_id']))
+        if future is not None and not future.done():
+            future.set_result(data.get('chunk_count', 1))
+
+    async def send(self, data):
+        """Send a payload to the gateway."""
+        if self.codec.binary:
+            await self.ws.send_bytes(self.codec.dumps(data))
+        else:
+            await self.ws.send_str(self.codec.dumps(data))
 
-        elif msg.type == WSMsgType.CLOSE:
-            print("Close", msg.data, msg.extra)
+    def _decode(self, data):
+        """Decode a payload.
 
-        elif msg.type == WSMsgType.ERROR:
-            print("Error?", repr(msg.data))
+        Only the ``op``, ``t`` and ``s`` of the large dispatches nobody
+        subscribed to are read, when lazy.
+        """
+        start = time.perf_counter()
+        if isinstance(data, bytes) and not self.codec.binary:
+            data = data.decode()
+        if self.lazy and len(data) > LAZY_SIZE:
+            header = self.codec.peek(data)
+            if header is not None and header['op'] == self.DISPATCH and \
+                    header['t'] not in self.subscriptions:
+                DECODE_SECONDS.observe(time.perf_counter() - start)
+                return header
+        data = self.codec.loads(data)
+        DECODE_SECONDS.observe(time.perf_counter() - start)
+        return data
 
-        else:
-            print("unknown type", msg.type)
+    async def _receive(self):
+        """Read the WebSocket and handles the various cases."""
+        while True:
+            msg = await self.ws.receive()
+
+            if msg.type == WSMsgType.TEXT:
+                if self.recorder is not None:
+                    self.recorder.record(TEXT, msg.data)
+                return self._decode(msg.data)
+
+            elif msg.type == WSMsgType.BINARY:
+                data = msg.data
+                if self.recorder is not None:
+                    self.recorder.record(BINARY, data)
+                if self.inflator is not None:
+                    data = self.inflator.feed(data)
+                    if data is None:
+                        continue
+                elif data[0] != VERSION:
+                    data = zlib.decompress(data)
+                return self._decode(data)
+
+            elif msg.type == WSMsgType.CLOSE:
+                log.info("gateway closed: %s %s", msg.data, msg.extra)
+                return
+
+            elif msg.type in (WSMsgType.CLOSING, WSMsgType.CLOSED):
+                return
+
+            elif msg.type == WSMsgType.ERROR:
+                log.warning("gateway error: %r", msg.data)
+                return
+
+            else:
+                log.warning("unknown message type: %s", msg.type)
+                return
 
     async def run(self):
         """Run the bot."""
-        with ClientSession() as session:
-            url = self.url + "?"
-            url += urlencode({"v": self.API_VERSION, "encoding": json})
-            while not self.running.done():
-                print("Bot is connecting...")
-                self.ws_running = asyncio.Future()
-                async with session.ws_connect(url) as ws:
-                    self.ws = ws
-                    while not self.running.done():
-                        # Reading the message.
-                        data = await self._receive()
-                        if not data:
-                            break
-
-                        await self._handle(data)
-
-                        # Cleanup
-                        self.futures = [f
-                                        for f in self.futures if not f.done()]
-
-                    # Close the tasks
-                    # Wait for them.
-                    print("Bot is closing...")
-                    self.ws_running.cancel()
-                    while self.futures:
-                        try:
-                            await asyncio.gather(*self.futures)
-                        except CancelledError:
-                            pass
-                        self.futures = [f
-                                        for f in self.futures if not f.done()]
+        try:
+            await self._run()
+        finally:
+            await self.client.close()
+
+    async def _run(self):
+        """Connect and reconnect to the gateway until we are stopped.
+
+        The session is resumed when possible, Discord replaying the missed
+        events, after a jittered exponential backoff.
+
+        :raises GatewayClosed: when closed for good, once the messages being
+                               sent are.
+        """
+        self.running.add_done_callback(self._stop)
+        params = {"v": self.API_VERSION, "encoding": self.encoding}
+        if self.compress == ZLIB_STREAM:
+            params["compress"] = ZLIB_STREAM
+        query = "?" + urlencode(params)
+
+        try:
+            async with ClientSession() as session:
+                await self._reconnect(session, query)
+        finally:
+            # Only now, the tasks still running are waited for.
+            log.info("closing")
+            await self.supervisor.join()
+
+    async def _reconnect(self, session, query):
+        """Connect to the gateway again, each time the connection is lost."""
+        loop = asyncio.get_event_loop()
+        while not self.running.done():
+            delay = self.backoff.delay()
+            if delay:
+                log.info("reconnecting in %.2fs", delay)
+                await asyncio.wait([self.running], timeout=delay)
+                if self.running.done():
+                    break
+
+            url = self.url
+            if self.session_id and self.resume_url:
+                url = self.resume_url
+            log.info("connecting to the gateway")
+            try:
+                await self._connect(session, url + query)
+            except (ClientError, asyncio.TimeoutError, OSError) as e:
+                log.warning("cannot connect to the gateway: %r", e)
+
+            if not self.running.done():
+                self.reconnects += 1
+                RECONNECTS.inc()
+                if self.disconnected is None:
+                    self.disconnected = loop.time()
+
+    async def _connect(self, session, url):
+        """Read one connection until it is closed.
+
+        :raises GatewayClosed: when closed for good.
+        """
+        self.ws_running = asyncio.Future()
+        try:
+            async with session.ws_connect(url) as ws:
+                self.ws = ws
+                if self.recorder is not None:
+                    self.recorder.record(CONNECT, url)
+                if self.compress == ZLIB_STREAM:
+                    # A new compression context for each connection.
+                    self.inflator = Inflator()
+                while not self.running.done():
+                    # Reading the message.
+                    data = await self._receive()
+                    if not data:
+                        break
+
+                    await self._handle(data)
+            code = ws.close_code
+        finally:
+            self.ws = None
+            self.ws_running.cancel()
+            # The other tasks, e.g. messages being sent, go on meanwhile.
+            await asyncio.gather(*self.connection, return_exceptions=True)
+            self.connection = []
+
+        if code in FATAL:
+            raise GatewayClosed(code)
+        if code in INVALIDATING:
+            self._invalidate()
+
+    def _failed(self, task):
+        """Log a task of the connection failing, and reconnect.
+
+        A new connection starts the heartbeat and the consumer again.
+        """
+        if task.cancelled() or task.exception() is None:
+            return
+        log.error("connection task failed", exc_info=task.exception())
+        if self.ws is not None:
+            # Not a normal closure, the session stays valid.
+            asyncio.ensure_future(self.ws.close(code=4000))
+
+    def _stop(self, running):
+        """Close the connection once we are stopped."""
+        if self.ws is not None:
+            asyncio.ensure_future(self.ws.close())
+
+    def _invalidate(self):
+        """Forget the session, the next connection identifies."""
+        self.session_id = None
+        self.last_sequence = None
+        self.resume_url = None
+
+    def _recovered(self):
+        """Measure the time to recover, after a READY or RESUMED."""
+        if self.disconnected is not None:
+            loop = asyncio.get_event_loop()
+            self.recoveries.append(loop.time() - self.disconnected)
+            self.disconnected = None
+        self.backoff.reset()
+
+    def stats(self):
+        """Return the connection statistics."""
+        return {
+            "reconnects": self.reconnects,
+            "resumes": self.resumes,
+            "recover_last": self.recoveries[-1] if self.recoveries else None,
+            "recover_max": max(self.recoveries, default=None),
+            "zombies": self.zombies,
+            "latency": self.latency.stats(),
+            "tasks": self.supervisor.stats(),
+            "channels": {channel: outbox.stats()
+                         for channel, outbox in self.outboxes.items()},
+            "held": len(self.held),
+            "messages": self.messages.stats()
+        }
 
     async def _handle(self, data):
         """Handle the message data."""
@@ -224,37 +763,72 @@ class Bot:
 
             # Heartbeat (converted in seconds)
             self.interval = data['d']['heartbeat_interval'] / 1000
-            self.futures.append(
+            self.beat = None
+            self.connection.append(
                 asyncio.ensure_future(self._heartbeat()))
             # Consumer
-            self.futures.append(
+            self.connection.append(
                 asyncio.ensure_future(self.consume()))
+            for task in self.connection:
+                task.add_done_callback(self._failed)
 
         elif data["op"] == self.HEARTBEAT_ACK:
-            pass
+            if self.beat is not None:
+                loop = asyncio.get_event_loop()
+                self.latency.add(loop.time() - self.beat)
+                HEARTBEAT_SECONDS.observe(loop.time() - self.beat)
+                self.beat = None
+
+        elif data["op"] == self.HEARTBEAT:
+            # Asked by the gateway, right away.
+            await self._beat()
+
+        elif data["op"] == self.RECONNECT:
+            # Not a normal closure, the session stays valid.
+            await self.ws.close(code=4000)
 
         elif data["op"] == self.INVALID_SESSION:
-            print('invalid session')
+            log.info("invalid session, resumable: %s", data.get('d'))
+            await asyncio.sleep(random.uniform(*self.INVALID_SESSION_DELAY))
+            if not data.get('d'):
+                self._invalidate()
+            await self._identify()
 
         elif data["op"] == self.DISPATCH:
             self.last_sequence = data['s']
+            GATEWAY_EVENTS.inc(data['t'])
 
             event = data['t'].lower()
             if event == 'ready':
                 self.session_id = data['d']['session_id']
-                self.futures.append(
-                    asyncio.ensure_future(
-                        self.update_status("greut/travisbot")))
+                self.resume_url = data['d'].get('resume_gateway_url')
+                self._recovered()
+                self.supervisor.spawn(self.update_status("greut/travisbot"),
+                                      "gateway")
+            elif event == 'resumed':
+                self.resumes += 1
+                self._recovered()
+
+            handled = event in ('ready', 'resumed')
+            if self.state is not None and 'd' in data:
+                # Before the callbacks, so they see the new state.
+                self.state.apply(data['t'], data['d'])
+                handled = data['t'] in self.state.events
+
+            if event == 'guild_members_chunk' and 'd' in data:
+                self._chunk(data['d'])
+                handled = True
+            elif event == 'guild_create' and self.chunk and \
+                    data.get('d', {}).get('large'):
+                self.request_members(data['d']['id'])
 
             callback = self.events.get(event, None)
-            if callback:
-                self.futures.append(
-                    asyncio.ensure_future(callback(data['d'])))
-            else:
-                # Debug
-                print(data['t'])
-                print(data['d'])
-                print('-' * 40)
+            if callback and 'd' in data:
+                self.supervisor.spawn(callback(data['d']), "event")
+            elif not handled:
+                self.skipped[data['t']] = self.skipped.get(data['t'], 0) + 1
+                log.debug("%s not handled", data['t'],
+                          extra={'sample': data['t']})
 
         else:
-            print(data)
+            log.debug("unknown op %s", data['op'])
@@ -0,0 +1,308 @@
+"""Compact cache of the guilds, members, presences and channels.
+
+Entities are kept in ``__slots__`` records rather than the dicts from the
+gateway. Snowflakes are integers, whichever the gateway encoding, the role
+ids of the members of a guild and the strings are shared. A user is
+forgotten once no guild has it as a member.
+"""
+
+import sys
+
+USER_FIELDS = ('username', 'discriminator', 'bot')
+MEMBER_FIELDS = ('nick', 'roles', 'status')
+CHANNEL_FIELDS = ('name', 'type', 'position')
+
+EVENTS = (
+    'GUILD_CREATE', 'GUILD_UPDATE', 'GUILD_DELETE',
+    'GUILD_MEMBER_ADD', 'GUILD_MEMBER_UPDATE', 'GUILD_MEMBER_REMOVE',
+    'GUILD_MEMBERS_CHUNK', 'PRESENCE_UPDATE',
+    'CHANNEL_CREATE', 'CHANNEL_UPDATE', 'CHANNEL_DELETE'
+)
+"""Dispatch events kept up to date."""
+
+
+def record(name, fields):
+    """Create a record class with only the given fields.
+
+    >>> Point = record('Point', ('x', 'y'))
+    >>> p = Point(7, x=1)
+    >>> p.id, p.x, p.y
+    (7, 1, None)
+    >>> p.__dict__
+    Traceback (most recent call last):
+    ...
+    AttributeError: 'Point' object has no attribute '__dict__'
+    """
+    fields = tuple(fields)
+
+    def __init__(self, id, **kwargs):
+        self.id = id
+        for field in fields:
+            setattr(self, field, kwargs.get(field))
+
+    def __repr__(self):
+        return "<{} {}>".format(name, self.id)
+
+    return type(name, (), {
+        '__slots__': ('id',) + fields,
+        '__init__': __init__,
+        '__repr__': __repr__,
+        'fields': fields
+    })
+
+
+class Guild:
+    """A guild, with its members and channels."""
+
+    __slots__ = ('id', 'name', 'owner_id', 'members', 'channels', 'roles',
+                 'unavailable')
+
+    def __init__(self, id):
+        """Init an empty guild."""
+        self.id = id
+        self.name = None
+        self.owner_id = None
+        self.members = {}
+        self.channels = {}
+        self.roles = {}
+        """Role ids of the members, shared by them."""
+        self.unavailable = False
+
+    def __repr__(self):
+        """Represent the guild by its name."""
+        return "<Guild {} {!r}>".format(self.id, self.name)
+
+
+class Cache:
+    """The state of the guilds, updated from the dispatch events."""
+
+    def __init__(self, member_fields=MEMBER_FIELDS,
+                 user_fields=USER_FIELDS, channel_fields=CHANNEL_FIELDS):
+        """Init the cache.
+
+        :param member_fields: Fields kept of the members, ``status`` being
+                              their presence.
+        :param user_fields: Fields kept of the users.
+        :param channel_fields: Fields kept of the channels.
+        """
+        self.Member = record('Member', ('user',) + tuple(member_fields))
+        self.User = record('User', user_fields)
+        self.Channel = record('Channel', ('guild_id',) + tuple(channel_fields))
+
+        # Fields copied as they are.
+        self._member_fields = tuple(f for f in member_fields
+                                    if f not in ('roles', 'status'))
+        self._channel_fields = tuple(channel_fields)
+        self._roles = 'roles' in member_fields
+        self._status = 'status' in member_fields
+
+        self.guilds = {}
+        self.users = {}
+        self.channels = {}
+        """Channels of every guild, by id."""
+
+        self._memberships = {}
+        """Number of guilds of each user, by id."""
+
+        self.events = set(EVENTS)
+        """Dispatch events to decode, presences only if kept."""
+        if not self._status:
+            self.events.discard('PRESENCE_UPDATE')
+
+        self._handlers = {event: getattr(self, event.lower())
+                          for event in self.events}
+
+    def snowflake(self, value):
+        """Return the integer of an id, a string or an integer."""
+        return int(value)
+
+    def apply(self, event, data):
+        """Update the cache from a dispatch event, if it is about it."""
+        handler = self._handlers.get(event)
+        if handler is not None:
+            handler(data)
+
+    def get_guild(self, guild_id):
+        """Return the guild, by id."""
+        return self.guilds.get(int(guild_id))
+
+    def get_member(self, guild_id, user_id):
+        """Return the member of a guild, by ids."""
+        guild = self.get_guild(guild_id)
+        return guild.members.get(int(user_id)) if guild else None
+
+    def get_channel(self, channel_id):
+        """Return the channel, by id."""
+        return self.channels.get(int(channel_id))
+
+    def _update(self, obj, data, fields):
+        """Update the fields of a record present in the data."""
+        for field in fields:
+            if field in data:
+                value = data[field]
+                if isinstance(value, str):
+                    value = sys.intern(value)
+                setattr(obj, field, value)
+
+    def _user(self, data):
+        """Add or update a user."""
+        user_id = self.snowflake(data['id'])
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = self.User(user_id)
+        self._update(user, data, self.User.fields)
+        return user
+
+    def _member(self, guild, data):
+        """Add or update a member of a guild."""
+        user = self._user(data['user'])
+        member = guild.members.get(user.id)
+        if member is None:
+            member = guild.members[user.id] = self.Member(user.id)
+            member.user = user
+            self._memberships[user.id] = self._memberships.get(user.id,
+                                                               0) + 1
+        if self._roles and 'roles' in data:
+            roles = (self.snowflake(r) for r in data['roles'])
+            member.roles = tuple(guild.roles.setdefault(r, r) for r in roles)
+        self._update(member, data, self._member_fields)
+        return member
+
+    def _leave(self, member):
+        """Forget the user of a member removed, unless in another guild."""
+        user_id = member.user.id
+        self._memberships[user_id] -= 1
+        if not self._memberships[user_id]:
+            del self._memberships[user_id]
+            del self.users[user_id]
+
+    def _presence(self, guild, data):
+        """Update the status of a member."""
+        if not self._status:
+            return
+        member = guild.members.get(int(data['user']['id']))
+        if member is None and 'username' in data['user']:
+            member = self._member(guild, data)
+        if member is not None:
+            member.status = sys.intern(data['status'])
+
+    def _channel(self, guild_id, data):
+        """Add or update a channel."""
+        channel_id = self.snowflake(data['id'])
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = self.Channel(channel_id)
+        channel.guild_id = guild_id
+        self._update(channel, data, self._channel_fields)
+        if guild_id in self.guilds:
+            self.guilds[guild_id].channels[channel_id] = channel
+        return channel
+
+    def guild_create(self, data):
+        """Handle the GUILD_CREATE event."""
+        guild_id = self.snowflake(data['id'])
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = Guild(guild_id)
+        guild.unavailable = bool(data.get('unavailable'))
+        self.guild_update(data)
+        for channel in data.get('channels', ()):
+            self._channel(guild_id, channel)
+        self.guild_members_chunk(data)
+        for presence in data.get('presences', ()):
+            self._presence(guild, presence)
+
+    def guild_update(self, data):
+        """Handle the GUILD_UPDATE event."""
+        guild = self.guilds.get(int(data['id']))
+        if guild is not None:
+            self._update(guild, data, ('name',))
+            if 'owner_id' in data:
+                guild.owner_id = self.snowflake(data['owner_id'])
+
+    def guild_delete(self, data):
+        """Handle the GUILD_DELETE event."""
+        guild_id = int(data['id'])
+        if data.get('unavailable'):
+            if guild_id in self.guilds:
+                self.guilds[guild_id].unavailable = True
+            return
+
+        guild = self.guilds.pop(guild_id, None)
+        if guild is not None:
+            for channel_id in guild.channels:
+                self.channels.pop(channel_id, None)
+            for member in guild.members.values():
+                self._leave(member)
+
+    def guild_member_add(self, data):
+        """Handle the GUILD_MEMBER_ADD event."""
+        guild = self.guilds.get(int(data['guild_id']))
+        if guild is not None:
+            self._member(guild, data)
+
+    guild_member_update = guild_member_add
+
+    def guild_member_remove(self, data):
+        """Handle the GUILD_MEMBER_REMOVE event."""
+        guild = self.guilds.get(int(data['guild_id']))
+        if guild is not None:
+            member = guild.members.pop(int(data['user']['id']), None)
+            if member is not None:
+                self._leave(member)
+
+    def guild_members_chunk(self, data):
+        """Handle the GUILD_MEMBERS_CHUNK event."""
+        guild = self.guilds.get(int(data.get('guild_id', data.get('id'))))
+        if guild is not None:
+            for member in data.get('members', ()):
+                self._member(guild, member)
+            for presence in data.get('presences', ()):
+                self._presence(guild, presence)
+
+    def presence_update(self, data):
+        """Handle the PRESENCE_UPDATE event."""
+        guild = self.guilds.get(int(data.get('guild_id', 0)))
+        if guild is not None:
+            self._presence(guild, data)
+
+    def channel_create(self, data):
+        """Handle the CHANNEL_CREATE event, of guild channels only."""
+        if data.get('guild_id'):
+            self._channel(self.snowflake(data['guild_id']), data)
+
+    channel_update = channel_create
+
+    def channel_delete(self, data):
+        """Handle the CHANNEL_DELETE event."""
+        channel = self.channels.pop(int(data['id']), None)
+        if channel is not None and channel.guild_id in self.guilds:
+            self.guilds[channel.guild_id].channels.pop(channel.id, None)
+
+    def footprint(self):
+        """Return the approximate memory used, in bytes, by kind."""
+        seen = set()
+
+        def size(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            total = sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                total += sum(size(k) + size(v) for k, v in obj.items())
+            elif isinstance(obj, tuple):
+                total += sum(size(v) for v in obj)
+            elif hasattr(obj, '__slots__'):
+                total += sum(size(getattr(obj, f))
+                             for f in obj.__slots__
+                             if f not in ('user', 'members', 'channels'))
+            return total
+
+        footprint = {
+            'users': size(self.users) + size(self._memberships),
+            'channels': size(self.channels),
+            'guilds': size(self.guilds),
+            'members': sum(size(g.members) for g in self.guilds.values())
+        }
+        footprint['total'] = sum(footprint.values())
+        return footprint
@@ -0,0 +1,184 @@
+"""Travis webhook certificate."""
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aiohttp import ClientSession
+from OpenSSL import crypto
+
+from .conf import (CERTIFICATE_RETRY, CERTIFICATE_TTL, TRAVIS_CONFIG_URL,
+                   VERIFY_CONCURRENCY)
+
+EXECUTORS = {
+    'inline': None,
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor
+}
+"""Where the signatures are verified."""
+
+log = logging.getLogger(__name__)
+
+_certificates = {}
+"""Certificates by public key, in each worker."""
+
+
+async def travis_certificate(url=TRAVIS_CONFIG_URL):
+    """Build the travis X509 certificate."""
+    async with ClientSession() as session:
+        async with session.get(url) as response:
+            assert 200 == response.status, response.reason
+            body = await response.json()
+            pkey = body['config']['notifications']['webhook']['public_key']
+
+    certificate = crypto.X509()
+    certificate.set_pubkey(crypto.load_publickey(crypto.FILETYPE_PEM, pkey))
+
+    return certificate
+
+
+def make_executor(kind, workers=None):
+    """Return the executor verifying the signatures, ``None`` for inline.
+
+    >>> make_executor('inline') is None
+    True
+    """
+    if kind not in EXECUTORS:
+        raise ValueError("unknown executor {!r}".format(kind))
+    executor = EXECUTORS[kind]
+    return executor(workers) if executor else None
+
+
+def verify(key, signature, data):
+    """Verify the signature using the PEM public key, in a worker.
+
+    :raises OpenSSL.crypto.Error: when the signature is invalid.
+    """
+    certificate = _certificates.get(key)
+    if certificate is None:
+        certificate = crypto.X509()
+        certificate.set_pubkey(
+            crypto.load_publickey(crypto.FILETYPE_PEM, key))
+        _certificates.clear()
+        _certificates[key] = certificate
+    crypto.verify(certificate, signature, data, 'sha1')
+
+
+class Certificate:
+    """Keep the Travis certificate fresh, away from the requests.
+
+    It is fetched when the application starts, then refreshed every
+    ``ttl`` seconds in the background. Concurrent fetches share the same
+    in-flight one.
+    """
+
+    def __init__(self, fetch=travis_certificate, ttl=CERTIFICATE_TTL,
+                 retry=CERTIFICATE_RETRY, executor=None,
+                 concurrency=VERIFY_CONCURRENCY, loop=None):
+        """Init the certificate.
+
+        :param fetch: Coroutine function returning the X509 certificate.
+        :param ttl: Seconds between two refreshes.
+        :param retry: Seconds between two fetches, after a failure.
+        :param executor: Thread or process pool verifying the signatures,
+                         see :func:`make_executor`. Inline, in the event
+                         loop, when ``None``.
+        :param concurrency: Maximum of signatures being verified at once.
+        """
+        self._fetch = fetch
+        self.ttl = ttl
+        self.retry = retry
+        self.executor = executor
+        self.loop = loop or asyncio.get_event_loop()
+
+        self.verifying = asyncio.Semaphore(concurrency)
+        """Limits the verifications in flight."""
+
+        self.certificate = None
+        """The current X509 certificate."""
+
+        self.key = None
+        """The public key of the certificate, in PEM format."""
+
+        self.fetched = None
+        """Loop time of the last fetch."""
+
+        self.fetching = None
+        """The in-flight fetch."""
+
+        self.refreshing = None
+
+    def fetch(self):
+        """Return the in-flight fetch, starting one if needed."""
+        if self.fetching is None or self.fetching.done():
+            self.fetching = asyncio.ensure_future(self._refetch())
+        return self.fetching
+
+    async def _refetch(self):
+        """Fetch and keep the certificate."""
+        certificate = await self._fetch()
+        self.key = crypto.dump_publickey(crypto.FILETYPE_PEM,
+                                         certificate.get_pubkey())
+        self.certificate = certificate
+        self.fetched = self.loop.time()
+        return self.certificate
+
+    async def get(self):
+        """Return the certificate, only waiting for it the first time."""
+        if self.certificate is None:
+            # Shielded, so a client going away does not cancel it.
+            return await asyncio.shield(self.fetch())
+        return self.certificate
+
+    async def verify(self, signature, data):
+        """Verify the signature of the data.
+
+        The certificate is fetched again once when it does not match, in
+        case Travis rotated its key, unless that was done recently.
+
+        :raises OpenSSL.crypto.Error: when the signature is invalid.
+        """
+        await self.get()
+        try:
+            await self._verify(signature, data)
+        except crypto.Error:
+            if self.loop.time() - self.fetched < self.retry:
+                raise
+            await asyncio.shield(self.fetch())
+            await self._verify(signature, data)
+
+    async def _verify(self, signature, data):
+        """Verify the signature, in the executor if any."""
+        if self.executor is None:
+            crypto.verify(self.certificate, signature, data, 'sha1')
+            return
+
+        async with self.verifying:
+            await self.loop.run_in_executor(self.executor, verify, self.key,
+                                            signature, data)
+
+    async def _refresh(self):
+        """Refresh the certificate regularly."""
+        while True:
+            try:
+                await self.fetch()
+                delay = self.ttl
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("cannot fetch the certificate: %r", e)
+                delay = self.retry
+            await asyncio.sleep(delay)
+
+    async def start(self, app=None):
+        """Start fetching the certificate, when the application starts."""
+        if self.refreshing is None:
+            self.refreshing = asyncio.ensure_future(self._refresh())
+
+    async def stop(self, app=None):
+        """Stop refreshing the certificate, when the application stops."""
+        if self.refreshing is not None:
+            self.refreshing.cancel()
+            self.refreshing = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
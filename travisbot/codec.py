@@ -0,0 +1,86 @@
+"""JSON codecs, using the fastest library installed.
+
+``orjson`` and ``ujson`` are picked when available (``pip install
+discord-travisbot[fast]``), the standard library otherwise.
+"""
+
+import json
+import re
+from importlib import import_module
+
+PREFERENCE = ('orjson', 'ujson', 'json')
+"""Codecs by order of preference."""
+
+HEADER = re.compile(
+    r'\{"t":(?:null|"([A-Z_]+)"),"s":(null|\d+),"op":(\d+),"d":')
+"""Beginning of a gateway payload, as sent by Discord."""
+
+
+def peek(data):
+    """Read the ``op``, ``t`` and ``s`` of a payload without decoding it.
+
+    >>> peek('{"t":"TYPING_START","s":42,"op":0,"d":{"user_id":"1"}}')
+    {'op': 0, 't': 'TYPING_START', 's': 42}
+
+    :return: the payload without ``d``, or ``None`` when it cannot be read.
+    """
+    match = HEADER.match(data)
+    if not match:
+        return None
+    t, s, op = match.groups()
+    return {'op': int(op), 't': t, 's': None if s == 'null' else int(s)}
+
+
+class Codec:
+    """Encode and decode JSON with the given library."""
+
+    binary = False
+    """Payloads are sent as text frames."""
+
+    def __init__(self, name):
+        """Init the codec.
+
+        :param name: The JSON library, ``orjson``, ``ujson`` or ``json``.
+        :raises ImportError: when the library is not installed.
+        """
+        self.name = name
+        self.module = import_module(name)
+
+        if name == 'orjson':
+            # orjson produces bytes.
+            dumps = self.module.dumps
+            self.dumps = lambda obj: dumps(obj).decode('utf-8')
+        elif name == 'json':
+            self.dumps = json.JSONEncoder(separators=(',', ':')).encode
+        else:
+            self.dumps = self.module.dumps
+
+        self.loads = self.module.loads
+        self.peek = peek
+
+    def __repr__(self):
+        """Represent the codec by its library."""
+        return "<Codec {}>".format(self.name)
+
+
+_codecs = {}
+
+
+def get_codec(name=None):
+    """Return the codec by name, or the fastest one installed.
+
+    >>> get_codec('json').loads('{"op": 11}')
+    {'op': 11}
+    >>> get_codec('json').dumps({"op": 1, "d": None})
+    '{"op":1,"d":null}'
+    """
+    names = (name,) if name else PREFERENCE
+    for name in names:
+        if name not in _codecs:
+            try:
+                _codecs[name] = Codec(name)
+            except ImportError:
+                if len(names) == 1:
+                    raise
+                continue
+        return _codecs[name]
@@ -0,0 +1,65 @@
+"""Gateway transport compression."""
+
+import zlib
+
+PAYLOAD = "payload"
+"""Large payloads are compressed one by one, asked at identify."""
+
+ZLIB_STREAM = "zlib-stream"
+"""The whole connection shares one compression context."""
+
+ZLIB_SUFFIX = b'\x00\x00\xff\xff'
+"""Ending of a ``Z_SYNC_FLUSH``, closing a message in the stream."""
+
+
+class Inflator:
+    """Decompress a ``zlib-stream`` connection.
+
+    Messages may be split over several frames, they are complete once the
+    ``Z_SYNC_FLUSH`` suffix is received.
+
+    >>> deflator = zlib.compressobj()
+    >>> def deflate(data):
+    ...     return deflator.compress(data) + deflator.flush(zlib.Z_SYNC_FLUSH)
+    >>> inflator = Inflator()
+    >>> inflator.feed(deflate(b'{"op":10}'))
+    b'{"op":10}'
+    >>> frame = deflate(b'{"op":11}')
+    >>> inflator.feed(frame[:3]) is None
+    True
+    >>> inflator.feed(frame[3:])
+    b'{"op":11}'
+    """
+
+    def __init__(self):
+        """Init the inflator."""
+        self.inflator = zlib.decompressobj()
+        self.buffer = bytearray()
+        """Frames of a message not yet complete."""
+
+        self.received = 0
+        """Bytes received, compressed."""
+
+        self.inflated = 0
+        """Bytes decompressed."""
+
+    def feed(self, data):
+        """Return the decompressed message, or ``None`` if incomplete."""
+        self.received += len(data)
+        tail = data[-4:]
+        if len(tail) < 4:
+            tail = bytes(self.buffer[len(tail) - 4:]) + tail
+        if tail != ZLIB_SUFFIX:
+            self.buffer.extend(data)
+            return None
+
+        if self.buffer:
+            self.buffer.extend(data)
+            data = self.inflator.decompress(self.buffer)
+            del self.buffer[:]
+        else:
+            # Most messages fit in one frame, no copies.
+            data = self.inflator.decompress(data)
+
+        self.inflated += len(data)
+        return data
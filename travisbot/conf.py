@@ -11,3 +11,115 @@ URL = "https://discordapp.com/api"
 
 TRAVIS_CONFIG_URL = "https://api.travis-ci.org/config"
 """Travis configuration URL containing the webhook public key."""
+
+LIMIT_PER_HOST = 10
+"""Maximum number of pooled connections to the Discord HTTP API."""
+
+KEEPALIVE_TIMEOUT = 60
+"""Seconds an idle connection to the Discord HTTP API is kept alive."""
+
+RETRIES = 5
+"""Attempts at a Discord HTTP API call which is rate limited."""
+
+CHANNEL_QUEUE_SIZE = 100
+"""Messages waiting to be sent to one channel, the queue is read no more."""
+
+MESSAGES_SIZE = 1000
+"""Builds whose message is remembered, to be edited."""
+
+MESSAGES_SAVE_DELAY = 1
+"""Seconds to wait for more changes before saving the messages."""
+
+BATCH_WINDOW = .5
+"""Seconds to wait for more notifications to send in the same message."""
+
+BATCH_SIZE = 100
+"""Maximum number of notifications collected during a window."""
+
+EMBEDS_PER_MESSAGE = 10
+"""Maximum number of embeds Discord accepts in one message."""
+
+QUEUE_SIZE = 1000
+"""Maximum number of notifications waiting to be sent."""
+
+QUEUE_POLICY = "reject"
+"""What to do of a notification when the queue is full.
+
+``reject`` answers with a 503, ``drop-oldest`` makes room by forgetting the
+oldest and ``coalesce`` replaces the queued notification of the same build.
+"""
+
+DEDUPE_TTL = 3600
+"""Seconds a webhook is remembered, the same one being skipped meanwhile."""
+
+DEDUPE_SIZE = 10000
+"""Webhooks remembered, the oldest are forgotten."""
+
+SPOOL_SEGMENT_SIZE = 16 * 1024 * 1024
+"""Bytes after which the spool starts a new segment file."""
+
+SPOOL_COMMIT_DELAY = .002
+"""Seconds the spool waits for more notifications before syncing them."""
+
+CERTIFICATE_TTL = 3600
+"""Seconds between two refreshes of the Travis certificate."""
+
+CERTIFICATE_RETRY = 60
+"""Seconds before fetching the Travis certificate again, after a failure."""
+
+VERIFY_EXECUTOR = "thread"
+"""Where the webhook signatures are verified: inline, thread or process."""
+
+VERIFY_WORKERS = 4
+"""Number of threads or processes verifying the webhook signatures."""
+
+FORWARD_TIMEOUT = 5
+"""Seconds a worker waits for the bot to queue a webhook."""
+
+VERIFY_CONCURRENCY = 16
+"""Maximum number of webhook signatures being verified at once."""
+
+GATEWAY_COMPRESS = "zlib-stream"
+"""Gateway compression: ``zlib-stream``, ``payload`` or ``None``."""
+
+GATEWAY_ENCODING = "json"
+"""Gateway encoding: ``json`` or ``etf``."""
+
+LOG_SAMPLE = 1000
+"""Log one event out of that many, for the frequent ones."""
+
+LAZY_SIZE = 256
+"""Smaller payloads are always decoded, peeking would not be worth it."""
+
+LARGE_THRESHOLD = 50
+"""Members above which only the online ones come with the guild, 50 to 250."""
+
+CHUNK_CONCURRENCY = 2
+"""Maximum number of guilds having their members requested at once."""
+
+CHUNK_TIMEOUT = 60
+"""Seconds to receive all the members of a guild."""
+
+CHANNEL_ID = 309734242085109760
+"""Channel receiving the notifications, called #bots."""
+
+ROUTES_INTERVAL = 5
+"""Seconds between two checks of the routes file, reloaded on change."""
+
+IDENTIFY_DELAY = 5
+"""Seconds between two identifies sharing a rate limit bucket."""
+
+RECONNECT_BASE = 1
+"""Seconds of the backoff after the first failed reconnection, doubling."""
+
+RECONNECT_MAX = 60
+"""Maximum seconds between two reconnections."""
+
+LATENCY_SAMPLES = 100
+"""Heartbeat round-trips kept to compute the gateway latency."""
+
+EVENT_CONCURRENCY = 100
+"""Maximum number of event callbacks running at once, the others wait."""
+
+LOG_QUEUE_SIZE = 10000
+"""Log records waiting to be written, the next ones are dropped."""
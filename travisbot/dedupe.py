@@ -0,0 +1,98 @@
+"""Skipping of the webhooks already received.
+
+Travis retries a delivery it did not see acknowledged, and the same build
+may be sent by more than one project. A notification is keyed by its build
+and state, the keys seen recently are kept in a hash set, and a ring of
+their arrival, bounded in time and in size.
+
+>>> seen = Deduplicator(ttl=60, maxsize=2, clock=iter([0, 1, 2, 70]).__next__)
+>>> seen.add({'id': 1, 'state': 'started'})
+True
+>>> seen.add({'id': 1, 'state': 'started'})
+False
+>>> seen.add({'id': 1, 'state': 'passed'})
+True
+>>> seen.add({'id': 1, 'state': 'started'})
+True
+"""
+
+import time
+from collections import deque
+
+from .conf import DEDUPE_SIZE, DEDUPE_TTL
+
+
+def key(data):
+    """Return the build and state of a notification, ``None`` if unknown.
+
+    >>> key({'id': 42, 'state': 'passed', 'status_message': 'Fixed'})
+    (42, 'passed', 'Fixed')
+    """
+    build = data.get("id") if isinstance(data, dict) else None
+    if build is None:
+        return None
+    return build, data.get("state"), data.get("status_message")
+
+
+class Deduplicator:
+    """The notifications received lately, by build and state."""
+
+    def __init__(self, ttl=DEDUPE_TTL, maxsize=DEDUPE_SIZE,
+                 clock=time.monotonic):
+        """Init the set.
+
+        :param ttl: Seconds a notification is remembered.
+        :param maxsize: Notifications remembered, the oldest are forgotten.
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+
+        self.keys = {}
+        """Arrival time, by key."""
+
+        self.ring = deque()
+        """The ``(time, key)`` added, the oldest first."""
+
+        self.counters = dict.fromkeys(('duplicates', 'expired', 'evicted'),
+                                      0)
+
+    def _expire(self, now):
+        """Forget the keys too old, or too many."""
+        deadline = now - self.ttl
+        while self.ring and (len(self.ring) > self.maxsize or
+                             self.ring[0][0] <= deadline):
+            added, key = self.ring.popleft()
+            # The key may have been discarded, then added again.
+            if self.keys.get(key) == added:
+                del self.keys[key]
+                if added <= deadline:
+                    self.counters['expired'] += 1
+                else:
+                    self.counters['evicted'] += 1
+
+    def add(self, data):
+        """Remember the notification, return whether it is a new one."""
+        k = key(data)
+        if k is None:
+            return True
+        now = self.clock()
+        self._expire(now)
+        if k in self.keys:
+            self.counters['duplicates'] += 1
+            return False
+        self.keys[k] = now
+        self.ring.append((now, k))
+        if len(self.ring) > self.maxsize:
+            self._expire(now)
+        return True
+
+    def discard(self, data):
+        """Forget the notification, e.g. it could not be queued."""
+        k = key(data)
+        if k is not None:
+            self.keys.pop(k, None)
+
+    def stats(self):
+        """Return the state of the set."""
+        return dict(self.counters, size=len(self.keys))
@@ -0,0 +1,359 @@
+"""Erlang External Term Format, the ``etf`` gateway encoding.
+
+A pure Python encoder and decoder of the terms used by Discord. Binaries
+are decoded to ``str``, atoms too except for ``nil``, ``true`` and
+``false``. Snowflakes are integers, unlike with JSON.
+
+>>> loads(dumps({'op': 1, 'd': None}))
+{'op': 1, 'd': None}
+"""
+
+import struct
+import zlib
+
+VERSION = 131
+
+NEW_FLOAT_EXT = 70
+COMPRESSED = 80
+SMALL_INTEGER_EXT = 97
+INTEGER_EXT = 98
+FLOAT_EXT = 99
+ATOM_EXT = 100
+SMALL_TUPLE_EXT = 104
+LARGE_TUPLE_EXT = 105
+NIL_EXT = 106
+STRING_EXT = 107
+LIST_EXT = 108
+BINARY_EXT = 109
+SMALL_BIG_EXT = 110
+LARGE_BIG_EXT = 111
+MAP_EXT = 116
+SMALL_ATOM_EXT = 115
+ATOM_UTF8_EXT = 118
+SMALL_ATOM_UTF8_EXT = 119
+
+ATOMS = {'nil': None, 'true': True, 'false': False}
+"""Atoms having a Python equivalent."""
+
+_u16 = struct.Struct('>H')
+_u32 = struct.Struct('>I')
+_i32 = struct.Struct('>i')
+_f64 = struct.Struct('>d')
+
+
+class ETFError(ValueError):
+    """The data is not a valid term."""
+
+
+def loads(data):
+    """Decode a term.
+
+    :param data: bytes, starting with the version.
+    :raises ETFError: when it is not a valid term.
+    """
+    if not data or data[0] != VERSION:
+        raise ETFError("unknown version")
+    try:
+        term, pos = _decode(data, 1)
+    except (IndexError, KeyError, struct.error) as e:
+        raise ETFError("invalid term") from e
+    if pos != len(data):
+        raise ETFError("truncated or trailing data")
+    return term
+
+
+def _decode(data, pos):
+    """Decode the term at the position, return it and the next position."""
+    return _decoders[data[pos]](data, pos + 1)
+
+
+def _small_integer(data, pos):
+    return data[pos], pos + 1
+
+
+def _integer(data, pos):
+    return _i32.unpack_from(data, pos)[0], pos + 4
+
+
+def _new_float(data, pos):
+    return _f64.unpack_from(data, pos)[0], pos + 8
+
+
+def _float(data, pos):
+    return float(data[pos:pos + 31].split(b'\0', 1)[0]), pos + 31
+
+
+def _atom(name):
+    name = name.decode('utf-8')
+    return ATOMS.get(name, name)
+
+
+def _atom16(data, pos):
+    n = _u16.unpack_from(data, pos)[0]
+    pos += 2
+    return _atom(data[pos:pos + n]), pos + n
+
+
+def _atom8(data, pos):
+    n = data[pos]
+    pos += 1
+    return _atom(data[pos:pos + n]), pos + n
+
+
+def _small_tuple(data, pos):
+    n = data[pos]
+    return _tuple(data, pos + 1, n)
+
+
+def _large_tuple(data, pos):
+    n = _u32.unpack_from(data, pos)[0]
+    return _tuple(data, pos + 4, n)
+
+
+def _tuple(data, pos, n):
+    items = []
+    for _ in range(n):
+        item, pos = _decode(data, pos)
+        items.append(item)
+    return tuple(items), pos
+
+
+def _nil(data, pos):
+    return [], pos
+
+
+def _string(data, pos):
+    n = _u16.unpack_from(data, pos)[0]
+    pos += 2
+    return list(data[pos:pos + n]), pos + n
+
+
+def _list(data, pos):
+    n = _u32.unpack_from(data, pos)[0]
+    pos += 4
+    items = []
+    for _ in range(n):
+        item, pos = _decode(data, pos)
+        items.append(item)
+    # The tail of a proper list is NIL.
+    _, pos = _decode(data, pos)
+    return items, pos
+
+
+def _binary(data, pos):
+    n = _u32.unpack_from(data, pos)[0]
+    pos += 4
+    value = data[pos:pos + n]
+    try:
+        value = value.decode('utf-8')
+    except UnicodeDecodeError:
+        value = bytes(value)
+    return value, pos + n
+
+
+def _big(data, pos, n):
+    sign = data[pos]
+    pos += 1
+    value = int.from_bytes(data[pos:pos + n], 'little')
+    return -value if sign else value, pos + n
+
+
+def _small_big(data, pos):
+    return _big(data, pos + 1, data[pos])
+
+
+def _large_big(data, pos):
+    return _big(data, pos + 4, _u32.unpack_from(data, pos)[0])
+
+
+def _map(data, pos):
+    n = _u32.unpack_from(data, pos)[0]
+    pos += 4
+    value = {}
+    for _ in range(n):
+        key, pos = _decode(data, pos)
+        value[key], pos = _decode(data, pos)
+    return value, pos
+
+
+def _compressed(data, pos):
+    size = _u32.unpack_from(data, pos)[0]
+    pos += 4
+    inflator = zlib.decompressobj()
+    term, _ = _decode(inflator.decompress(data[pos:], size), 0)
+    return term, len(data) - len(inflator.unused_data)
+
+
+_decoders = {
+    NEW_FLOAT_EXT: _new_float,
+    COMPRESSED: _compressed,
+    SMALL_INTEGER_EXT: _small_integer,
+    INTEGER_EXT: _integer,
+    FLOAT_EXT: _float,
+    ATOM_EXT: _atom16,
+    SMALL_TUPLE_EXT: _small_tuple,
+    LARGE_TUPLE_EXT: _large_tuple,
+    NIL_EXT: _nil,
+    STRING_EXT: _string,
+    LIST_EXT: _list,
+    BINARY_EXT: _binary,
+    SMALL_BIG_EXT: _small_big,
+    LARGE_BIG_EXT: _large_big,
+    MAP_EXT: _map,
+    SMALL_ATOM_EXT: _atom8,
+    ATOM_UTF8_EXT: _atom16,
+    SMALL_ATOM_UTF8_EXT: _atom8
+}
+
+
+def peek(data, skip='d'):
+    """Decode a map without the value of the ``skip`` key.
+
+    >>> peek(dumps({'op': 0, 't': 'TYPING_START', 'd': {'user_id': 1}}))
+    {'op': 0, 't': 'TYPING_START'}
+
+    :return: the map, or ``None`` when the term is not a map.
+    """
+    if len(data) < 6 or data[0] != VERSION or data[1] != MAP_EXT:
+        return None
+    try:
+        n = _u32.unpack_from(data, 2)[0]
+        pos = 6
+        value = {}
+        for _ in range(n):
+            key, pos = _decode(data, pos)
+            if key == skip:
+                pos = _skip(data, pos)
+            else:
+                value[key], pos = _decode(data, pos)
+    except (IndexError, KeyError, struct.error) as e:
+        raise ETFError("invalid term") from e
+    return value
+
+
+def _skip(data, pos):
+    """Return the position after the term, without decoding it."""
+    tag = data[pos]
+    pos += 1
+    if tag in _sizes:
+        return pos + _sizes[tag]
+    if tag == MAP_EXT or tag == LIST_EXT or tag == LARGE_TUPLE_EXT:
+        n = _u32.unpack_from(data, pos)[0]
+        pos += 4
+        if tag == MAP_EXT:
+            n *= 2
+        elif tag == LIST_EXT:
+            n += 1  # the tail
+        for _ in range(n):
+            pos = _skip(data, pos)
+        return pos
+    if tag == SMALL_TUPLE_EXT:
+        n = data[pos]
+        pos += 1
+        for _ in range(n):
+            pos = _skip(data, pos)
+        return pos
+    if tag == BINARY_EXT:
+        return pos + 4 + _u32.unpack_from(data, pos)[0]
+    if tag == ATOM_EXT or tag == ATOM_UTF8_EXT or tag == STRING_EXT:
+        return pos + 2 + _u16.unpack_from(data, pos)[0]
+    if tag == SMALL_ATOM_EXT or tag == SMALL_ATOM_UTF8_EXT:
+        return pos + 1 + data[pos]
+    if tag == SMALL_BIG_EXT:
+        return pos + 2 + data[pos]
+    if tag == LARGE_BIG_EXT:
+        return pos + 5 + _u32.unpack_from(data, pos)[0]
+    if tag == COMPRESSED:
+        # The whole remaining data is the compressed term.
+        return len(data)
+    raise KeyError(tag)
+
+
+_sizes = {
+    SMALL_INTEGER_EXT: 1,
+    INTEGER_EXT: 4,
+    NEW_FLOAT_EXT: 8,
+    FLOAT_EXT: 31,
+    NIL_EXT: 0
+}
+"""Sizes of the fixed size terms."""
+
+
+def dumps(term):
+    r"""Encode a term.
+
+    Strings are encoded as binaries, like Discord expects for the keys
+    and the values of the payloads.
+
+    >>> dumps({'op': 1})
+    b'\x83t\x00\x00\x00\x01m\x00\x00\x00\x02opa\x01'
+    """
+    out = bytearray([VERSION])
+    _encode(term, out)
+    return bytes(out)
+
+
+def _encode(term, out):
+    """Append the encoded term to the output."""
+    if term is None or term is True or term is False:
+        name = {None: b'nil', True: b'true', False: b'false'}[term]
+        out += bytes((SMALL_ATOM_UTF8_EXT, len(name))) + name
+    elif isinstance(term, str):
+        data = term.encode('utf-8')
+        out.append(BINARY_EXT)
+        out += _u32.pack(len(data)) + data
+    elif isinstance(term, int):
+        if 0 <= term < 256:
+            out += bytes((SMALL_INTEGER_EXT, term))
+        elif -2 ** 31 <= term < 2 ** 31:
+            out.append(INTEGER_EXT)
+            out += _i32.pack(term)
+        else:
+            data = abs(term).to_bytes((abs(term).bit_length() + 7) // 8,
+                                      'little')
+            if len(data) < 256:
+                out += bytes((SMALL_BIG_EXT, len(data), term < 0))
+            else:
+                out.append(LARGE_BIG_EXT)
+                out += _u32.pack(len(data)) + bytes((term < 0,))
+            out += data
+    elif isinstance(term, float):
+        out.append(NEW_FLOAT_EXT)
+        out += _f64.pack(term)
+    elif isinstance(term, dict):
+        out.append(MAP_EXT)
+        out += _u32.pack(len(term))
+        for key, value in term.items():
+            _encode(key, out)
+            _encode(value, out)
+    elif isinstance(term, (list, tuple)):
+        if isinstance(term, tuple):
+            if len(term) < 256:
+                out += bytes((SMALL_TUPLE_EXT, len(term)))
+            else:
+                out.append(LARGE_TUPLE_EXT)
+                out += _u32.pack(len(term))
+        elif term:
+            out.append(LIST_EXT)
+            out += _u32.pack(len(term))
+        for item in term:
+            _encode(item, out)
+        if not isinstance(term, tuple):
+            out.append(NIL_EXT)
+    elif isinstance(term, (bytes, bytearray)):
+        out.append(BINARY_EXT)
+        out += _u32.pack(len(term)) + term
+    else:
+        raise TypeError("cannot encode {!r}".format(term))
+
+
+class ETFCodec:
+    """The ``etf`` encoding, as a gateway codec."""
+
+    name = 'etf'
+    binary = True
+    """Payloads are sent as binary frames."""
+
+    loads = staticmethod(loads)
+    dumps = staticmethod(dumps)
+    peek = staticmethod(peek)
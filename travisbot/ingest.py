@@ -0,0 +1,310 @@
+"""Webhook workers, apart from the gateway.
+
+A few processes serve the webhooks on the same port, the kernel spreading
+the connections among them (``SO_REUSEPORT``). Each one verifies the
+signatures, then forwards the notifications to the process of the bot, over
+a Unix socket.
+
+The notifications go as JSON lines, the :class:`Ingest` server answering
+each of them in order with one of :data:`OK`, :data:`DUPLICATE` or
+:data:`FULL`, so that a worker still answers Travis with a 503 when the
+queue of the bot is full.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import stat
+from collections import deque
+
+from aiohttp import web
+
+from . import logs
+from .certificate import Certificate, make_executor, travis_certificate
+from .codec import get_codec
+from .conf import FORWARD_TIMEOUT, HOST, PORT, VERIFY_EXECUTOR, VERIFY_WORKERS
+from .queue import QueueFull
+from .recorder import WEBHOOK
+from .web import enqueue, make_app
+
+log = logging.getLogger(__name__)
+
+OK = b"ok"
+"""The notification was queued."""
+
+DUPLICATE = b"duplicate"
+"""The notification was already queued, it is skipped."""
+
+FULL = b"full"
+"""The queue refused the notification."""
+
+LIMIT = 2 ** 21
+"""Maximum length of a line, above the size of a webhook body aiohttp
+accepts."""
+
+
+class Ingest:
+    """Queue the notifications forwarded by the workers, in the bot."""
+
+    def __init__(self, path, put, dedupe=None, recorder=None, codec=None):
+        """Init the server.
+
+        :param path: The Unix socket to listen on.
+        :param put: The Queue writer side.
+        :param dedupe: The :class:`~travisbot.dedupe.Deduplicator`, shared
+                       by the workers.
+        :param recorder: The :class:`~travisbot.recorder.Recorder`
+                         capturing the notifications.
+        """
+        self.path = path
+        self.put = put
+        self.dedupe = dedupe
+        self.recorder = recorder
+        self.codec = get_codec(codec)
+        self.server = None
+
+        self.connections = 0
+        """Workers connected."""
+
+        self.counters = dict.fromkeys(('queued', 'duplicates', 'full',
+                                       'invalid', 'errors'), 0)
+
+    async def start(self):
+        """Listen on the socket, left over by a previous run or not."""
+        try:
+            if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self.server = await asyncio.start_unix_server(
+            self._handle, self.path, limit=LIMIT)
+
+    async def _handle(self, reader, writer):
+        """Read the notifications of a worker, answering them in order."""
+        self.connections += 1
+        answers = asyncio.Queue()
+        answering = asyncio.ensure_future(self._answer(answers, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Queued concurrently, e.g. the spool syncs them together.
+                answers.put_nowait(asyncio.ensure_future(self._queue(line)))
+        finally:
+            answers.put_nowait(None)
+            await answering
+            writer.close()
+            self.connections -= 1
+
+    async def _answer(self, answers, writer):
+        """Write the answers, once known, in the order of the lines."""
+        while True:
+            answer = await answers.get()
+            if answer is None:
+                break
+            writer.write(await answer + b"\n")
+
+    async def _queue(self, line):
+        """Queue the notification of the line, return the answer."""
+        try:
+            data = self.codec.loads(line)
+        except ValueError:
+            # Decoded by the worker already, it is not worth a retry.
+            self.counters['invalid'] += 1
+            return DUPLICATE
+        if self.recorder is not None:
+            self.recorder.record(WEBHOOK, line.decode("utf-8").rstrip())
+        try:
+            if not await enqueue(self.put, data, self.dedupe):
+                self.counters['duplicates'] += 1
+                return DUPLICATE
+        except QueueFull:
+            self.counters['full'] += 1
+            return FULL
+        except Exception:
+            # e.g. the spool cannot write, Travis retries later.
+            self.counters['errors'] += 1
+            log.exception("cannot queue the notification")
+            return FULL
+        self.counters['queued'] += 1
+        return OK
+
+    async def close(self):
+        """Stop listening."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+            os.unlink(self.path)
+
+    def stats(self):
+        """Return the state of the server."""
+        return dict(self.counters, connections=self.connections)
+
+
+class Forwarder:
+    """Send the notifications to the bot, from a worker.
+
+    Its :meth:`put` is the one given to :func:`~travisbot.web.make_app`.
+    """
+
+    def __init__(self, path, codec=None, timeout=FORWARD_TIMEOUT):
+        """Init the forwarder.
+
+        :param path: The Unix socket of the :class:`Ingest` server.
+        :param timeout: Seconds to wait for an answer, the connection is
+                        opened again after that.
+        """
+        self.path = path
+        self.codec = get_codec(codec)
+        self.timeout = timeout
+        self.writer = None
+        self.reading = None
+        self.connecting = asyncio.Lock()
+
+        self.pending = deque()
+        """Futures of the answers, in the order of the lines."""
+
+        self.counters = dict.fromkeys(('forwarded', 'duplicates', 'full',
+                                       'errors', 'timeouts', 'connects'), 0)
+
+    async def connect(self):
+        """Connect to the bot, unless connected."""
+        async with self.connecting:
+            if self.reading is not None and not self.reading.done():
+                return
+            reader, self.writer = await asyncio.open_unix_connection(
+                self.path, limit=LIMIT)
+            self.reading = asyncio.ensure_future(
+                self._read(reader, self.writer))
+            self.counters['connects'] += 1
+
+    async def _read(self, reader, writer):
+        """Hand the answers over, until the connection is lost."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                future = self.pending.popleft()
+                # Its webhook may have been cancelled, e.g. on a timeout.
+                if not future.done():
+                    future.set_result(line.rstrip())
+        finally:
+            writer.close()
+            while self.pending:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError("lost the connection to the bot"))
+
+    async def put(self, data):
+        """Forward the notification.
+
+        :raises QueueFull: when the bot refused it, or cannot be reached,
+                           so that Travis retries.
+        """
+        try:
+            await self.connect()
+            future = asyncio.get_event_loop().create_future()
+            self.pending.append(future)
+            self.writer.write(self.codec.dumps(data).encode("utf-8") + b"\n")
+            await self.writer.drain()
+            answer = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            log.warning("the bot did not answer, reconnecting",
+                        extra={'sample': 'forward timeout'})
+            # The reader lets go, the next notification connects again.
+            self.writer.close()
+            await asyncio.wait([self.reading])
+            raise QueueFull(self.path)
+        except OSError as e:
+            self.counters['errors'] += 1
+            log.warning("cannot forward the notification: %r", e,
+                        extra={'sample': 'forward error'})
+            raise QueueFull(self.path)
+
+        if answer == FULL:
+            self.counters['full'] += 1
+            raise QueueFull(self.path)
+        if answer == DUPLICATE:
+            self.counters['duplicates'] += 1
+        self.counters['forwarded'] += 1
+
+    async def close(self, app=None):
+        """Close the connection, when the application stops."""
+        if self.writer is not None:
+            self.writer.close()
+        if self.reading is not None:
+            await self.reading
+
+    def stats(self):
+        """Return the state of the forwarder."""
+        return dict(self.counters, pending=len(self.pending))
+
+
+def run_worker(path, host=HOST, port=PORT, fetch=travis_certificate,
+               executor=VERIFY_EXECUTOR, verify_workers=VERIFY_WORKERS,
+               log_level=None, codec=None):
+    """Serve the webhooks until terminated, in a worker process.
+
+    :param path: The Unix socket of the :class:`Ingest` server.
+    :param fetch: Coroutine function returning the Travis certificate.
+    :param executor: Where the signatures are verified, see
+                     :func:`~travisbot.certificate.make_executor`.
+    :param log_level: Level of the logs, the ones of the parent are not
+                      inherited when ``None``.
+    """
+    listener = logs.setup(log_level) if log_level else None
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    forwarder = Forwarder(path, codec)
+    certificate = Certificate(fetch, executor=make_executor(
+        executor, verify_workers), loop=loop)
+    # The duplicates are skipped by the bot, seeing every worker's.
+    app = make_app(forwarder.put, stats={'forwarder': forwarder.stats},
+                   certificate=certificate, codec=codec, dedupe=False)
+    app.on_cleanup.append(forwarder.close)
+
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, port, reuse_port=True)
+    loop.run_until_complete(site.start())
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    log.info("worker listening on %s:%s", host, port)
+    try:
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+        if listener is not None:
+            listener.stop()
+
+
+def start_workers(count, path, host=HOST, port=PORT, **kwargs):
+    """Start the worker processes, sharing the port.
+
+    :param kwargs: Options of :func:`run_worker`.
+    :return: the processes.
+    """
+    processes = []
+    for i in range(count):
+        process = multiprocessing.Process(
+            target=run_worker, args=(path, host, port), kwargs=kwargs,
+            name="travisbot-ingest-{}".format(i), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def stop_workers(processes, timeout=5):
+    """Terminate the worker processes, and wait for them."""
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout)
@@ -0,0 +1,68 @@
+"""Gateway latency, from the heartbeats."""
+
+from collections import deque
+
+from .conf import LATENCY_SAMPLES
+
+BUCKETS = (.025, .05, .1, .25, .5, 1, 2.5, 5)
+"""Upper bounds of the histogram buckets, in seconds."""
+
+
+class Latency:
+    """Rolling histogram of the last round-trip times.
+
+    >>> latency = Latency(size=3)
+    >>> for rtt in (.2, .04, .03, .06):
+    ...     latency.add(rtt)
+    >>> latency.last, latency.percentile(.5)
+    (0.06, 0.04)
+    >>> latency.histogram()[:3]
+    [(0.025, 0), (0.05, 2), (0.1, 3)]
+    """
+
+    def __init__(self, size=LATENCY_SAMPLES, buckets=BUCKETS):
+        """Init the histogram.
+
+        :param size: Round-trips kept, the older ones are forgotten.
+        :param buckets: Upper bounds of the buckets, in seconds.
+        """
+        self.samples = deque(maxlen=size)
+        self.buckets = buckets
+        self.count = 0
+        """Round-trips measured, ever."""
+
+    def add(self, rtt):
+        """Add a round-trip time, in seconds."""
+        self.samples.append(rtt)
+        self.count += 1
+
+    @property
+    def last(self):
+        """Return the last round-trip time, ``None`` before the first."""
+        return self.samples[-1] if self.samples else None
+
+    def percentile(self, q):
+        """Return the round-trip time below which ``q`` of them are."""
+        if not self.samples:
+            return None
+        samples = sorted(self.samples)
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    def histogram(self):
+        """Return the cumulative count of round-trips below each bound."""
+        return [(bound, sum(1 for rtt in self.samples if rtt <= bound))
+                for bound in self.buckets]
+
+    def stats(self):
+        """Return the latency statistics, in seconds."""
+        samples = self.samples
+        return {
+            "last": self.last,
+            "mean": sum(samples) / len(samples) if samples else None,
+            "p50": self.percentile(.5),
+            "p95": self.percentile(.95),
+            "max": max(samples, default=None),
+            "count": self.count,
+            "histogram": {str(bound): count
+                          for bound, count in self.histogram()}
+        }
@@ -0,0 +1,134 @@
+"""Load test of the webhook server, with signed notifications.
+
+The webhooks are signed by a :mod:`~travisbot.travis` key, posted at a
+given concurrency, then delivered by a bot to a
+:class:`~travisbot.replay.FakeDiscord`.
+
+Each webhook is timed until its response, and until its build is posted,
+or edited, in Discord.
+"""
+
+import asyncio
+import json
+
+from aiohttp import ClientSession, TCPConnector
+
+from .api import Client
+from .backoff import Backoff
+from .bot import Bot
+from .certificate import Certificate, make_executor
+from .conf import QUEUE_SIZE, VERIFY_WORKERS
+from .latency import Latency
+from .queue import NotificationQueue
+from .replay import FakeDiscord, start
+from .travis import Deliveries, keypair, notification, sign
+from .web import make_app
+
+HELLO = {"op": 10, "d": {"heartbeat_interval": 45000}}
+
+
+def _stats(latency):
+    """Return the latency statistics, with the 99th percentile."""
+    if not latency.count:
+        return None
+    return dict(latency.stats(), p99=latency.percentile(.99))
+
+
+async def load(count=1000, concurrency=10, builds=100, bits=2048,
+               executor="inline", workers=VERIFY_WORKERS,
+               queue_size=QUEUE_SIZE, dedupe=False, timeout=10, **kwargs):
+    """Post signed webhooks to the web application, until delivered.
+
+    :param count: Webhooks posted.
+    :param concurrency: Webhooks posted at once.
+    :param builds: Distinct builds, the webhooks going through them in
+                   turn, each one signed once beforehand.
+    :param bits: Size of the RSA key.
+    :param executor: Where the signatures are verified, see
+                     :func:`~travisbot.certificate.make_executor`.
+    :param dedupe: Skip the webhooks of a build already queued, as in
+                   production, so that only the first ones of each build
+                   are delivered.
+    :param timeout: Seconds to wait for the bot to deliver, once every
+                    webhook is posted.
+    :param kwargs: Options of the :class:`~travisbot.bot.Bot`, e.g. the
+                   ``batch_window``.
+    :return: the throughput and latencies, of the responses and of the
+             deliveries.
+    """
+    loop = asyncio.get_event_loop()
+    pkey, certificate = keypair(bits)
+
+    async def fetch():
+        return certificate
+
+    payloads = [json.dumps(notification(build)) for build in range(builds)]
+    signatures = [sign(pkey, payload) for payload in payloads]
+
+    discord = FakeDiscord()
+    discord_runner, discord_host = await start(discord.app)
+
+    queue = NotificationQueue(queue_size)
+    app = make_app(queue.put, certificate=Certificate(
+        fetch, executor=make_executor(executor, workers)),
+        dedupe=None if dedupe else False)
+    web_runner, web_host = await start(app)
+    url = "http://{}/notifications".format(web_host)
+
+    responses = Latency(count)
+    deliveries = Deliveries(count)
+    skipped = {"refused": 0, "duplicates": 0}
+
+    running = loop.create_future()
+    options = dict(state=False, chunk=False, backoff=Backoff(0, 0))
+    options.update(kwargs)
+    bot = Bot("ws://{}/gateway".format(discord_host), "token", queue.get,
+              running, client=Client("token", url="http://" + discord_host),
+              ack=deliveries.ack, **options)
+    bot_task = asyncio.ensure_future(bot.run())
+    ws = await discord.sockets.get()
+    await ws.send_str(json.dumps(HELLO))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(session, i):
+        build = i % builds
+        async with semaphore:
+            sent = deliveries.post(build)
+            async with session.post(url, data={"payload": payloads[build]},
+                                    headers={"Signature": signatures[build]}
+                                    ) as resp:
+                answer = await resp.json()
+            responses.add(loop.time() - sent)
+
+        if not answer["ok"] or answer.get("duplicate"):
+            if deliveries.skip(build, sent):
+                skipped["duplicates" if answer["ok"] else "refused"] += 1
+
+    started = loop.time()
+    async with ClientSession(connector=TCPConnector(
+            limit=concurrency)) as session:
+        await asyncio.gather(*(post(session, i) for i in range(count)))
+    flooded = loop.time() - started
+
+    deadline = loop.time() + timeout
+    while deliveries.latency.count + sum(skipped.values()) < count and \
+            loop.time() < deadline:
+        await asyncio.sleep(.01)
+    elapsed = loop.time() - started
+
+    running.set_result(None)
+    await bot_task
+    await web_runner.cleanup()
+    await discord_runner.cleanup()
+
+    return dict(skipped, **{
+        "requests": count,
+        "delivered": deliveries.latency.count,
+        "messages": len(discord.messages),
+        "edits": discord.edits,
+        "seconds": elapsed,
+        "requests_per_second": count / flooded,
+        "latency": _stats(responses),
+        "delivery_latency": _stats(deliveries.latency)
+    })
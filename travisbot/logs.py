@@ -0,0 +1,129 @@
+"""Logging as JSON lines, written by a background thread.
+
+The event loop only hands the records over to a queue, formatting and
+writing them is done by a :class:`logging.handlers.QueueListener`. The
+records given a ``sample`` key are sampled, e.g. for the frequent events.
+
+>>> record = logging.makeLogRecord({'msg': 'hello %s', 'args': ('world',),
+...                                 'name': 'travisbot', 'created': 0,
+...                                 'levelname': 'INFO', 'seq': 42})
+>>> JSONFormatter().format(record)
+'{"time": 0, "level": "INFO", "logger": "travisbot", \
+"message": "hello world", "seq": 42}'
+"""
+
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler as BaseQueueHandler
+from logging.handlers import QueueListener
+
+from .conf import LOG_QUEUE_SIZE, LOG_SAMPLE
+
+STANDARD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+"""Attributes of every record, the other ones are given as ``extra``."""
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record as a JSON object, on one line."""
+
+    def format(self, record):
+        """Return the JSON line, with the extra attributes of the record."""
+        line = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in STANDARD:
+                line[key] = value
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            line["exc"] = record.exc_text
+        return json.dumps(line, default=repr)
+
+
+class Sampler(logging.Filter):
+    """Keep one record out of ``rate`` sharing the same ``sample`` key.
+
+    The records kept get a ``count``, of the records of their key so far.
+    """
+
+    def __init__(self, rate=LOG_SAMPLE):
+        """Init the filter."""
+        super().__init__()
+        self.rate = rate
+        self.counts = {}
+
+    def filter(self, record):
+        """Tell whether the record is kept."""
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if (count - 1) % self.rate:
+            return False
+        record.count = count
+        return True
+
+
+class QueueHandler(BaseQueueHandler):
+    """Hand the records over to the background thread, or drop them."""
+
+    def __init__(self, queue):
+        """Init the handler."""
+        super().__init__(queue)
+        self.dropped = 0
+        """Records dropped, the queue being full."""
+
+    def prepare(self, record):
+        """Only merge the message, formatting is done in the thread."""
+        # The arguments may change meanwhile.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        """Queue the record, unless the writer is behind."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup(level=logging.INFO, stream=None, sample=LOG_SAMPLE, levels=None,
+          maxsize=LOG_QUEUE_SIZE):
+    """Log JSON lines to the stream, from a background thread.
+
+    :param level: Level of the root logger.
+    :param stream: Where to write, the standard error by default.
+    :param sample: Keep one record out of that many, of the sampled ones.
+    :param levels: Levels of other loggers, by name.
+    :param maxsize: Records waiting to be written, the next ones are
+                    dropped.
+    :return: the started :class:`~logging.handlers.QueueListener`, to stop
+             before exiting.
+    """
+    records = queue.Queue(maxsize)
+    handler = QueueHandler(records)
+    handler.addFilter(Sampler(sample))
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter())
+    listener = QueueListener(records, output)
+    listener.start()
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    for name, value in (levels or {}).items():
+        logging.getLogger(name).setLevel(value)
+    return listener
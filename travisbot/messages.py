@@ -0,0 +1,178 @@
+"""Discord messages of the builds, edited as their status changes.
+
+A message holds the embeds of a few builds, in one channel. The next
+notifications of a build edit its message, rather than posting a new one.
+
+The builds are indexed in a bounded LRU, optionally saved to a JSON file so
+that the messages are still edited after a restart.
+
+>>> index = MessageIndex(maxsize=2)
+>>> message = Message(1)
+>>> message.update(41, {'title': 'started'}, {})
+>>> message.update(42, {'title': 'started'}, {})
+>>> index.add(message)
+>>> index.get(1, 42) is message
+True
+>>> index.add(Message(1, builds=[43]))
+>>> index.get(1, 41) is None
+True
+"""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+
+from .conf import MESSAGES_SAVE_DELAY, MESSAGES_SIZE
+
+
+class Message:
+    """The embeds of a message, by build."""
+
+    __slots__ = ('channel', 'id', 'builds', 'embeds', 'notifications',
+                 'version', 'sent', 'queued')
+
+    def __init__(self, channel, id=None, builds=(), embeds=()):
+        """Init the message.
+
+        :param id: The Discord id, ``None`` until it is posted.
+        """
+        self.channel = channel
+        self.id = id
+        self.builds = list(builds)
+        self.embeds = list(embeds)
+
+        self.notifications = []
+        """Notifications not yet acknowledged."""
+
+        self.version = 0
+        self.sent = 0
+        """Version of the embeds, and the one last sent to Discord."""
+
+        self.queued = False
+        """Whether it is waiting in an outbox."""
+
+    @property
+    def dirty(self):
+        """Tell whether the embeds changed since they were sent."""
+        return self.version != self.sent
+
+    def update(self, build, embed, data):
+        """Replace the embed of the build, or add it."""
+        if build is not None and build in self.builds:
+            self.embeds[self.builds.index(build)] = embed
+        else:
+            self.builds.append(build)
+            self.embeds.append(embed)
+        self.notifications.append(data)
+        self.version += 1
+
+
+class MessageIndex:
+    """The message of each build, the least recently used forgotten."""
+
+    def __init__(self, maxsize=MESSAGES_SIZE, path=None,
+                 delay=MESSAGES_SAVE_DELAY, loop=None):
+        """Init the index.
+
+        :param maxsize: Builds remembered.
+        :param path: The JSON file keeping the messages, none when ``None``.
+        :param delay: Seconds to wait for more changes before saving.
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self.delay = delay
+        self.loop = loop
+
+        self.builds = OrderedDict()
+        """Messages by channel and build, the most recent last."""
+
+        self.saving = None
+        self.counters = dict.fromkeys(('hits', 'misses', 'evicted',
+                                       'saves'), 0)
+
+    def get(self, channel, build):
+        """Return the message of the build, ``None`` if unknown."""
+        key = (channel, build)
+        message = self.builds.get(key)
+        if message is None:
+            self.counters['misses'] += 1
+            return None
+        self.counters['hits'] += 1
+        self.builds.move_to_end(key)
+        return message
+
+    def add(self, message):
+        """Index the builds of the message, forgetting the oldest ones."""
+        for build in message.builds:
+            if build is not None:
+                self.builds[(message.channel, build)] = message
+                self.builds.move_to_end((message.channel, build))
+        while len(self.builds) > self.maxsize:
+            self.builds.popitem(last=False)
+            self.counters['evicted'] += 1
+
+    def messages(self):
+        """Return the posted messages, the least recently used first."""
+        messages = OrderedDict()
+        for message in self.builds.values():
+            if message.id is not None:
+                messages.pop(id(message), None)
+                messages[id(message)] = message
+        return list(messages.values())
+
+    def open(self):
+        """Load the saved messages, if any."""
+        if self.path is None:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        for entry in saved:
+            message = Message(entry["channel"], entry["id"], entry["builds"],
+                              entry["embeds"])
+            self.add(message)
+
+    def changed(self):
+        """Save the messages soon, once the changes settle."""
+        if self.path is None:
+            return
+        if self.saving is None or self.saving.done():
+            self.saving = asyncio.ensure_future(self._save())
+
+    async def _save(self):
+        """Save the messages, in a worker thread."""
+        await asyncio.sleep(self.delay)
+        loop = self.loop or asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._write, self._dump())
+
+    def _dump(self):
+        """Return the messages, as saved."""
+        return [{
+            "channel": message.channel,
+            "id": message.id,
+            "builds": list(message.builds),
+            "embeds": list(message.embeds)
+        } for message in self.messages()]
+
+    def _write(self, saved):
+        """Replace the file, at once."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(saved, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self.counters['saves'] += 1
+
+    def close(self):
+        """Save the messages, right away."""
+        if self.saving is not None:
+            self.saving.cancel()
+            self.saving = None
+        if self.path is not None:
+            self._write(self._dump())
+
+    def stats(self):
+        """Return the state of the index."""
+        return dict(self.counters, builds=len(self.builds))
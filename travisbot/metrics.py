@@ -0,0 +1,222 @@
+"""Counters and histograms, exposed in the Prometheus text format.
+
+Recording is a dictionary lookup and an addition, cheap enough for the
+hot paths. The metrics of the bot are module level, in :data:`REGISTRY`.
+
+>>> registry = Registry()
+>>> calls = registry.counter('calls_total', 'Calls.', ('route',))
+>>> calls.inc('/gateway')
+>>> print(registry.render(), end='')
+# HELP calls_total Calls.
+# TYPE calls_total counter
+calls_total{route="/gateway"} 1
+"""
+
+import re
+from bisect import bisect_left
+
+BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+"""Upper bounds of the histogram buckets, in seconds."""
+
+IDS = re.compile(r"/\d+")
+
+
+def route_label(route):
+    """Return the route, without any ids, to keep the labels few.
+
+    >>> route_label('POST /channels/42/messages')
+    'POST /channels/:id/messages'
+    """
+    return IDS.sub("/:id", route)
+
+
+def _labels(names, values):
+    """Format the labels of a sample."""
+    if not names:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", r"\\")
+                         .replace('"', r'\"').replace("\n", r"\n"))
+        for name, value in zip(names, values)) + "}"
+
+
+def _number(value):
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value)
+
+
+class Counter:
+    """A value only going up, by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        """Init the counter.
+
+        :param labels: Names of the labels, given in that order to
+                       :meth:`inc`.
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, value=1):
+        """Increment the counter of the given label values."""
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def get(self, *labels):
+        """Return the value of the given label values."""
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        """Yield the lines of the counter."""
+        for labels, value in sorted(self.values.items()):
+            yield self.name, _labels(self.labels, labels), value
+
+
+class Histogram:
+    """Counts of the observed values, by bucket and labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        """Init the histogram.
+
+        :param buckets: Upper bounds of the buckets, sorted.
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        """Counts by bucket, the sum and the count, by labels."""
+
+    def observe(self, value, *labels):
+        """Count the value, for the given label values."""
+        counts = self.values.get(labels)
+        if counts is None:
+            # One count per bucket, +Inf, then the sum.
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def count(self, *labels):
+        """Return the number of values observed."""
+        counts = self.values.get(labels)
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self):
+        """Yield the lines of the histogram, the buckets being cumulative."""
+        for labels, counts in sorted(self.values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                yield (self.name + "_bucket",
+                       _labels(self.labels + ("le",), labels + (
+                           _number(bound),)), total)
+            yield self.name + "_sum", _labels(self.labels, labels), \
+                counts[-1]
+            yield self.name + "_count", _labels(self.labels, labels), total
+
+
+class Gauge:
+    """A value read when collected, e.g. the depth of the queue."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, collect):
+        """Init the gauge.
+
+        :param collect: Callable returning the value.
+        """
+        self.name = name
+        self.help = help
+        self.collect = collect
+
+    def samples(self):
+        """Yield the line of the gauge."""
+        yield self.name, "", self.collect()
+
+
+class Registry:
+    """The metrics to expose."""
+
+    def __init__(self):
+        """Init an empty registry."""
+        self.metrics = {}
+
+    def _add(self, metric):
+        """Register the metric, replacing any of the same name."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        """Create a :class:`Counter`."""
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS):
+        """Create a :class:`Histogram`."""
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, collect):
+        """Create a :class:`Gauge`."""
+        return self._add(Gauge(name, help, collect))
+
+    def render(self):
+        """Return the metrics, in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append("# HELP {} {}".format(metric.name, metric.help))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append("{}{} {}".format(name, labels, _number(value)))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+WEBHOOKS = REGISTRY.counter(
+    "travisbot_webhooks_total",
+    "Webhooks received, by result: verified, duplicate, rejected, invalid "
+    "or full.", ("result",))
+VERIFY_SECONDS = REGISTRY.histogram(
+    "travisbot_verify_seconds", "Time to verify a webhook signature.")
+
+REST_SECONDS = REGISTRY.histogram(
+    "travisbot_rest_seconds", "Duration of the REST calls, by route.",
+    ("route",))
+REST_RESPONSES = REGISTRY.counter(
+    "travisbot_rest_responses_total",
+    "Responses of the REST calls, by route and status.",
+    ("route", "status"))
+REST_SAVED = REGISTRY.counter(
+    "travisbot_rest_saved_total",
+    "REST calls not made, by reason: duplicate or coalesced.", ("reason",))
+RATELIMIT_WAITS = REGISTRY.counter(
+    "travisbot_ratelimit_waits_total",
+    "REST calls held back by a rate limit.")
+RATELIMIT_SECONDS = REGISTRY.counter(
+    "travisbot_ratelimit_wait_seconds_total",
+    "Time spent waiting for the rate limits.")
+
+GATEWAY_EVENTS = REGISTRY.counter(
+    "travisbot_gateway_events_total",
+    "Dispatches received from the gateway, by type.", ("type",))
+DECODE_SECONDS = REGISTRY.histogram(
+    "travisbot_gateway_decode_seconds", "Time to decode a gateway payload.",
+    buckets=(.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025,
+             .005, .01, .025, .05))
+HEARTBEAT_SECONDS = REGISTRY.histogram(
+    "travisbot_gateway_heartbeat_seconds",
+    "Round-trip time of the heartbeats.")
+RECONNECTS = REGISTRY.counter(
+    "travisbot_gateway_reconnects_total",
+    "Connections to the gateway lost, then opened again.")
+ZOMBIES = REGISTRY.counter(
+    "travisbot_gateway_zombies_total",
+    "Connections closed for not acknowledging a heartbeat.")
@@ -0,0 +1,163 @@
+"""Bounded queue of notifications between the web server and the bot."""
+
+import asyncio
+from collections import OrderedDict, deque
+
+from .conf import QUEUE_POLICY, QUEUE_SIZE
+
+REJECT = "reject"
+"""Refuse new notifications when full."""
+
+DROP_OLDEST = "drop-oldest"
+"""Make room by dropping the oldest notification."""
+
+COALESCE = "coalesce"
+"""Replace a queued notification of the same build, reject otherwise."""
+
+POLICIES = (REJECT, DROP_OLDEST, COALESCE)
+
+
+class QueueFull(Exception):
+    """The notification cannot be queued."""
+
+
+class Entry:
+    """A queued notification."""
+
+    __slots__ = ('data', 'time')
+
+    def __init__(self, data, time):
+        """Init the entry."""
+        self.data = data
+        self.time = time
+
+
+class NotificationQueue:
+    """A bounded FIFO queue with a policy when it is full.
+
+    The ``put`` and ``get`` methods are the ones given to
+    :func:`~travisbot.web.make_app` and :class:`~travisbot.bot.Bot`.
+    """
+
+    def __init__(self, maxsize=QUEUE_SIZE, policy=QUEUE_POLICY, loop=None,
+                 on_drop=None):
+        """Init the queue.
+
+        :param maxsize: Capacity of the queue.
+        :param policy: One of :data:`REJECT`, :data:`DROP_OLDEST` or
+                       :data:`COALESCE`.
+        :param on_drop: Called with the notifications dropped to make room,
+                        e.g. :meth:`~travisbot.spool.Spool.drop`.
+        """
+        if policy not in POLICIES:
+            raise ValueError("unknown policy {!r}".format(policy))
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.loop = loop or asyncio.get_event_loop()
+        self.on_drop = on_drop
+
+        self.entries = deque()
+        self.builds = OrderedDict()
+        """Queued entries by build id, for :data:`COALESCE`."""
+
+        self.getters = deque()
+
+        self.counters = dict.fromkeys(
+            ('put', 'get', 'rejected', 'dropped', 'coalesced'), 0)
+
+        self.wait_total = 0
+        self.wait_max = 0
+        """Time spent in the queue, in seconds."""
+
+    def qsize(self):
+        """Return the number of queued notifications."""
+        return len(self.entries)
+
+    def full(self):
+        """Tell whether the queue reached its capacity."""
+        return len(self.entries) >= self.maxsize
+
+    async def put(self, data):
+        """Queue the notification without ever waiting.
+
+        :raises QueueFull: when the notification is refused.
+        """
+        self.put_nowait(data)
+
+    def put_nowait(self, data):
+        """Queue the notification.
+
+        :raises QueueFull: when the notification is refused.
+        """
+        build = data.get('id')
+        if self.policy == COALESCE and build in self.builds:
+            self.builds[build].data = data
+            self.counters['coalesced'] += 1
+            return
+
+        if self.full():
+            if self.policy != DROP_OLDEST:
+                self.counters['rejected'] += 1
+                raise QueueFull(self.maxsize)
+            dropped = self._pop()
+            self.counters['dropped'] += 1
+            if self.on_drop is not None:
+                self.on_drop(dropped.data)
+
+        entry = Entry(data, self.loop.time())
+        self.entries.append(entry)
+        if self.policy == COALESCE and build is not None:
+            self.builds[build] = entry
+        self.counters['put'] += 1
+        self._wakeup()
+
+    async def get(self):
+        """Remove and return the oldest notification, waiting for one."""
+        while not self.entries:
+            getter = self.loop.create_future()
+            self.getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                # Pass the wake up along if we were given one.
+                if self.entries and not getter.cancelled():
+                    self._wakeup()
+                raise
+
+        entry = self._pop()
+        wait = self.loop.time() - entry.time
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.counters['get'] += 1
+        return entry.data
+
+    def _wakeup(self):
+        """Wake up the next reader waiting."""
+        while self.getters:
+            getter = self.getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                break
+
+    def _pop(self):
+        """Remove the oldest entry."""
+        entry = self.entries.popleft()
+        build = entry.data.get('id')
+        if self.builds.get(build) is entry:
+            del self.builds[build]
+        return entry
+
+    def stats(self):
+        """Return the depth, wait times and counters of the queue."""
+        stats = {
+            'size': self.qsize(),
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'wait_max': self.wait_max,
+            'wait_mean': (self.wait_total / self.counters['get']
+                          if self.counters['get'] else 0)
+        }
+        stats.update(self.counters)
+        return stats
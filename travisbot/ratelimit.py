@@ -0,0 +1,146 @@
+"""Discord REST API rate limits.
+
+Discord answers every call with ``X-RateLimit-*`` headers describing the
+bucket of the route, requests are kept behind an exhausted bucket (or the
+global limit) rather than failing with a ``429 Too Many Requests``.
+"""
+
+import asyncio
+import re
+import time
+
+from .metrics import RATELIMIT_SECONDS, RATELIMIT_WAITS
+
+MAJOR_PARAMETERS = re.compile(
+    r"^/(channels|guilds|webhooks)/(\d+)")
+"""Leading parameters getting their own bucket per value."""
+
+MINOR_PARAMETERS = re.compile(r"/\d+")
+"""Any other identifier is shared by the bucket."""
+
+
+def route(method, path):
+    """Return the bucket key of a REST call.
+
+    >>> route("POST", "/channels/42/messages")
+    'POST /channels/42/messages'
+    >>> route("PATCH", "/channels/42/messages/1337")
+    'PATCH /channels/42/messages/:id'
+    """
+    path = path.split("?", 1)[0]
+    match = MAJOR_PARAMETERS.match(path)
+    head = match.group(0) if match else ""
+    tail = MINOR_PARAMETERS.sub("/:id", path[len(head):])
+    return "{} {}{}".format(method.upper(), head, tail)
+
+
+def retry_after(headers, body=None):
+    """Return the seconds to wait after a 429 response.
+
+    >>> retry_after({"Retry-After": "2"})
+    2.0
+    >>> retry_after({}, {"retry_after": 1500})
+    1.5
+    """
+    if body and "retry_after" in body:
+        # API v6 gives milliseconds in the body.
+        return body["retry_after"] / 1000
+    return float(headers.get("Retry-After", 1))
+
+
+class Bucket:
+    """A rate limit bucket, used as an asynchronous context manager.
+
+    Requests sharing a bucket are serialized so the remaining count given
+    by the previous response is known before sending the next one.
+    """
+
+    def __init__(self, limiter):
+        """Init the bucket.
+
+        :param limiter: The owning :class:`RateLimiter`
+        """
+        self.limiter = limiter
+        self.lock = asyncio.Lock()
+
+        self.remaining = None
+        """Calls left before the reset, ``None`` when unknown."""
+
+        self.reset = 0
+        """Loop time when the bucket is refilled."""
+
+    async def __aenter__(self):
+        """Wait for the global limit and the bucket to allow a call."""
+        await self.lock.acquire()
+        try:
+            await self.limiter.wait()
+            delay = self.reset - self.limiter.loop.time()
+            if self.remaining == 0 and delay > 0:
+                await self.limiter.sleep(delay)
+                self.remaining = None
+        except BaseException:
+            self.lock.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Let the next call in."""
+        self.lock.release()
+
+    def update(self, headers):
+        """Update the bucket from the ``X-RateLimit-*`` response headers."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None:
+            self.remaining = int(remaining)
+
+        now = self.limiter.loop.time()
+        if "X-RateLimit-Reset-After" in headers:
+            self.reset = now + float(headers["X-RateLimit-Reset-After"])
+        elif "X-RateLimit-Reset" in headers:
+            reset = float(headers["X-RateLimit-Reset"])
+            self.reset = now + reset - time.time()
+
+    def block(self, delay):
+        """Empty the bucket for ``delay`` seconds, after a 429."""
+        self.remaining = 0
+        self.reset = self.limiter.loop.time() + delay
+
+
+class RateLimiter:
+    """Per route buckets, plus the global rate limit."""
+
+    def __init__(self, loop=None):
+        """Init the rate limiter."""
+        self.loop = loop or asyncio.get_event_loop()
+        self.buckets = {}
+
+        self.global_reset = 0
+        """Loop time when the global rate limit is lifted."""
+
+        self.waited = 0
+        """Total seconds spent waiting behind a rate limit."""
+
+    def bucket(self, method, path):
+        """Return the bucket for the given route."""
+        key = route(method, path)
+        if key not in self.buckets:
+            self.buckets[key] = Bucket(self)
+        return self.buckets[key]
+
+    def block(self, delay):
+        """Hold every call for ``delay`` seconds, after a global 429."""
+        self.global_reset = max(self.global_reset, self.loop.time() + delay)
+
+    async def wait(self):
+        """Wait until the global rate limit is lifted."""
+        delay = self.global_reset - self.loop.time()
+        while delay > 0:
+            await self.sleep(delay)
+            delay = self.global_reset - self.loop.time()
+
+    async def sleep(self, delay):
+        """Sleep for ``delay`` seconds, keeping track of it."""
+        self.waited += delay
+        RATELIMIT_WAITS.inc()
+        RATELIMIT_SECONDS.inc(value=delay)
+        await asyncio.sleep(delay)
@@ -0,0 +1,82 @@
+"""Capture of the gateway frames and webhooks, for offline replays.
+
+Each frame is appended as a JSON line: the seconds since the recording
+started, its kind and its data, the binary frames being base64 encoded.
+A ``connect`` line, holding the gateway URL, starts each connection.
+
+>>> import io
+>>> recorder = Recorder(io.StringIO(), clock=lambda: 1.5)
+>>> recorder.record(BINARY, b'hi')
+>>> print(recorder.file.getvalue(), end='')
+{"time": 0.0, "kind": "binary", "data": "aGk="}
+>>> list(read(io.StringIO(recorder.file.getvalue())))
+[(0.0, 'binary', b'hi')]
+"""
+
+import base64
+import json
+import time
+
+CONNECT = "connect"
+"""A new gateway connection, the data being its URL."""
+
+TEXT = "text"
+"""A text frame received from the gateway."""
+
+BINARY = "binary"
+"""A binary frame received from the gateway, compressed or ETF."""
+
+WEBHOOK = "webhook"
+"""The payload of a Travis webhook."""
+
+
+class Recorder:
+    """Append the frames to a capture file."""
+
+    def __init__(self, file, clock=time.monotonic):
+        """Init the recorder.
+
+        :param file: Path of the capture, or a file opened for writing.
+        :param clock: Returns the time, in seconds.
+        """
+        if isinstance(file, str):
+            file = open(file, "a", encoding="utf-8")
+        self.file = file
+        self.clock = clock
+        self.start = clock()
+        self.count = 0
+        """Frames recorded."""
+
+    def record(self, kind, data):
+        """Append a frame."""
+        if isinstance(data, bytes):
+            data = base64.b64encode(data).decode("ascii")
+        self.file.write(json.dumps({
+            "time": round(self.clock() - self.start, 6),
+            "kind": kind,
+            "data": data
+        }) + "\n")
+        self.count += 1
+
+    def close(self):
+        """Close the capture file."""
+        self.file.close()
+
+
+def read(file):
+    """Yield the ``(time, kind, data)`` of the captured frames.
+
+    :param file: Path of the capture, or a file opened for reading.
+    """
+    if isinstance(file, str):
+        with open(file, encoding="utf-8") as f:
+            yield from read(f)
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        frame = json.loads(line)
+        data = frame["data"]
+        if frame["kind"] == BINARY:
+            data = base64.b64decode(data)
+        yield frame["time"], frame["kind"], data
@@ -0,0 +1,257 @@
+"""Replay a capture against a real bot, on localhost.
+
+A :class:`FakeDiscord` serves the gateway and the REST API: the gateway
+sends the captured frames, at the captured pace or faster, closing the
+connection where a new one was captured. The captured webhooks are signed
+again with a :mod:`~travisbot.travis` key, then posted to the webhook
+server.
+
+Each payload is timed from its frame being sent to the bot having handled
+it, a frame holding one payload as Discord sends them.
+"""
+
+import asyncio
+import json
+import time
+import tracemalloc
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from aiohttp import ClientSession, web
+
+from .api import Client
+from .backoff import Backoff
+from .bot import Bot
+from .certificate import Certificate
+from .latency import Latency
+from .recorder import BINARY, CONNECT, WEBHOOK
+from .travis import Deliveries, keypair, sign
+from .web import make_app
+
+
+async def start(app, host="127.0.0.1"):
+    """Serve the application on a free port, return the runner and URL."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, "{}:{}".format(host, port)
+
+
+class FakeDiscord:
+    """A local gateway and REST API, the gateway sending what it is told."""
+
+    def __init__(self):
+        """Init the application."""
+        self.app = web.Application()
+        self.app.router.add_get("/gateway/bot", self.gateway_bot)
+        self.app.router.add_get("/gateway", self.gateway)
+        self.app.router.add_get("/channels/{id}", self.channel)
+        self.app.router.add_post("/channels/{id}/messages", self.message)
+        self.app.router.add_patch("/channels/{id}/messages/{message}",
+                                  self.edit)
+
+        self.sockets = asyncio.Queue()
+        """Gateway connections, as they are opened."""
+
+        self.sent = deque()
+        """Loop time of the frames sent, not yet handled."""
+
+        self.received = 0
+        """Frames sent by the bot, e.g. identify and heartbeats."""
+
+        self.messages = []
+        """Messages posted by the bot."""
+
+        self.edits = 0
+        """Messages edited by the bot."""
+
+    async def gateway_bot(self, request):
+        """Return the gateway URL, for one shard."""
+        return web.json_response({
+            "url": "ws://{}/gateway".format(request.host),
+            "shards": 1,
+            "session_start_limit": {"max_concurrency": 1}
+        })
+
+    async def gateway(self, request):
+        """Hand the connection over, then read it until it is closed."""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await self.sockets.put(ws)
+        async for msg in ws:
+            self.received += 1
+        return ws
+
+    async def channel(self, request):
+        """Return a channel, outside of any guild."""
+        return web.json_response({"id": request.match_info["id"]})
+
+    async def message(self, request):
+        """Pretend to create a message."""
+        self.messages.append(await request.json())
+        return web.json_response({"id": str(len(self.messages))})
+
+    async def edit(self, request):
+        """Pretend to edit a message."""
+        message = int(request.match_info["message"])
+        self.messages[message - 1] = await request.json()
+        self.edits += 1
+        return web.json_response({"id": str(message)})
+
+    async def send(self, ws, kind, data):
+        """Send a captured frame, timing it."""
+        self.sent.append(asyncio.get_event_loop().time())
+        if kind == BINARY:
+            await ws.send_bytes(data)
+        else:
+            await ws.send_str(data)
+
+
+def options(url):
+    """Return the options of the bot, from a captured gateway URL.
+
+    >>> sorted(options('wss://gateway.discord.gg/?v=6&encoding=etf').items())
+    [('compress', None), ('encoding', 'etf')]
+    """
+    query = parse_qs(urlsplit(url or "").query)
+    return {
+        "encoding": query.get("encoding", ["json"])[0],
+        "compress": query.get("compress", [None])[0]
+    }
+
+
+def _build(payload):
+    """Return the build id of a notification payload."""
+    try:
+        return json.loads(payload).get("id")
+    except (ValueError, AttributeError):
+        return None
+
+
+async def replay(frames, speed=None, memory=False, timeout=10, **kwargs):
+    """Drive a bot through the captured frames.
+
+    :param frames: The ``(time, kind, data)`` of the capture, see
+                   :func:`~travisbot.recorder.read`.
+    :param speed: How many times faster than captured, as fast as possible
+                  when ``None``.
+    :param memory: Trace the peak memory, slowing the replay down.
+    :param timeout: Seconds to wait for the bot to catch up, once every
+                    frame is sent.
+    :param kwargs: Options of the :class:`~travisbot.bot.Bot`, the
+                   encoding and compression being the captured ones.
+    :return: the throughput, latencies, CPU time and peak memory, the
+             webhooks skipped as duplicates being counted apart.
+    """
+    loop = asyncio.get_event_loop()
+    frames = list(frames)
+    if not frames or frames[0][1] != CONNECT:
+        frames.insert(0, (0, CONNECT, None))
+    webhooks = sum(1 for _, kind, _ in frames if kind == WEBHOOK)
+
+    discord = FakeDiscord()
+    discord_runner, discord_host = await start(discord.app)
+
+    pkey, certificate = keypair()
+
+    async def fetch():
+        return certificate
+
+    queue = asyncio.Queue()
+    app = make_app(queue.put, certificate=Certificate(fetch))
+    web_runner, web_host = await start(app)
+
+    events = Latency(len(frames))
+    deliveries = Deliveries(webhooks or 1)
+    duplicates = 0
+
+    running = loop.create_future()
+    bot_options = dict(options(frames[0][2]), backoff=Backoff(0, 0))
+    bot_options.update(kwargs)
+    bot = Bot("ws://{}/gateway".format(discord_host), "token", queue.get,
+              running, client=Client("token", url="http://" + discord_host),
+              ack=deliveries.ack, **bot_options)
+
+    handle = bot._handle
+
+    async def timed(data):
+        await handle(data)
+        events.add(loop.time() - discord.sent.popleft())
+        # The captured READY points the resumes at Discord.
+        bot.resume_url = None
+
+    bot._handle = timed
+
+    async def post(session, payload):
+        nonlocal duplicates
+        build = _build(payload)
+        signature = sign(pkey, payload)
+        sent = deliveries.post(build)
+        async with session.post("http://{}/notifications".format(web_host),
+                                data={"payload": payload},
+                                headers={"Signature": signature}) as resp:
+            if (await resp.json()).get("duplicate"):
+                if deliveries.skip(build, sent):
+                    duplicates += 1
+
+    if memory:
+        tracemalloc.start()
+    cpu = time.process_time()
+    started = loop.time()
+    bot_task = asyncio.ensure_future(bot.run())
+
+    ws = None
+    posts = []
+    async with ClientSession() as session:
+        for offset, kind, data in frames:
+            if speed:
+                delay = started + offset / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if kind == WEBHOOK:
+                posts.append(asyncio.ensure_future(post(session, data)))
+                continue
+            if kind == CONNECT and ws is not None and not ws.closed:
+                # Not a normal closure, the bot resumes.
+                await ws.close(code=4000)
+            if kind == CONNECT or ws.closed:
+                ws = await discord.sockets.get()
+            if kind != CONNECT:
+                await discord.send(ws, kind, data)
+
+        await asyncio.gather(*posts)
+        deadline = loop.time() + timeout
+        while (discord.sent or
+               deliveries.latency.count + duplicates < webhooks) and \
+                loop.time() < deadline:
+            await asyncio.sleep(.01)
+
+    elapsed = loop.time() - started
+    cpu = time.process_time() - cpu
+    peak = None
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    running.set_result(None)
+    await bot_task
+    await web_runner.cleanup()
+    await discord_runner.cleanup()
+
+    return {
+        "events": events.count,
+        "lost": len(discord.sent),
+        "webhooks": deliveries.latency.count,
+        "duplicates": duplicates,
+        "messages": len(discord.messages),
+        "edits": discord.edits,
+        "seconds": elapsed,
+        "events_per_second": events.count / elapsed,
+        "latency": dict(events.stats(), p99=events.percentile(.99)),
+        "webhook_latency": (deliveries.latency.stats() if webhooks
+                            else None),
+        "cpu_seconds": cpu,
+        "peak_memory": peak
+    }
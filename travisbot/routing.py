@@ -0,0 +1,299 @@
+"""Routing of the notifications to channels, by repository.
+
+The routes are read from a JSON file, the first one matching a notification
+gives its channel, the ``default`` one otherwise::
+
+    {
+        "default": "309734242085109760",
+        "routes": [
+            {"repository": "greut/travisbot", "channel": "1"},
+            {"repository": "acme/*", "branch": "master",
+             "status": ["Broken", "Failed", "Still Failing"],
+             "channel": "2"}
+        ]
+    }
+
+The patterns are shell-style, case insensitive, a list meaning any of them.
+The routes are indexed by owner and repository, the ones of a repository
+are only looked up once, then its notifications only check the branch and
+status of its few routes.
+
+>>> table = Table([{'repository': 'acme/*', 'status': 'fail*', 'channel': 2}],
+...               default=1)
+>>> table.route({'repository': {'owner_name': 'Acme', 'name': 'web'},
+...              'status_message': 'Failed'})
+2
+>>> table.route({'repository': {'owner_name': 'acme', 'name': 'web'},
+...              'status_message': 'Passed'})
+1
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from collections import deque
+from fnmatch import translate
+
+from .backoff import Backoff
+from .conf import CHANNEL_ID, CHANNEL_QUEUE_SIZE, ROUTES_INTERVAL
+from .metrics import REST_SAVED
+
+log = logging.getLogger(__name__)
+
+WILDCARDS = re.compile(r"[*?[]")
+
+
+def matcher(patterns):
+    """Compile the patterns, ``None`` matching anything.
+
+    >>> matcher(['fail*', 'broken'])('failed') is not None
+    True
+    >>> matcher('*') is None
+    True
+    """
+    if patterns is None:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if "*" in patterns:
+        return None
+    return re.compile("|".join(
+        "(?:{})".format(translate(pattern.lower())) for pattern in patterns
+    )).match
+
+
+def exact(pattern):
+    """Return the pattern, lowered, unless it has wildcards."""
+    if isinstance(pattern, str) and not WILDCARDS.search(pattern):
+        return pattern.lower()
+    return None
+
+
+class Rule:
+    """A route, its patterns compiled."""
+
+    __slots__ = ('position', 'owner', 'repo', 'branch', 'status', 'channel')
+
+    def __init__(self, position, route):
+        """Init the rule from its position and the route of the file."""
+        owner, _, repo = route.get("repository", "*/*").partition("/")
+        self.position = position
+        self.owner = owner
+        self.repo = repo or "*"
+        self.branch = matcher(route.get("branch"))
+        self.status = matcher(route.get("status"))
+        self.channel = int(route["channel"])
+
+    def matches(self, branch, status):
+        """Tell whether the branch and status match, the repository does."""
+        return (self.branch is None or self.branch(branch)) and \
+            (self.status is None or self.status(status))
+
+
+class Table:
+    """The routes, indexed by owner and repository."""
+
+    def __init__(self, routes, default=None):
+        """Init the table.
+
+        :param routes: The routes, as in the file.
+        :param default: The channel of the notifications matching no route,
+                        they are dropped when ``None``.
+        """
+        self.default = int(default) if default is not None else None
+        self.rules = [Rule(i, route) for i, route in enumerate(routes)]
+
+        self.repositories = {}
+        """Rules of an exact owner and repository."""
+
+        self.owners = {}
+        """Rules of an exact owner, any of its repositories."""
+
+        self.others = []
+        """Rules matching many owners."""
+
+        for rule in self.rules:
+            owner, repo = exact(rule.owner), exact(rule.repo)
+            if owner is not None and repo is not None:
+                self.repositories.setdefault((owner, repo), []).append(rule)
+            elif owner is not None:
+                rule.repo = matcher(rule.repo)
+                self.owners.setdefault(owner, []).append(rule)
+            else:
+                rule.owner = matcher(rule.owner)
+                rule.repo = matcher(rule.repo)
+                self.others.append(rule)
+
+        self.candidates = {}
+        """Rules of each repository seen, in the order of the file."""
+
+    def __len__(self):
+        """Return the number of routes."""
+        return len(self.rules)
+
+    def _candidates(self, owner, repo):
+        """Return the rules matching the owner and repository."""
+        rules = list(self.repositories.get((owner, repo), ()))
+        rules.extend(rule for rule in self.owners.get(owner, ())
+                     if rule.repo is None or rule.repo(repo))
+        rules.extend(rule for rule in self.others
+                     if (rule.owner is None or rule.owner(owner)) and
+                     (rule.repo is None or rule.repo(repo)))
+        rules.sort(key=lambda rule: rule.position)
+        return rules
+
+    def route(self, data):
+        """Return the channel of the notification, ``None`` for none."""
+        repository = data.get("repository") or {}
+        key = (str(repository.get("owner_name", "")).lower(),
+               str(repository.get("name", "")).lower())
+        rules = self.candidates.get(key)
+        if rules is None:
+            rules = self.candidates[key] = self._candidates(*key)
+
+        if rules:
+            branch = str(data.get("branch") or "").lower()
+            status = str(data.get("status_message") or "").lower()
+            for rule in rules:
+                if rule.matches(branch, status):
+                    return rule.channel
+        return self.default
+
+
+class Router:
+    """The routing table of a file, reloaded when it changes."""
+
+    def __init__(self, path=None, default=CHANNEL_ID,
+                 interval=ROUTES_INTERVAL):
+        """Init the router.
+
+        :param path: The JSON file of the routes, none when ``None``.
+        :param default: The channel when the file does not give one.
+        :param interval: Seconds between two checks of the file.
+        """
+        self.path = path
+        self.default = default
+        self.interval = interval
+
+        self.table = Table([], default)
+        """The current routes."""
+
+        self.mtime = None
+        """Modification time of the file loaded."""
+
+        self.counters = dict.fromkeys(('reloads', 'errors', 'dropped'), 0)
+
+        if path is not None:
+            self.reload()
+
+    def route(self, data):
+        """Return the channel of the notification, ``None`` to drop it."""
+        channel = self.table.route(data)
+        if channel is None:
+            self.counters['dropped'] += 1
+        return channel
+
+    def reload(self):
+        """Load the file again, keeping the current routes if it is invalid.
+
+        :return: whether the routes were replaced.
+        """
+        try:
+            self.mtime = os.stat(self.path).st_mtime
+            with open(self.path, encoding="utf-8") as f:
+                config = json.load(f)
+            table = Table(config.get("routes", []),
+                          config.get("default", self.default))
+        except (OSError, ValueError, KeyError, TypeError,
+                AttributeError) as e:
+            self.counters['errors'] += 1
+            log.error("cannot load the routes of %s: %r", self.path, e)
+            return False
+
+        # Swapped at once, the notifications being routed see either.
+        self.table = table
+        self.counters['reloads'] += 1
+        log.info("%d routes loaded from %s", len(table), self.path)
+        return True
+
+    async def watch(self):
+        """Reload the file whenever it changes, until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                continue
+            if mtime != self.mtime:
+                self.reload()
+
+    def stats(self):
+        """Return the state of the routes."""
+        return dict(self.counters, routes=len(self.table),
+                    default=self.table.default)
+
+
+class Outbox:
+    """The messages waiting for one channel, sent in order.
+
+    Each channel has its own, a channel being throttled only holds its own
+    messages back, until its outbox is full. A message changed while
+    waiting is only sent once, in its latest state.
+    """
+
+    def __init__(self, channel, maxsize=CHANNEL_QUEUE_SIZE):
+        """Init the outbox.
+
+        :param maxsize: Messages waiting, above which the notifications are
+                        no longer read, see :meth:`wait`.
+        """
+        self.channel = channel
+        self.maxsize = maxsize
+        self.messages = deque()
+        """The :class:`~travisbot.messages.Message` to post, or edit."""
+
+        self.task = None
+        """The task sending the messages, while there are some."""
+
+        self.backoff = Backoff()
+        """Delays between the attempts, while the channel cannot be
+        reached."""
+
+        self.room = asyncio.Event()
+        self.room.set()
+        """Set while the outbox is not full."""
+
+        self.counters = dict.fromkeys(('sent', 'coalesced', 'errors'), 0)
+
+    def full(self):
+        """Tell whether the outbox reached its capacity."""
+        return len(self.messages) >= self.maxsize
+
+    def put(self, message):
+        """Queue a message, even when full, see :meth:`wait`."""
+        if message.queued:
+            self.counters['coalesced'] += 1
+            REST_SAVED.inc('coalesced')
+            return
+        message.queued = True
+        self.messages.append(message)
+        if self.full():
+            self.room.clear()
+
+    def get(self):
+        """Return the next message to send."""
+        message = self.messages.popleft()
+        message.queued = False
+        if not self.full():
+            self.room.set()
+        return message
+
+    async def wait(self):
+        """Wait for the outbox to have room."""
+        await self.room.wait()
+
+    def stats(self):
+        """Return the state of the outbox."""
+        return dict(self.counters, waiting=len(self.messages))
@@ -0,0 +1,420 @@
+"""Automatic sharding of the gateway connection, across processes.
+
+The :class:`ShardManager` lives next to the webhook server. It asks
+``/gateway/bot`` how many shards are needed, runs them in a process pool,
+lets them identify at the allowed pace and hands each notification over to
+the shard of the guild owning its channel, given by the routes.
+
+The shards and the manager talk over queues of ``(kind, data)`` messages:
+one inbox per shard, one outbox shared by them.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aiohttp import ClientError
+
+from .api import APIError, Client
+from .bot import Bot
+from .conf import CHANNEL_ID, IDENTIFY_DELAY, URL
+from .messages import MessageIndex
+from .routing import Router
+
+log = logging.getLogger(__name__)
+
+NOTIFY = "notify"
+"""A notification, to the shard."""
+
+IDENTIFY = "identify"
+"""A shard asking to identify, or the manager allowing it."""
+
+READY = "ready"
+"""A shard connected."""
+
+ACK = "ack"
+"""A notification delivered, to the manager."""
+
+STOP = "stop"
+"""The shard, or the manager, is stopping."""
+
+CRASHED = "crashed"
+"""A shard stopped on its own, e.g. its token being refused."""
+
+
+class ShardCrashed(Exception):
+    """A shard, or the routing to them, stopped on its own.
+
+    The manager stops the other shards.
+    """
+
+
+def shard_id(guild_id, count):
+    """Return the shard receiving the events of a guild.
+
+    >>> shard_id('41771983423143937', 4)
+    2
+    """
+    return (int(guild_id) >> 22) % count
+
+
+def run_shards(url, token, count, inboxes, outbox, kwargs):
+    """Run some shards until they are stopped, in a worker process.
+
+    :param inboxes: Queues of the shards to run, by shard id.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(
+            _run_shards(url, token, count, inboxes, outbox, kwargs))
+    finally:
+        loop.close()
+
+
+async def _run_shards(url, token, count, inboxes, outbox, kwargs):
+    """Run the shards, each one reading its inbox in a thread."""
+    executor = ThreadPoolExecutor(len(inboxes))
+    try:
+        await asyncio.gather(*(
+            Shard(url, token, i, count, inbox, outbox, executor,
+                  **kwargs).run()
+            for i, inbox in inboxes.items()))
+    finally:
+        executor.shutdown(wait=False)
+
+
+class Shard:
+    """A bot, connected as one shard, fed by the manager."""
+
+    def __init__(self, url, token, shard, count, inbox, outbox, executor,
+                 api_url=URL, routes=None, channel_id=CHANNEL_ID,
+                 messages=None, **kwargs):
+        """Init the shard.
+
+        :param shard: The shard id.
+        :param count: The number of shards.
+        :param inbox: Queue of the messages from the manager.
+        :param outbox: Queue of the messages to the manager.
+        :param executor: Threads blocking on the inbox.
+        :param api_url: The Discord HTTP API endpoint.
+        :param routes: The routes file, see :class:`~travisbot.routing.Router`.
+        :param channel_id: The channel of the notifications matching no
+                           route.
+        :param messages: The file keeping the messages of the builds, one
+                         per shard, suffixed by its id.
+        :param kwargs: Options of the :class:`~travisbot.bot.Bot`.
+        """
+        self.id = shard
+        self.inbox = inbox
+        self.outbox = outbox
+        self.executor = executor
+
+        self.queue = asyncio.Queue()
+        """Notifications received, waiting for the bot."""
+
+        self.identifying = asyncio.Event()
+        self.running = asyncio.Future()
+        self.router = Router(routes, default=channel_id)
+        self.messages = MessageIndex(
+            path=messages and "{}.{}".format(messages, shard))
+        self.messages.open()
+        self.bot = Bot(url, token, self.queue.get, self.running,
+                       client=Client(token, url=api_url),
+                       ack=self.ack, shard=(shard, count),
+                       before_identify=self.identify, router=self.router,
+                       messages=self.messages, **kwargs)
+
+        @self.bot.event()
+        async def on_ready(data):
+            self.outbox.put((READY, self.id))
+
+    async def identify(self):
+        """Wait for the manager to allow identifying."""
+        self.identifying.clear()
+        self.outbox.put((IDENTIFY, self.id))
+        await self.identifying.wait()
+
+    def ack(self, data):
+        """Tell the manager the notification was delivered."""
+        self.outbox.put((ACK, data))
+
+    async def _read(self):
+        """Read the inbox until asked to stop."""
+        loop = asyncio.get_event_loop()
+        while True:
+            kind, data = await loop.run_in_executor(self.executor,
+                                                    self.inbox.get)
+            if kind == NOTIFY:
+                await self.queue.put(data)
+            elif kind == IDENTIFY:
+                self.identifying.set()
+            elif kind == STOP:
+                break
+
+        self.running.set_result(None)
+        if self.bot.ws is not None:
+            await self.bot.ws.close()
+
+    async def run(self):
+        """Run the bot until the manager stops the shard."""
+        reading = asyncio.ensure_future(self._read())
+        watching = None
+        if self.router.path is not None:
+            watching = asyncio.ensure_future(self.router.watch())
+        try:
+            await self.bot.run()
+        except Exception as e:
+            log.exception("shard %d crashed", self.id)
+            self.outbox.put((CRASHED, (self.id, repr(e))))
+        finally:
+            if watching is not None:
+                watching.cancel()
+            self.messages.close()
+        # The inbox thread only lets go when asked to stop.
+        await reading
+
+
+class ShardManager:
+    """Run the shards, and route the notifications to them."""
+
+    def __init__(self, token, get, running, client=None, gateway=None,
+                 shards=None, processes=None, channel_id=CHANNEL_ID,
+                 ack=None, identify_delay=IDENTIFY_DELAY, router=None,
+                 **kwargs):
+        """Init the manager.
+
+        :param token: The Discord API token
+        :param get: The Queue reader side.
+        :param running: Future stopping the shards once done.
+        :param client: The REST :class:`~travisbot.api.Client` to share.
+        :param gateway: The ``/gateway/bot`` response, fetched when ``None``.
+        :param shards: Number of shards, the recommended one when ``None``.
+        :param processes: Number of worker processes, the shards run in
+                          this event loop when ``0``, one process per CPU
+                          when ``None``.
+        :param channel_id: The channel receiving the notifications, unless
+                           routed elsewhere.
+        :param ack: Called with each notification delivered.
+        :param identify_delay: Seconds between two identifies sharing a
+                               bucket.
+        :param router: The :class:`~travisbot.routing.Router`, its file
+                       being loaded by the shards too.
+        :param kwargs: Options of the shards, see :class:`Shard`.
+        """
+        self.token = token
+        self.get = get
+        self.running = running
+        self.client = client or Client(token)
+        self.gateway = gateway
+        self.shards = shards
+        self.processes = processes
+        self.router = router or Router(default=channel_id)
+        self.channel_id = self.router.default
+        self.ack = ack
+        self.identify_delay = identify_delay
+        self.kwargs = dict(kwargs, api_url=self.client.url,
+                           routes=self.router.path,
+                           channel_id=self.router.default)
+
+        self.count = None
+        """Number of shards."""
+
+        self.max_concurrency = 1
+        """Shards allowed to identify at the same time."""
+
+        self.guilds = {}
+        """Guild of each channel, by channel id."""
+
+        self.ready = set()
+        """Shards connected."""
+
+        self.routed = []
+        """Number of notifications sent to each shard."""
+
+        self.identified = {}
+        """Loop time of the last identify, by bucket."""
+
+        self.identifying = {}
+        """Locks of the identify buckets."""
+
+        self.inboxes = {}
+        self.outbox = None
+        self.manager = None
+        self.executor = None
+        self.threads = ThreadPoolExecutor(1)
+        """Thread blocking on the outbox."""
+
+        self.reading = None
+        self.workers = []
+        self.futures = []
+
+        self.crashed = None
+        """Future failing once a shard crashed."""
+
+    async def route(self, channel_id):
+        """Return the shard of the guild owning the channel.
+
+        The first shard is given when the channel cannot be fetched, until
+        it can.
+        """
+        if channel_id not in self.guilds:
+            try:
+                channel = await self.client.request(
+                    "/channels/{}".format(channel_id))
+                self.guilds[channel_id] = channel.get("guild_id")
+            except (APIError, ClientError, asyncio.TimeoutError) as e:
+                log.warning("cannot fetch channel %s: %r", channel_id, e)
+                return 0
+        guild_id = self.guilds[channel_id]
+        # Direct messages go through the first shard.
+        return shard_id(guild_id, self.count) if guild_id else 0
+
+    async def start(self):
+        """Start the shards."""
+        if self.gateway is None:
+            self.gateway = await self.client.request("/gateway/bot")
+        url = self.gateway["url"]
+        self.count = self.shards or self.gateway.get("shards", 1)
+        self.max_concurrency = self.gateway.get(
+            "session_start_limit", {}).get("max_concurrency", 1)
+        self.routed = [0] * self.count
+
+        processes = self.processes
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        processes = min(processes, self.count)
+
+        if processes:
+            # Plain queues cannot be given to the pool.
+            self.manager = multiprocessing.Manager()
+            make_queue = self.manager.Queue
+        else:
+            make_queue = queue.Queue
+        self.outbox = make_queue()
+        self.inboxes = {i: make_queue() for i in range(self.count)}
+
+        loop = asyncio.get_event_loop()
+        self.crashed = loop.create_future()
+        self.reading = asyncio.ensure_future(self._read())
+        if processes:
+            self.executor = ProcessPoolExecutor(processes)
+            for n in range(processes):
+                inboxes = {i: self.inboxes[i]
+                           for i in range(n, self.count, processes)}
+                self.workers.append(loop.run_in_executor(
+                    self.executor, run_shards, url, self.token, self.count,
+                    inboxes, self.outbox, self.kwargs))
+        else:
+            self.workers.append(asyncio.ensure_future(_run_shards(
+                url, self.token, self.count, self.inboxes, self.outbox,
+                self.kwargs)))
+        pumping = asyncio.ensure_future(self._pump())
+        pumping.add_done_callback(self._pumped)
+        self.futures.append(pumping)
+
+    def _pumped(self, task):
+        """Fail the manager when the notifications are no longer routed."""
+        if task.cancelled() or self.crashed.done():
+            return
+        log.error("routing to the shards failed", exc_info=task.exception())
+        self.crashed.set_exception(ShardCrashed(None, repr(task.exception())))
+
+    async def _pump(self):
+        """Move the notifications from the queue to the shards."""
+        while True:
+            data = await self.get()
+            channel = self.router.route(data)
+            if channel is None:
+                if self.ack:
+                    self.ack(data)
+                continue
+            shard = await self.route(channel)
+            self.routed[shard] += 1
+            self.inboxes[shard].put((NOTIFY, data))
+
+    async def _read(self):
+        """Handle the messages from the shards."""
+        loop = asyncio.get_event_loop()
+        while True:
+            kind, data = await loop.run_in_executor(self.threads,
+                                                    self.outbox.get)
+            if kind == IDENTIFY:
+                self.futures.append(asyncio.ensure_future(self._allow(data)))
+            elif kind == ACK:
+                if self.ack:
+                    self.ack(data)
+            elif kind == READY:
+                self.ready.add(data)
+            elif kind == CRASHED:
+                shard, error = data
+                self.ready.discard(shard)
+                if not self.crashed.done():
+                    self.crashed.set_exception(ShardCrashed(shard, error))
+            elif kind == STOP:
+                break
+
+    async def _allow(self, shard):
+        """Let the shard identify, once its bucket allows it."""
+        loop = asyncio.get_event_loop()
+        bucket = shard % self.max_concurrency
+        lock = self.identifying.setdefault(bucket, asyncio.Lock())
+        async with lock:
+            last = self.identified.get(bucket)
+            if last is not None:
+                delay = last + self.identify_delay - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.identified[bucket] = loop.time()
+            self.inboxes[shard].put((IDENTIFY, None))
+
+    async def stop(self):
+        """Stop the shards, and wait for them."""
+        for inbox in self.inboxes.values():
+            inbox.put((STOP, None))
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+        for future in self.futures:
+            future.cancel()
+        if self.reading is not None:
+            # The outbox thread only lets go when asked to stop.
+            self.outbox.put((STOP, None))
+            await self.reading
+        await asyncio.gather(*self.futures, return_exceptions=True)
+        self.reading = None
+        self.futures = []
+        self.workers = []
+
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.manager is not None:
+            self.manager.shutdown()
+        self.threads.shutdown()
+        await self.client.close()
+
+    async def run(self):
+        """Run the shards until we are stopped.
+
+        :raises ShardCrashed: when a shard stopped on its own, once the
+                              other ones are.
+        """
+        await self.start()
+        try:
+            await asyncio.wait([self.running, self.crashed],
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            await self.stop()
+        if self.crashed.done():
+            self.crashed.result()
+
+    def stats(self):
+        """Return the state of the shards."""
+        return {
+            "shards": self.count,
+            "ready": sorted(self.ready),
+            "max_concurrency": self.max_concurrency,
+            "routed": list(self.routed),
+            "channels": len(self.guilds)
+        }
@@ -0,0 +1,303 @@
+"""Durable spool of the accepted notifications.
+
+Notifications are appended, as JSON lines, to segment files before Travis
+gets its answer. A checkpoint file records the position of the oldest one
+not yet delivered, and the ones delivered after it, so they are replayed
+after a restart or a crash.
+
+Writes are group committed: every notification received while the disk is
+busy syncing is made durable by the next single ``fsync``.
+"""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+
+from .conf import SPOOL_COMMIT_DELAY, SPOOL_SEGMENT_SIZE
+from .queue import QueueFull
+
+KEY = '_spool'
+"""Key holding the position of the notification in the spool."""
+
+CHECKPOINT = 'checkpoint'
+"""Filename of the checkpoint, inside the spool directory."""
+
+
+class Spool:
+    """Append-only, segment rotated, log of notifications.
+
+    Sits in front of the queue writer side, :meth:`put`, and is told what
+    was delivered by the bot, :meth:`ack`.
+    """
+
+    def __init__(self, directory, put, segment_size=SPOOL_SEGMENT_SIZE,
+                 commit_delay=SPOOL_COMMIT_DELAY, loop=None):
+        """Init the spool.
+
+        :param directory: Where the segments and checkpoint are kept.
+        :param put: The Queue writer side.
+        :param segment_size: Bytes after which a new segment is started.
+        :param commit_delay: Seconds to wait for more writes to commit.
+        """
+        self.directory = directory
+        self._put = put
+        self.segment_size = segment_size
+        self.commit_delay = commit_delay
+        self.loop = loop or asyncio.get_event_loop()
+
+        self.segment = None
+        """Number of the segment being written."""
+
+        self.file = None
+        self.unsynced = []
+        """Files written since the last commit."""
+
+        self.pending = OrderedDict()
+        """Build id of the notifications not yet delivered, by position."""
+
+        self.builds = {}
+        """Positions of the notifications not yet delivered, by build id."""
+
+        self.checkpoint = (0, 0)
+        """Position of the oldest notification not delivered."""
+
+        self.acked = set()
+        """Positions of the notifications delivered after the checkpoint."""
+
+        self.committing = None
+        self.waiters = []
+        self.dirty = False
+
+        self.counters = dict.fromkeys(
+            ('written', 'commits', 'acked', 'dropped'), 0)
+
+    def path(self, name):
+        """Return the path of a file inside the spool directory."""
+        return os.path.join(self.directory, name)
+
+    def segments(self):
+        """Return the sorted numbers of the existing segments."""
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                      if name.endswith('.log'))
+
+    def open(self):
+        """Open the spool, return the notifications to replay."""
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self.path(CHECKPOINT)) as f:
+                positions = [tuple(int(x) for x in line.split())
+                             for line in f if line.strip()]
+            self.checkpoint = positions[0]
+            self.acked = set(positions[1:])
+        except FileNotFoundError:
+            pass
+
+        records = []
+        self.segment = self.checkpoint[0]
+        for segment in self.segments():
+            if segment < self.checkpoint[0]:
+                os.remove(self.path('{:016d}.log'.format(segment)))
+                continue
+            records.extend(self._read(segment))
+            self.segment = segment
+
+        self.file = open(self.path('{:016d}.log'.format(self.segment)), 'ab')
+        for position, data in records:
+            self._track(position, data)
+        return [data for _, data in records]
+
+    def _read(self, segment):
+        """Read the notifications after the checkpoint in a segment."""
+        records = []
+        filename = self.path('{:016d}.log'.format(segment))
+        with open(filename, 'rb+') as f:
+            if segment == self.checkpoint[0]:
+                f.seek(self.checkpoint[1])
+            offset = f.tell()
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A torn write, it was never acknowledged.
+                    f.truncate(offset)
+                    break
+                if (segment, offset) not in self.acked:
+                    records.append(((segment, offset),
+                                    json.loads(line.decode('utf-8'))))
+                offset += len(line)
+        return records
+
+    async def replay(self, notifications):
+        """Queue again the notifications which were not delivered.
+
+        :param notifications: The ones returned by :meth:`open`.
+        """
+        for data in notifications:
+            while True:
+                try:
+                    await self._put(data)
+                    break
+                except QueueFull:
+                    await asyncio.sleep(self.commit_delay * 10)
+
+    def close(self):
+        """Close the segment being written."""
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def write(self, data):
+        """Append a notification to the segment, without syncing it."""
+        if self.file.tell() >= self.segment_size:
+            self.unsynced.append(self.file)
+            self.segment += 1
+            self.file = open(
+                self.path('{:016d}.log'.format(self.segment)), 'ab')
+
+        position = (self.segment, self.file.tell())
+        line = json.dumps(data, separators=(',', ':')) + '\n'
+        self.file.write(line.encode('utf-8'))
+        self._track(position, data)
+        self.counters['written'] += 1
+        return position
+
+    def _track(self, position, data):
+        """Remember the notification is not delivered yet."""
+        data[KEY] = position
+        build = data.get('id', position)
+        self.pending[position] = build
+        self.builds.setdefault(build, []).append(position)
+
+    async def put(self, data):
+        """Spool the notification, queue it, and wait for it to be durable.
+
+        :raises QueueFull: when the queue refused the notification, it will
+                           not be replayed.
+        """
+        self.write(data)
+        try:
+            await self._put(data)
+        except BaseException:
+            # Only this one, the older ones of its build may still be queued.
+            self.drop(data)
+            raise
+        await self.sync()
+
+    def ack(self, data):
+        """Mark the notification, and the older ones of its build, delivered.
+
+        The position of the oldest notification not delivered is then
+        written at the next commit.
+        """
+        position = data.get(KEY)
+        build = self.pending.get(position)
+        if build is None:
+            return
+
+        positions = self.builds.pop(build)
+        for i, older in enumerate(positions):
+            if older > position:
+                self.builds[build] = positions[i:]
+                break
+            del self.pending[older]
+            self.acked.add(older)
+            self.counters['acked'] += 1
+        self.dirty = True
+        self._schedule()
+
+    def drop(self, data):
+        """Mark the notification lost, e.g. dropped by a full queue.
+
+        Unlike :meth:`ack`, the older notifications of its build are still
+        waiting to be delivered.
+        """
+        position = data.get(KEY)
+        build = self.pending.pop(position, None)
+        if build is None:
+            return
+
+        positions = self.builds[build]
+        positions.remove(position)
+        if not positions:
+            del self.builds[build]
+        self.acked.add(position)
+        self.counters['dropped'] += 1
+        self.dirty = True
+        self._schedule()
+
+    async def sync(self):
+        """Wait for the next commit, syncing everything written so far."""
+        waiter = self.loop.create_future()
+        self.waiters.append(waiter)
+        self._schedule()
+        await waiter
+
+    def _schedule(self):
+        """Start a commit unless one is running."""
+        if self.committing is None or self.committing.done():
+            self.committing = asyncio.ensure_future(self._commit())
+
+    async def _commit(self):
+        """Group commit the writes and the checkpoint."""
+        while self.waiters or self.dirty:
+            await asyncio.sleep(self.commit_delay)
+            waiters, self.waiters = self.waiters, []
+            files, self.unsynced = self.unsynced + [self.file], []
+            checkpoint = self._checkpoint()
+            self.acked = set(p for p in self.acked if p > checkpoint)
+            acked = sorted(self.acked)
+            self.dirty = False
+
+            try:
+                for f in files:
+                    f.flush()
+                await self.loop.run_in_executor(None, self._fsync, files,
+                                                checkpoint, acked)
+            except Exception as e:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                continue
+
+            self.counters['commits'] += 1
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    def _checkpoint(self):
+        """Return the position of the oldest notification not delivered."""
+        if self.pending:
+            return next(iter(self.pending))
+        return (self.segment, self.file.tell())
+
+    def _fsync(self, files, checkpoint, acked):
+        """Sync the files and the checkpoint, in a worker thread."""
+        for f in files:
+            os.fsync(f.fileno())
+        for f in files[:-1]:
+            f.close()
+
+        if checkpoint != self.checkpoint or acked:
+            tmp = self.path(CHECKPOINT + '.tmp')
+            with open(tmp, 'w') as f:
+                for position in [checkpoint] + acked:
+                    f.write('{} {}\n'.format(*position))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path(CHECKPOINT))
+
+            for segment in range(self.checkpoint[0], checkpoint[0]):
+                try:
+                    os.remove(self.path('{:016d}.log'.format(segment)))
+                except FileNotFoundError:
+                    pass
+            self.checkpoint = checkpoint
+
+    def stats(self):
+        """Return the counters of the spool."""
+        stats = {
+            'pending': len(self.pending),
+            'segment': self.segment,
+            'checkpoint': list(self.checkpoint)
+        }
+        stats.update(self.counters)
+        return stats
@@ -0,0 +1,107 @@
+"""Background tasks, tracked by category."""
+
+import asyncio
+import logging
+from collections import deque
+from functools import partial
+
+log = logging.getLogger(__name__)
+
+
+class Supervisor:
+    """Run background tasks, a limited number at once per category.
+
+    Finished tasks are forgotten as soon as they are done, their exception
+    logged and counted, never lost. Over the limit of its category, a
+    coroutine waits for a free slot before being started.
+    """
+
+    def __init__(self, limits=None, on_error=None):
+        """Init the supervisor.
+
+        :param limits: Maximum of tasks at once, by category.
+        :param on_error: Called with the category and the exception of a
+                         failed task.
+        """
+        self.limits = dict(limits or {})
+        self.on_error = on_error
+
+        self.tasks = set()
+        """Tasks in flight."""
+
+        self.running = {}
+        """Number of tasks in flight, by category."""
+
+        self.waiting = {}
+        """Coroutines waiting for a slot, by category."""
+
+        self.done = {}
+        """Number of tasks done, by category."""
+
+        self.errors = {}
+        """Number of tasks failed, by category."""
+
+    def spawn(self, coro, category="default"):
+        """Run the coroutine in a task, as soon as the limit allows it.
+
+        :return: the task, or ``None`` when it has to wait.
+        """
+        limit = self.limits.get(category)
+        if limit is not None and self.running.get(category, 0) >= limit:
+            self.waiting.setdefault(category, deque()).append(coro)
+            return None
+        return self._start(coro, category)
+
+    def _start(self, coro, category):
+        """Start the task, tracking it until it is done."""
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        self.running[category] = self.running.get(category, 0) + 1
+        task.add_done_callback(partial(self._done, category))
+        return task
+
+    def _done(self, category, task):
+        """Forget the task, report its exception and start the next one."""
+        self.tasks.discard(task)
+        self.running[category] -= 1
+        self.done[category] = self.done.get(category, 0) + 1
+
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            self.errors[category] = self.errors.get(category, 0) + 1
+            log.error("%s task failed", category, exc_info=e)
+            if self.on_error is not None:
+                self.on_error(category, e)
+
+        waiting = self.waiting.get(category)
+        if waiting:
+            self._start(waiting.popleft(), category)
+
+    def __len__(self):
+        """Count the tasks in flight or waiting."""
+        return len(self.tasks) + sum(len(w) for w in self.waiting.values())
+
+    async def join(self):
+        """Wait for all the tasks, including the ones they spawn."""
+        while self.tasks:
+            await asyncio.wait(self.tasks)
+
+    def cancel(self):
+        """Cancel the tasks in flight, and drop the waiting ones."""
+        for waiting in self.waiting.values():
+            while waiting:
+                waiting.popleft().close()
+        for task in self.tasks:
+            task.cancel()
+
+    def stats(self):
+        """Return the number of tasks, by category."""
+        categories = set(self.running) | set(self.waiting)
+        return {
+            category: {
+                "running": self.running.get(category, 0),
+                "waiting": len(self.waiting.get(category, ())),
+                "done": self.done.get(category, 0),
+                "errors": self.errors.get(category, 0)
+            } for category in sorted(categories)
+        }
@@ -0,0 +1,94 @@
+"""A local stand-in for Travis, to test and load test the bot.
+
+A local key stands for the one of Travis, its certificate being the one
+given to the :class:`~travisbot.certificate.Certificate` in place of
+:func:`~travisbot.certificate.travis_certificate`. The notifications are
+signed with it, and timed until the bot acknowledges them.
+"""
+
+import asyncio
+import base64
+from collections import deque
+
+from OpenSSL import crypto
+
+from .latency import Latency
+
+
+def keypair(bits=2048):
+    """Create a private key and its certificate, standing for Travis'."""
+    pkey = crypto.PKey()
+    pkey.generate_key(crypto.TYPE_RSA, bits)
+    certificate = crypto.X509()
+    certificate.set_pubkey(pkey)
+    return pkey, certificate
+
+
+def sign(pkey, payload):
+    """Return the signature of the payload, as the header sent by Travis."""
+    return base64.b64encode(
+        crypto.sign(pkey, payload.encode("utf-8"), "sha1")).decode()
+
+
+def notification(build, status="Passed", name="travisbot", branch="master"):
+    """Return the notification of a build, as Travis sends it.
+
+    >>> notification(42)['repository']
+    {'owner_name': 'greut', 'name': 'travisbot'}
+    """
+    return {
+        "id": build,
+        "state": status.lower(),
+        "status_message": status,
+        "author_name": "test",
+        "type": "push",
+        "branch": branch,
+        "compare_url": "http://example.org/",
+        "build_url": "http://example.org/{}".format(build),
+        "repository": {"owner_name": "greut", "name": name}
+    }
+
+
+class Deliveries:
+    """Time the notifications, from their webhook to their delivery.
+
+    Its :meth:`ack` is the one given to the :class:`~travisbot.bot.Bot`.
+    """
+
+    def __init__(self, size=1000):
+        """Init the timings.
+
+        :param size: Deliveries kept, to compute the percentiles.
+        """
+        self.latency = Latency(size)
+
+        self.posted = {}
+        """Loop time of the webhooks not delivered yet, by build id."""
+
+    def post(self, build):
+        """Start timing a webhook of the build, return its loop time."""
+        sent = asyncio.get_event_loop().time()
+        self.posted.setdefault(build, deque()).append(sent)
+        return sent
+
+    def skip(self, build, sent):
+        """Stop timing a webhook never to be delivered, e.g. refused.
+
+        :return: whether it was not acknowledged, along with its build,
+                 already.
+        """
+        times = self.posted.get(build, ())
+        if sent not in times:
+            return False
+        times.remove(sent)
+        return True
+
+    def ack(self, data):
+        """Time the delivered notification, and the older ones of its build.
+
+        They are superseded by the one delivered.
+        """
+        now = asyncio.get_event_loop().time()
+        times = self.posted.pop(data.get("id"), ())
+        while times:
+            self.latency.add(now - times.popleft())
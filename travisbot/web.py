@@ -1,12 +1,42 @@
 """Web server handling the Travis webhooks."""
 
 import base64
-import json
+import logging
+import time
 
-from aiohttp import ClientSession, web
+from aiohttp import web
 from OpenSSL import crypto
 
-from . import TRAVIS_CONFIG_URL
+from .certificate import Certificate
+from .codec import get_codec
+from .dedupe import Deduplicator
+from .metrics import REGISTRY, REST_SAVED, VERIFY_SECONDS, WEBHOOKS
+from .queue import QueueFull
+from .recorder import WEBHOOK
+
+log = logging.getLogger(__name__)
+
+
+async def enqueue(put, data, dedupe=None):
+    """Queue the notification, unless it was already.
+
+    :param put: The Queue writer side.
+    :param dedupe: The :class:`~travisbot.dedupe.Deduplicator`, if any.
+    :return: whether the notification was queued.
+    :raises QueueFull: when the notification is refused.
+    """
+    if dedupe is not None and not dedupe.add(data):
+        log.info("duplicate webhook", extra={'sample': 'duplicate'})
+        REST_SAVED.inc('duplicate')
+        return False
+    try:
+        await put(data)
+    except QueueFull:
+        # Not remembered, so that its retry goes through.
+        if dedupe is not None:
+            dedupe.discard(data)
+        raise
+    return True
 
 
 async def notifications(request):
@@ -15,68 +45,124 @@ async def notifications(request):
     signature = base64.b64decode(signature)
 
     ok = False
+    duplicate = False
+    status = 200
+    result = 'invalid'
     try:
         body = await request.post()
         payload = body['payload']
         certificate = request.app['config']['certificate']
-        if not certificate:
-            certificate = await travis_certificate()
-            request.app['config']['certificate'] = certificate
-
-        crypto.verify(certificate, signature, payload.encode('utf-8'), 'sha1')
-        data = json.loads(payload)
-        # enqueue the payload
-        await request.app['config']['put'](data)
+        start = time.perf_counter()
+        try:
+            await certificate.verify(signature, payload.encode('utf-8'))
+        finally:
+            VERIFY_SECONDS.observe(time.perf_counter() - start)
+        result = 'verified'
+        recorder = request.app['config']['recorder']
+        if recorder is not None:
+            recorder.record(WEBHOOK, payload)
+        data = request.app['config']['codec'].loads(payload)
+        if not await enqueue(request.app['config']['put'], data,
+                             request.app['config']['dedupe']):
+            # Acknowledged, Travis would retry it otherwise.
+            result = 'duplicate'
+            duplicate = True
         ok = True
+    except QueueFull:
+        log.warning("queue is full", extra={'sample': 'queue full'})
+        result = 'full'
+        status = 503
     except crypto.Error:
-        print("signature failure.")
+        log.warning("signature failure")
+        result = 'rejected'
     except KeyError:
-        print("no payload?")
-    except json.JSONDecodeError:
-        print("no json?")
+        log.info("no payload")
+    except ValueError:
+        log.info("invalid json")
+        result = 'invalid'
+    WEBHOOKS.inc(result)
 
-    return web.json_response({'ok': ok})
+    if duplicate:
+        return web.json_response({'ok': ok, 'duplicate': True})
+    return web.json_response({'ok': ok}, status=status)
 
 
 async def fake(request):
     """Submit a fake notification."""
-    await request.app['config']['put']({
-        'status_message': 'test',
-        'author_name': 'test',
-        'type': 'test',
-        'compare_url': 'http://example.org/',
-        'build_url': 'http://example.org/',
-        'repository': {
-            'owner_name': 'test',
-            'name': 'travisbot'
-        }
-    })
+    try:
+        await request.app['config']['put']({
+            'status_message': 'test',
+            'author_name': 'test',
+            'type': 'test',
+            'compare_url': 'http://example.org/',
+            'build_url': 'http://example.org/',
+            'repository': {
+                'owner_name': 'test',
+                'name': 'travisbot'
+            }
+        })
+    except QueueFull:
+        return web.json_response({'ok': False}, status=503)
     return web.json_response({'ok': True})
 
 
-async def travis_certificate():
-    """Build the travis X509 certificate."""
-    with ClientSession() as session:
-        async with session.get(TRAVIS_CONFIG_URL) as response:
-            assert 200 == response.status, response.reason
-            body = await response.json()
-            pkey = body['config']['notifications']['webhook']['public_key']
+async def metrics(request):
+    """Return the metrics, for Prometheus."""
+    return web.Response(text=request.app['metrics'].render(),
+                        content_type='text/plain')
 
-    certificate = crypto.X509()
-    certificate.set_pubkey(crypto.load_publickey(crypto.FILETYPE_PEM, pkey))
 
-    return certificate
+async def statistics(request):
+    """Return the statistics of the server, e.g. the queue depth."""
+    return web.json_response({
+        name: collect() for name, collect in request.app['stats'].items()
+    })
 
 
-def make_app(put, loop=None):
-    """Make the web application for you."""
+def make_app(put, loop=None, stats=None, certificate=None, codec=None,
+             registry=REGISTRY, recorder=None, dedupe=None, webhooks=True):
+    """Make the web application for you.
+
+    :param put: The Queue writer side, may raise
+                :class:`~travisbot.queue.QueueFull`.
+    :param stats: Named callables returning statistics, e.g. the
+                  :meth:`~travisbot.queue.NotificationQueue.stats`.
+    :param certificate: The :class:`~travisbot.certificate.Certificate`
+                        verifying the webhooks.
+    :param codec: JSON library name, the fastest installed by default.
+    :param registry: The :class:`~travisbot.metrics.Registry` exposed on
+                     ``/metrics``.
+    :param recorder: The :class:`~travisbot.recorder.Recorder` capturing
+                     the verified payloads.
+    :param dedupe: The :class:`~travisbot.dedupe.Deduplicator` skipping the
+                   webhooks already queued, a new one by default, none when
+                   ``False``.
+    :param webhooks: Whether it receives the webhooks, only the statistics
+                     and metrics are served otherwise, e.g. the workers
+                     receive them.
+    """
     app = web.Application(loop=loop)
+    certificate = certificate or Certificate(loop=loop)
+    dedupe = Deduplicator() if dedupe is None else dedupe or None
     app['config'] = {
         'put': put,
-        'certificate': None
+        'certificate': certificate,
+        'codec': get_codec(codec),
+        'recorder': recorder,
+        'dedupe': dedupe
     }
-
-    app.router.add_get('/notifications', fake)
-    app.router.add_post('/notifications', notifications)
+    app['stats'] = dict(stats or {})
+    if dedupe is not None:
+        app['stats'].setdefault('dedupe', dedupe.stats)
+    app['metrics'] = registry
+
+    if webhooks:
+        app.on_startup.append(certificate.start)
+        app.on_cleanup.append(certificate.stop)
+
+        app.router.add_get('/notifications', fake)
+        app.router.add_post('/notifications', notifications)
+    app.router.add_get('/stats', statistics)
+    app.router.add_get('/metrics', metrics)
 
     return app